@@ -7,7 +7,27 @@ def main() -> None:
 
     serpent = Serpent()
     serpent.parse_args(args)
-    serpent.start_serpent()
+
+    if args.engine1:
+        serpent.run_match(args)
+    elif args.pgn_replay:
+        serpent.run_pgn_replay(args.pgn_replay, args.jobs)
+    elif args.epd:
+        serpent.run_epd(args.epd, args.jobs, args.hash, args.epd_output)
+    elif args.build_bitbases:
+        serpent.build_bitbases(args.jobs)
+    elif args.perft_suite:
+        serpent.run_perft_suite(args.perft_suite, args.jobs, args.perft_hash, args.debug_hash)
+    elif args.divide is not None:
+        serpent.run_perft(args.divide, divide=True, jobs=args.jobs, split_depth=args.split_depth, hash_size_mb=args.perft_hash, debug_hash=args.debug_hash)
+    elif args.perft is not None:
+        serpent.run_perft(args.perft, divide=False, jobs=args.jobs, split_depth=args.split_depth, hash_size_mb=args.perft_hash, debug_hash=args.debug_hash)
+    elif (args.depth or args.movetime or args.nodes) and not args.color:
+        serpent.run_search()
+    elif args.color:
+        serpent.start_serpent()
+    else:
+        serpent.start_uci()
 
 
 def get_args() -> None:
@@ -19,7 +39,125 @@ def get_args() -> None:
     parser.add_argument('-color', '-c', '--color', '--c',
                         dest='color',
                         type=str,
-                        help='This flag is used to determine which color the user would like to play against Serpent. Ex: -color=white')
+                        help='This flag is used to determine which color the user would like to play against Serpent. Without it, or any of the search and perft flags, Serpent speaks UCI on stdin / stdout for a chess GUI. Ex: -color=white')
+    parser.add_argument('-depth', '-d', '--depth', '--d',
+                        dest='depth',
+                        type=int,
+                        help='Search depth in plies. Without -color Serpent searches the fen and prints every iteration. Ex: -depth=5')
+    parser.add_argument('-movetime', '--movetime',
+                        dest='movetime',
+                        type=int,
+                        help='Time in milliseconds Serpent may search each move. Ex: -movetime=2000')
+    parser.add_argument('-nodes', '--nodes',
+                        dest='nodes',
+                        type=int,
+                        help='Number of nodes Serpent may search each move. Ex: -nodes=100000')
+    parser.add_argument('-hash', '--hash',
+                        dest='hash',
+                        type=int,
+                        default=16,
+                        help='Size in MB of the transposition table used by the search. Ex: -hash=64')
+    parser.add_argument('-threads', '-t', '--threads', '--t',
+                        dest='threads',
+                        type=int,
+                        default=1,
+                        help='Number of processes the search runs on. Past one, Lazy SMP helper processes search the same position and share the transposition table. Ex: -threads=4')
+    parser.add_argument('-book', '--book',
+                        dest='book',
+                        type=str,
+                        help='Polyglot .bin opening book Serpent plays from while the position is in it. Ex: -book=book.bin')
+    parser.add_argument('-book-best', '--book-best',
+                        dest='book_best',
+                        action='store_true',
+                        help='Always play the highest weighted book move instead of picking one at random by weight.')
+    parser.add_argument('-perft', '--perft',
+                        dest='perft',
+                        type=int,
+                        help='Count the leaf nodes of the move tree to the given depth from the fen and report the time taken and nodes per second. Ex: -perft=4')
+    parser.add_argument('-divide', '--divide',
+                        dest='divide',
+                        type=int,
+                        help='Same as -perft but also prints the node count under every root move. Ex: -divide=4')
+    parser.add_argument('-perft-suite', '--perft-suite',
+                        dest='perft_suite',
+                        type=int,
+                        nargs='?',
+                        const=3,
+                        help='Run perft on the built in suite of standard positions up to the given depth (default 3) and check the node counts.')
+    parser.add_argument('-jobs', '-j', '--jobs', '--j',
+                        dest='jobs',
+                        type=int,
+                        default=1,
+                        help='Number of worker processes perft splits the move tree across. Ex: -jobs=8')
+    parser.add_argument('-split-depth', '--split-depth',
+                        dest='split_depth',
+                        type=int,
+                        default=1,
+                        help='Ply below the root where parallel perft splits the tree into tasks. Deeper splits give more, smaller tasks. Ex: -split-depth=2')
+    parser.add_argument('-perft-hash', '--perft-hash',
+                        dest='perft_hash',
+                        type=int,
+                        default=0,
+                        help='Size in MB of the perft hash table that caches subtree node counts, 0 turns it off. Each parallel worker gets its own table of this size. Ex: -perft-hash=64')
+    parser.add_argument('-epd', '--epd',
+                        dest='epd',
+                        type=str,
+                        help='Search every position of an epd test suite with the -depth / -movetime / -nodes limits, across -jobs processes, and score the bm / am answers. Ex: -epd=wac.epd -movetime=1000 -jobs=8')
+    parser.add_argument('-epd-output', '--epd-output',
+                        dest='epd_output',
+                        type=str,
+                        help='File to write the -epd results to as json, for comparing builds. Ex: -epd-output=results.json')
+    parser.add_argument('-engine1', '--engine1',
+                        dest='engine1',
+                        type=str,
+                        help='Play a match of this uci engine against -engine2. "serpent" is this Serpent, and option.Name=Value words set uci options. Ex: -engine1="serpent option.Hash=32"')
+    parser.add_argument('-engine2', '--engine2',
+                        dest='engine2',
+                        type=str,
+                        default='serpent',
+                        help='Opponent of -engine1 in a match, Serpent by default. Ex: -engine2="/usr/bin/stockfish option.Threads=1"')
+    parser.add_argument('-games', '--games',
+                        dest='games',
+                        type=int,
+                        default=2,
+                        help='Number of match games. Every opening is played twice, once with each engine as white. Ex: -games=100')
+    parser.add_argument('-concurrency', '--concurrency',
+                        dest='concurrency',
+                        type=int,
+                        default=1,
+                        help='Number of match games played at the same time, each with its own pair of engine processes. Ex: -concurrency=4')
+    parser.add_argument('-tc', '--tc',
+                        dest='tc',
+                        type=str,
+                        help='Match time control as base seconds + increment seconds. Without it or -depth / -movetime / -nodes, matches use 10+0.1. Ex: -tc=60+0.6')
+    parser.add_argument('-openings', '--openings',
+                        dest='openings',
+                        type=str,
+                        help='File of match opening positions, one fen or epd per line, played in a shuffled order. Ex: -openings=openings.epd')
+    parser.add_argument('-pgn', '--pgn',
+                        dest='pgn',
+                        type=str,
+                        help='File every finished match game is appended to as pgn. Ex: -pgn=match.pgn')
+    parser.add_argument('-sprt', '--sprt',
+                        dest='sprt',
+                        type=str,
+                        help='Run a SPRT of elo0 against elo1 for -engine1 and stop the match once it passes or fails. Ex: -sprt=0,5')
+    parser.add_argument('-no-adjudication', '--no-adjudication',
+                        dest='no_adjudication',
+                        action='store_true',
+                        help='Play every match game out instead of adjudicating resigns, dead draws and games over 200 moves.')
+    parser.add_argument('-pgn-replay', '--pgn-replay',
+                        dest='pgn_replay',
+                        type=str,
+                        help='Replay every game of a pgn database, plain or .gz / .bz2, through the move generator and count the games and positions. Plain files are split by byte ranges across -jobs processes. Ex: -pgn-replay=games.pgn -jobs=8')
+    parser.add_argument('-build-bitbases', '--build-bitbases',
+                        dest='build_bitbases',
+                        action='store_true',
+                        help='Build the KQK, KRK and KPK endgame bitbases the search probes, split across -jobs processes. Takes a minute or so per endgame on one core.')
+    parser.add_argument('-debug-hash', '--debug-hash',
+                        dest='debug_hash',
+                        action='store_true',
+                        help='Check the incrementally updated Zobrist key against a full recompute after every move and undo. Slow, meant for use with -perft.')
     return parser.parse_args()
 
 
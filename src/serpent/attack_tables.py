@@ -0,0 +1,76 @@
+# Squares are indexed the same way as in move_generator.py, a8 = 0 through h1 = 63,
+# so moving "up" the board (towards rank 8) subtracts 8 from the square index.
+
+WHITE = 0
+BLACK = 1
+
+KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+KING_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+WHITE_PAWN_OFFSETS = [(-1, -1), (-1, 1)]
+BLACK_PAWN_OFFSETS = [(1, -1), (1, 1)]
+
+
+def generate_leaper_attacks(offsets: list) -> list:
+    # Offsets are (rank, file) steps. Anything that would leave the board is dropped here
+    # once, instead of masking with not_a_file / not_h_file on every move generation call.
+    attacks = []
+
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        board = 0
+        for rank_offset, file_offset in offsets:
+            target_rank = rank + rank_offset
+            target_file = file + file_offset
+            if 0 <= target_rank < 8 and 0 <= target_file < 8:
+                board |= 1 << (target_rank * 8 + target_file)
+        attacks.append(board)
+
+    return attacks
+
+
+KNIGHT_ATTACKS = generate_leaper_attacks(KNIGHT_OFFSETS)
+KING_ATTACKS = generate_leaper_attacks(KING_OFFSETS)
+
+# Indexed by color first, then square. PAWN_ATTACKS[WHITE][E4] gives d5 and f5.
+PAWN_ATTACKS = [
+    generate_leaper_attacks(WHITE_PAWN_OFFSETS),
+    generate_leaper_attacks(BLACK_PAWN_OFFSETS),
+]
+
+DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def generate_line_tables() -> tuple:
+    # BETWEEN[a][b] holds the squares strictly between two squares on the same rank, file or diagonal,
+    # LINE[a][b] holds the whole line through both of them, edge to edge. Both are 0 for unaligned squares.
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        for rank_step, file_step in DIRECTIONS:
+            # Full line through the square in this direction and its opposite
+            full_line = 1 << square
+            for step in (1, -1):
+                target_rank = rank + rank_step * step
+                target_file = file + file_step * step
+                while 0 <= target_rank < 8 and 0 <= target_file < 8:
+                    full_line |= 1 << (target_rank * 8 + target_file)
+                    target_rank += rank_step * step
+                    target_file += file_step * step
+
+            squares_between = 0
+            target_rank = rank + rank_step
+            target_file = file + file_step
+            while 0 <= target_rank < 8 and 0 <= target_file < 8:
+                target_square = target_rank * 8 + target_file
+                between[square][target_square] = squares_between
+                line[square][target_square] = full_line
+                squares_between |= 1 << target_square
+                target_rank += rank_step
+                target_file += file_step
+
+    return between, line
+
+
+BETWEEN, LINE = generate_line_tables()
@@ -0,0 +1,241 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .move import MoveList
+from .move_generator import MoveGenerator
+from .piece import KING, PAWN, QUEEN, ROOK
+from .position import Position
+
+DEFAULT_BITBASE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+
+# Endgames of two kings and one more piece for the strong side, built in this order since the
+# pawn promotes into the other two
+ENDGAMES = {
+    "KQK": QUEEN,
+    "KRK": ROOK,
+    "KPK": PAWN,
+}
+
+# Positions are indexed with the strong side as white, mirrored by rank when it's black:
+#   bits 0 - 5    square of the strong side's piece
+#   bits 6 - 11   weak king square
+#   bits 12 - 17  strong king square
+#   bit 18        set when the weak side is to move
+# One bit per position says whether the strong side wins. The weak side never can with a bare king,
+# so that one bit is the whole win / draw / loss answer.
+POSITION_COUNT = 2 * 64 * 64 * 64
+WEAK_TO_MOVE = 64 * 64 * 64
+
+# Successor indexes past the end of the table, for moves that leave the endgame
+SUCCESSOR_WIN = POSITION_COUNT
+SUCCESSOR_DRAW = POSITION_COUNT + 1
+
+# probe results, from the side to move's point of view
+BITBASE_LOSS = -1
+BITBASE_DRAW = 0
+BITBASE_WIN = 1
+
+
+def get_index(weak_to_move: int, strong_king: int, weak_king: int, piece_square: int) -> int:
+    return (weak_to_move << 18) | (strong_king << 12) | (weak_king << 6) | piece_square
+
+
+def get_mop_up_score(position: Position, strong_color: int) -> int:
+    # Bonus for the winning side of a won endgame, for pushing the weak king to the edge and bringing its
+    # own king close. That's the way to mate with a queen or rook, and a gradient the search can follow.
+    strong_king = position.get_king_square(strong_color)
+    weak_king = position.get_king_square(strong_color ^ 1)
+    weak_file, weak_rank = weak_king % 8, weak_king // 8
+    center_distance = max(3 - weak_file, weak_file - 4) + max(3 - weak_rank, weak_rank - 4)
+    king_distance = abs(strong_king % 8 - weak_file) + abs(strong_king // 8 - weak_rank)
+    return 10 * center_distance + 4 * (14 - king_distance)
+
+
+def is_bit_set(table: bytes, index: int) -> bool:
+    return (table[index >> 3] >> (index & 7)) & 1
+
+
+worker_move_generator = None
+worker_piece = None
+# Finished bitbases a pawn can promote into, by promotion piece type
+worker_promotion_tables = {}
+
+
+def init_bitbase_worker(piece: int, promotion_tables: dict) -> None:
+    global worker_move_generator, worker_piece, worker_promotion_tables
+    worker_move_generator = MoveGenerator()
+    worker_piece = piece
+    worker_promotion_tables = promotion_tables
+
+
+def generate_successors(strong_king: int) -> tuple:
+    # Every legal position with the strong king on this square, and where each of its legal moves
+    # leads. The moves come from MoveGenerator, so the rules are exactly the ones the search plays by.
+    move_generator = worker_move_generator
+    piece = worker_piece
+    position = Position()
+    move_list = MoveList()
+
+    indexes = []
+    counts = []
+    in_check = []
+    successors = []
+
+    for weak_to_move in (0, 1):
+        for weak_king in range(64):
+            # Kings can't stand next to each other
+            if weak_king == strong_king or abs(weak_king // 8 - strong_king // 8) <= 1 and abs(weak_king % 8 - strong_king % 8) <= 1:
+                continue
+
+            for piece_square in range(64):
+                if piece_square == strong_king or piece_square == weak_king:
+                    continue
+                # Pawns never stand on the first or last rank
+                if piece == PAWN and (piece_square < 8 or piece_square >= 56):
+                    continue
+
+                position.add_piece(KING, strong_king)
+                position.add_piece(6 + KING, weak_king)
+                position.add_piece(piece, piece_square)
+                position.color_to_move = weak_to_move
+
+                # The side that just moved can't be left in check
+                if not weak_to_move and move_generator.is_square_attacked(position, weak_king, 0):
+                    position.remove_piece(KING, strong_king)
+                    position.remove_piece(6 + KING, weak_king)
+                    position.remove_piece(piece, piece_square)
+                    continue
+
+                moves = move_generator.generate_legal_moves(position, move_list)
+                for move in moves:
+                    source = move & 0x3F
+                    target = (move >> 6) & 0x3F
+                    flags = move >> 12
+
+                    if weak_to_move:
+                        # Taking the piece leaves two bare kings
+                        successors.append(SUCCESSOR_DRAW if target == piece_square else get_index(0, strong_king, target, piece_square))
+                    elif source == strong_king:
+                        successors.append(get_index(1, target, weak_king, piece_square))
+                    elif flags & 8:
+                        # Promotions continue in the finished queen or rook bitbase, a bishop or knight can't mate
+                        promotion_table = worker_promotion_tables.get((flags & 3) + 1)
+                        if promotion_table is not None and is_bit_set(promotion_table, get_index(1, strong_king, weak_king, target)):
+                            successors.append(SUCCESSOR_WIN)
+                        else:
+                            successors.append(SUCCESSOR_DRAW)
+                    else:
+                        successors.append(get_index(1, strong_king, weak_king, target))
+
+                indexes.append(get_index(weak_to_move, strong_king, weak_king, piece_square))
+                counts.append(len(moves))
+                in_check.append(weak_to_move and move_generator.is_square_attacked(position, weak_king, 0))
+
+                position.remove_piece(KING, strong_king)
+                position.remove_piece(6 + KING, weak_king)
+                position.remove_piece(piece, piece_square)
+
+    return (
+        np.array(indexes, dtype=np.int32),
+        np.array(counts, dtype=np.int32),
+        np.array(in_check, dtype=bool),
+        np.array(successors, dtype=np.int32),
+    )
+
+
+def solve_bitbase(indexes: np.ndarray, counts: np.ndarray, in_check: np.ndarray, successors: np.ndarray) -> np.ndarray:
+    # Retrograde analysis, vectorized over every position at once. A strong side to move position is
+    # won when any move reaches a won position, a weak side to move one when every move does, or when
+    # it's checkmate. Repeating that until nothing changes finds every win, whatever is left is a draw.
+    wins = np.zeros(POSITION_COUNT + 2, dtype=bool)
+    wins[SUCCESSOR_WIN] = True
+
+    starts = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    # reduceat reads one element at the start of an empty segment, even at the very end
+    successors = np.append(successors, SUCCESSOR_DRAW)
+    weak_to_move = indexes >= WEAK_TO_MOVE
+    checkmates = weak_to_move & in_check & (counts == 0)
+
+    while True:
+        winning_successors = np.add.reduceat(wins[successors].astype(np.int32), starts)
+        winning_successors[counts == 0] = 0
+        won = np.where(weak_to_move, (winning_successors == counts) & (counts > 0), winning_successors > 0) | checkmates
+
+        if np.array_equal(won, wins[indexes]):
+            break
+        wins[indexes] = won
+
+    return wins[:POSITION_COUNT]
+
+
+def generate_bitbase(piece: int, jobs: int = 1, promotion_tables: dict = None) -> np.ndarray:
+    # The strong king squares are independent, so the move generation is split across processes by them
+    promotion_tables = promotion_tables if promotion_tables else {}
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_bitbase_worker, initargs=(piece, promotion_tables)) as executor:
+            parts = list(executor.map(generate_successors, range(64)))
+    else:
+        init_bitbase_worker(piece, promotion_tables)
+        parts = [generate_successors(strong_king) for strong_king in range(64)]
+
+    return solve_bitbase(*(np.concatenate([part[field] for part in parts]) for field in range(4)))
+
+
+def build_bitbases(directory: str = DEFAULT_BITBASE_DIRECTORY, jobs: int = 1) -> None:
+    # Builds every bitbase in ENDGAMES and saves each as a packed bit array, POSITION_COUNT / 8 bytes
+    os.makedirs(directory, exist_ok=True)
+    promotion_tables = {}
+
+    for name, piece in ENDGAMES.items():
+        start_time = time.perf_counter()
+        wins = generate_bitbase(piece, jobs, promotion_tables)
+        table = np.packbits(wins, bitorder="little").tobytes()
+        with open(os.path.join(directory, name + ".bin"), "wb") as file:
+            file.write(table)
+
+        if piece in (QUEEN, ROOK):
+            promotion_tables[piece] = table
+        print(f"{name}: {int(wins.sum())} wins, {time.perf_counter() - start_time:.1f}s")
+
+
+class Bitbases():
+    # Win / draw / loss lookups for the endgames in ENDGAMES, from bit arrays built by build_bitbases.
+    # Endgames without a file are just never found.
+    def __init__(self, directory: str = DEFAULT_BITBASE_DIRECTORY) -> None:
+        # Bit array by strong piece type
+        self.tables = {}
+        for name, piece in ENDGAMES.items():
+            path = os.path.join(directory, name + ".bin")
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    table = file.read()
+                if len(table) == POSITION_COUNT // 8:
+                    self.tables[piece] = table
+
+    def probe(self, position: Position):
+        # BITBASE_WIN / DRAW / LOSS for the side to move, None when the position isn't covered
+        if not self.tables or position.full_board.bit_count() != 3:
+            return None
+
+        bitboards = position.bitboards
+        for piece, table in self.tables.items():
+            for strong_color in (0, 1):
+                piece_board = bitboards[strong_color * 6 + piece]
+                if not piece_board:
+                    continue
+
+                # Mirroring the ranks swaps the colors, a black pawn walks up the board like a white one
+                flip = 56 if strong_color else 0
+                index = get_index(
+                    position.color_to_move ^ strong_color,
+                    position.get_king_square(strong_color) ^ flip,
+                    position.get_king_square(strong_color ^ 1) ^ flip,
+                    (piece_board.bit_length() - 1) ^ flip
+                )
+                if not is_bit_set(table, index):
+                    return BITBASE_DRAW
+                return BITBASE_WIN if position.color_to_move == strong_color else BITBASE_LOSS
+
+        return None
@@ -0,0 +1,177 @@
+import json
+import os
+import time
+from .fen import Fen
+from .move import NULL_MOVE
+from .position import Position
+from .search import DEFAULT_HASH_SIZE_MB, Search
+from .worker_pool import map_unordered
+
+
+def read_epd_file(path: str):
+    # Yields (line number, line) for every position in the file, one line at a time so suites of
+    # any size stream through. Blank lines and # comments are skipped.
+    with open(path, "r") as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line_number, line
+
+
+worker_search = None
+
+
+def init_epd_worker(hash_size_mb: int = DEFAULT_HASH_SIZE_MB) -> None:
+    global worker_search
+    worker_search = Search(hash_size_mb=hash_size_mb)
+
+
+def run_epd_task(task: tuple) -> dict:
+    # Searches one epd position and checks the result against its bm / am operations
+    line_number, line, limits = task
+    search = worker_search
+    move_generator = search.move_generator
+
+    # Filled in for lines that never get searched
+    result = {
+        "line": line_number, "id": str(line_number), "fen": None, "bm": [], "am": [],
+        "best_move": None, "score": None, "depth": 0, "nodes": 0, "time": 0.0,
+        "solved": None, "solve_time": None, "solve_depth": None, "worker": os.getpid(),
+    }
+
+    parser = Fen()
+    position = Position()
+    try:
+        operations = parser.parse_epd(line)
+        position.generate_position_from_fen(parser.get_parsed_fen())
+    except (IndexError, KeyError, ValueError):
+        # A bad line is reported with the rest of the results instead of ending the run
+        result["error"] = f"bad epd: {line}"
+        return result
+
+    best_moves = [move_generator.parse_san_move(position, san) for san in operations.get("bm", [])]
+    avoid_moves = [move_generator.parse_san_move(position, san) for san in operations.get("am", [])]
+    result.update(
+        id=" ".join(operations.get("id", [])) or str(line_number),
+        fen=position.get_fen(),
+        bm=operations.get("bm", []),
+        am=operations.get("am", []),
+    )
+    if NULL_MOVE in best_moves or NULL_MOVE in avoid_moves:
+        result["error"] = "bm or am is not a legal move"
+        best_moves = [move for move in best_moves if move != NULL_MOVE]
+        avoid_moves = [move for move in avoid_moves if move != NULL_MOVE]
+
+    def is_correct(move: int) -> bool:
+        return (not best_moves or move in best_moves) and move not in avoid_moves
+
+    # Positions are independent, nothing from the last one should help or hurt this one
+    search.new_game()
+    iterations = []
+    search_result = search.search(position, on_iteration=iterations.append, **limits)
+
+    # Solved from the first iteration after which the best move stayed correct to the end
+    solve_iteration = None
+    for iteration in reversed(iterations):
+        if not iteration["pv"] or not is_correct(iteration["pv"][0]):
+            break
+        solve_iteration = iteration
+
+    has_answer = bool(best_moves or avoid_moves)
+    solved = has_answer and is_correct(search_result["best_move"])
+    result.update(
+        best_move=move_generator.move_to_san(position, search_result["best_move"]) if search_result["best_move"] != NULL_MOVE else None,
+        score=search_result["score"],
+        depth=search_result["depth"],
+        nodes=search_result["nodes"],
+        time=search_result["time"],
+        solved=solved if has_answer else None,
+        solve_time=solve_iteration["time"] if solved and solve_iteration else None,
+        solve_depth=solve_iteration["depth"] if solved and solve_iteration else None,
+    )
+    return result
+
+
+class EpdRunner():
+    # Runs a suite of epd positions (WAC, STS, ...) with the same limits on every position, spread
+    # over a process pool. Results come back in completion order and are handed to on_result as they do.
+    def __init__(self, hash_size_mb: int = DEFAULT_HASH_SIZE_MB, jobs: int = 1) -> None:
+        self.hash_size_mb = hash_size_mb
+        self.jobs = jobs
+
+    def run(self, path: str, max_depth: int = None, max_nodes: int = None, max_time: float = None, on_result=None) -> dict:
+        limits = {"max_depth": max_depth, "max_nodes": max_nodes, "max_time": max_time}
+        tasks = ((line_number, line, limits) for line_number, line in read_epd_file(path))
+        results = []
+        start_time = time.perf_counter()
+
+        def add_result(result: dict) -> None:
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+        if self.jobs > 1:
+            for result in map_unordered(run_epd_task, tasks, self.jobs, init_epd_worker, (self.hash_size_mb,)):
+                add_result(result)
+        else:
+            init_epd_worker(self.hash_size_mb)
+            for task in tasks:
+                add_result(run_epd_task(task))
+
+        elapsed_time = time.perf_counter() - start_time
+        results.sort(key=lambda result: result["line"])
+        return {
+            "path": path,
+            "limits": limits,
+            "jobs": self.jobs,
+            "hash_size_mb": self.hash_size_mb,
+            "summary": self.get_summary(results, elapsed_time),
+            "results": results,
+        }
+
+    def get_summary(self, results: list, elapsed_time: float) -> dict:
+        scored = [result for result in results if result["solved"] is not None]
+        solved = [result for result in scored if result["solved"]]
+        solve_times = [result["solve_time"] for result in solved if result["solve_time"] is not None]
+        nodes = sum(result["nodes"] for result in results)
+
+        return {
+            "positions": len(results),
+            "scored": len(scored),
+            "solved": len(solved),
+            "solve_rate": len(solved) / len(scored) if scored else 0.0,
+            "average_solve_time": sum(solve_times) / len(solve_times) if solve_times else None,
+            "errors": sum(1 for result in results if "error" in result),
+            "nodes": nodes,
+            "time": elapsed_time,
+            # Every worker's nodes over the wall clock, so it grows with the number of jobs
+            "nps": int(nodes / elapsed_time) if elapsed_time > 0 else 0,
+        }
+
+    def print_result(self, result: dict) -> None:
+        if result["solved"] is None:
+            status = "-"
+        else:
+            status = "solved" if result["solved"] else "failed"
+        expected = ""
+        if result["bm"]:
+            expected += " bm " + " ".join(result["bm"])
+        if result["am"]:
+            expected += " am " + " ".join(result["am"])
+        solve_time = f" in {result['solve_time']:.2f}s" if result["solve_time"] is not None else ""
+        error = f" ({result['error']})" if "error" in result else ""
+        print(f"{result['id']}: {status}{solve_time}, played {result['best_move']}{expected}, depth {result['depth']}, {result['nodes']} nodes{error}")
+
+    def print_summary(self, summary: dict) -> None:
+        print(f"Solved {summary['solved']} of {summary['scored']} ({summary['solve_rate']:.1%})")
+        if summary["average_solve_time"] is not None:
+            print(f"Average time to solution: {summary['average_solve_time']:.2f}s")
+        if summary["errors"]:
+            print(f"Positions with bad lines or bm / am: {summary['errors']}")
+        print(f"Nodes: {summary['nodes']}")
+        print(f"Time: {summary['time']:.3f}s")
+        print(f"NPS: {summary['nps']}")
+
+    def write_json(self, run: dict, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(run, file, indent=2)
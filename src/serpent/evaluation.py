@@ -0,0 +1,314 @@
+import numpy as np
+from .bitboard import MASK_64, iterate_bits
+from .fen import Fen
+
+# Tapered material and piece square evaluation, using the PeSTO tables, plus pawn structure. Every
+# term has a midgame and an endgame score and the two are blended by how much material is left.
+#
+# Position keeps the running white minus black totals (mg_score, eg_score and phase) up to date in
+# add_piece / remove_piece / move_piece, so evaluating a leaf doesn't look at the board at all.
+# Pawn structure only changes on pawn moves, so it is cached in a PawnHashTable keyed on pawn_hash.
+
+# Centipawn values indexed by piece type
+MG_PIECE_VALUES = [82, 337, 365, 477, 1025, 0]
+EG_PIECE_VALUES = [94, 281, 297, 512, 936, 0]
+
+# Phase weight per piece type, the full starting material adds up to TOTAL_PHASE
+PHASE_VALUES = [0, 1, 1, 2, 4, 0]
+TOTAL_PHASE = 24
+
+# Tables are from white's point of view, laid out a8 first like the squares. Black pieces use
+# the square mirrored vertically (square ^ 56).
+MG_PAWN_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    98, 134, 61, 95, 68, 126, 34, -11,
+    -6, 7, 26, 31, 65, 56, 25, -20,
+    -14, 13, 6, 21, 23, 12, 17, -23,
+    -27, -2, -5, 12, 17, 6, 10, -25,
+    -26, -4, -4, -10, 3, 3, 33, -12,
+    -35, -1, -20, -23, -15, 24, 38, -22,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+
+EG_PAWN_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    178, 173, 158, 134, 147, 132, 165, 187,
+    94, 100, 85, 67, 56, 53, 82, 84,
+    32, 24, 13, 5, -2, 4, 17, 17,
+    13, 9, -3, -7, -7, -8, 3, -1,
+    4, 7, -6, 1, 0, -5, -1, -8,
+    13, 8, 8, 10, 13, 0, 2, -7,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+
+MG_KNIGHT_TABLE = [
+    -167, -89, -34, -49, 61, -97, -15, -107,
+    -73, -41, 72, 36, 23, 62, 7, -17,
+    -47, 60, 37, 65, 84, 129, 73, 44,
+    -9, 17, 19, 53, 37, 69, 18, 22,
+    -13, 4, 16, 13, 28, 19, 21, -8,
+    -23, -9, 12, 10, 19, 17, 25, -16,
+    -29, -53, -12, -3, -1, 18, -14, -19,
+    -105, -21, -58, -33, -17, -28, -19, -23,
+]
+
+EG_KNIGHT_TABLE = [
+    -58, -38, -13, -28, -31, -27, -63, -99,
+    -25, -8, -25, -2, -9, -25, -24, -52,
+    -24, -20, 10, 9, -1, -9, -19, -41,
+    -17, 3, 22, 22, 22, 11, 8, -18,
+    -18, -6, 16, 25, 16, 17, 4, -18,
+    -23, -3, -1, 15, 10, -3, -20, -22,
+    -42, -20, -10, -5, -2, -20, -23, -44,
+    -29, -51, -23, -15, -22, -18, -50, -64,
+]
+
+MG_BISHOP_TABLE = [
+    -29, 4, -82, -37, -25, -42, 7, -8,
+    -26, 16, -18, -13, 30, 59, 18, -47,
+    -16, 37, 43, 40, 35, 50, 37, -2,
+    -4, 5, 19, 50, 37, 37, 7, -2,
+    -6, 13, 13, 26, 34, 12, 10, 4,
+    0, 15, 15, 15, 14, 27, 18, 10,
+    4, 15, 16, 0, 7, 21, 33, 1,
+    -33, -3, -14, -21, -13, -12, -39, -21,
+]
+
+EG_BISHOP_TABLE = [
+    -14, -21, -11, -8, -7, -9, -17, -24,
+    -8, -4, 7, -12, -3, -13, -4, -14,
+    2, -8, 0, -1, -2, 6, 0, 4,
+    -3, 9, 12, 9, 14, 10, 3, 2,
+    -6, 3, 13, 19, 7, 10, -3, -9,
+    -12, -3, 8, 10, 13, 3, -7, -15,
+    -14, -18, -7, -1, 4, -9, -15, -27,
+    -23, -9, -23, -5, -9, -16, -5, -17,
+]
+
+MG_ROOK_TABLE = [
+    32, 42, 32, 51, 63, 9, 31, 43,
+    27, 32, 58, 62, 80, 67, 26, 44,
+    -5, 19, 26, 36, 17, 45, 61, 16,
+    -24, -11, 7, 26, 24, 35, -8, -20,
+    -36, -26, -12, -1, 9, -7, 6, -23,
+    -45, -25, -16, -17, 3, 0, -5, -33,
+    -44, -16, -20, -9, -1, 11, -6, -71,
+    -19, -13, 1, 17, 16, 7, -37, -26,
+]
+
+EG_ROOK_TABLE = [
+    13, 10, 18, 15, 12, 12, 8, 5,
+    11, 13, 13, 11, -3, 3, 8, 3,
+    7, 7, 7, 5, 4, -3, -5, -3,
+    4, 3, 13, 1, 2, 1, -1, 2,
+    3, 5, 8, 4, -5, -6, -8, -11,
+    -4, 0, -5, -1, -7, -12, -8, -16,
+    -6, -6, 0, 2, -9, -9, -11, -3,
+    -9, 2, 3, -1, -5, -13, 4, -20,
+]
+
+MG_QUEEN_TABLE = [
+    -28, 0, 29, 12, 59, 44, 43, 45,
+    -24, -39, -5, 1, -16, 57, 28, 54,
+    -13, -17, 7, 8, 29, 56, 47, 57,
+    -27, -27, -16, -16, -1, 17, -2, 1,
+    -9, -26, -9, -10, -2, -4, 3, -3,
+    -14, 2, -11, -2, -5, 2, 14, 5,
+    -35, -8, 11, 2, 8, 15, -3, 1,
+    -1, -18, -9, 10, -15, -25, -31, -50,
+]
+
+EG_QUEEN_TABLE = [
+    -9, 22, 22, 27, 27, 19, 10, 20,
+    -17, 20, 32, 41, 58, 25, 30, 0,
+    -20, 6, 9, 49, 47, 35, 19, 9,
+    3, 22, 24, 45, 57, 40, 57, 36,
+    -18, 28, 19, 47, 31, 34, 39, 23,
+    -16, -27, 15, 6, 9, 17, 10, 5,
+    -22, -23, -30, -16, -16, -23, -36, -32,
+    -33, -28, -22, -43, -5, -32, -20, -41,
+]
+
+MG_KING_TABLE = [
+    -65, 23, 16, -15, -56, -34, 2, 13,
+    29, -1, -20, -7, -8, -4, -38, -29,
+    -9, 24, 2, -16, -20, 6, 22, -22,
+    -17, -20, -12, -27, -30, -25, -14, -36,
+    -49, -1, -27, -39, -46, -44, -33, -51,
+    -14, -14, -22, -46, -44, -30, -15, -27,
+    1, 7, -8, -64, -43, -16, 9, 8,
+    -15, 36, 12, -54, 8, -28, 24, 14,
+]
+
+EG_KING_TABLE = [
+    -74, -35, -18, -18, -11, 15, 4, -17,
+    -12, 17, 14, 17, 17, 38, 23, 11,
+    10, 17, 23, 15, 20, 45, 44, 13,
+    -8, 22, 24, 27, 26, 33, 26, 3,
+    -18, -4, 21, 24, 27, 23, 9, -11,
+    -19, -3, 11, 21, 23, 16, 7, -9,
+    -27, -11, 4, 13, 14, 4, -5, -17,
+    -53, -34, -21, -11, -28, -14, -24, -43,
+]
+
+MG_TABLES = [MG_PAWN_TABLE, MG_KNIGHT_TABLE, MG_BISHOP_TABLE, MG_ROOK_TABLE, MG_QUEEN_TABLE, MG_KING_TABLE]
+EG_TABLES = [EG_PAWN_TABLE, EG_KNIGHT_TABLE, EG_BISHOP_TABLE, EG_ROOK_TABLE, EG_QUEEN_TABLE, EG_KING_TABLE]
+
+
+def generate_piece_square_scores(piece_values: list, tables: list) -> list:
+    # scores[piece][square] with the material folded in and black pieces negated, so a position's
+    # score is just the sum over its pieces
+    scores = []
+    for color, sign in ((0, 1), (1, -1)):
+        for piece_type in range(6):
+            table = tables[piece_type]
+            flip = 56 * color
+            scores.append([sign * (piece_values[piece_type] + table[square ^ flip]) for square in range(64)])
+    return scores
+
+
+MG_SCORES = generate_piece_square_scores(MG_PIECE_VALUES, MG_TABLES)
+EG_SCORES = generate_piece_square_scores(EG_PIECE_VALUES, EG_TABLES)
+PHASE_SCORES = [PHASE_VALUES[piece % 6] for piece in range(12)]
+
+# Pawn structure features, white minus black counts of doubled pawns (extra pawns on a file),
+# isolated pawns (no friendly pawn on a neighbouring file) and passed pawns by how far they've
+# advanced (no enemy pawn in front of them on their own or a neighbouring file)
+DOUBLED_PAWNS = 0
+ISOLATED_PAWNS = 1
+PASSED_PAWNS = 2
+PAWN_FEATURE_COUNT = 10
+
+MG_PAWN_WEIGHTS = [-10, -10, 0, 5, 10, 15, 25, 40, 65, 0]
+EG_PAWN_WEIGHTS = [-20, -15, 0, 10, 15, 25, 45, 70, 110, 0]
+
+FILE_MASKS = [0x0101010101010101 << file for file in range(8)]
+ADJACENT_FILE_MASKS = [(FILE_MASKS[file - 1] if file > 0 else 0) | (FILE_MASKS[file + 1] if file < 7 else 0) for file in range(8)]
+
+
+def generate_passed_pawn_masks() -> tuple:
+    # Squares ahead of a pawn on its own and neighbouring files, white moves towards square 0
+    white_masks = []
+    black_masks = []
+    for square in range(64):
+        rank, file = divmod(square, 8)
+        files = FILE_MASKS[file] | ADJACENT_FILE_MASKS[file]
+        white_masks.append(files & ((1 << (rank * 8)) - 1))
+        black_masks.append(files & ~((1 << (rank * 8 + 8)) - 1) & MASK_64)
+    return white_masks, black_masks
+
+
+WHITE_PASSED_PAWN_MASKS, BLACK_PASSED_PAWN_MASKS = generate_passed_pawn_masks()
+
+# The same scores as flat weights over the features used by evaluate_batch, 768 (piece, square)
+# features followed by the pawn structure features
+FEATURE_COUNT = 768 + PAWN_FEATURE_COUNT
+MG_WEIGHTS = np.array(sum(MG_SCORES, []) + MG_PAWN_WEIGHTS, dtype=np.int32)
+EG_WEIGHTS = np.array(sum(EG_SCORES, []) + EG_PAWN_WEIGHTS, dtype=np.int32)
+PHASE_WEIGHTS = np.array(sum([[phase] * 64 for phase in PHASE_SCORES], []) + [0] * PAWN_FEATURE_COUNT, dtype=np.int32)
+
+
+def count_pawn_features(white_pawns: int, black_pawns: int) -> list:
+    features = [0] * PAWN_FEATURE_COUNT
+
+    for color, pawns, enemy_pawns, passed_pawn_masks in ((0, white_pawns, black_pawns, WHITE_PASSED_PAWN_MASKS), (1, black_pawns, white_pawns, BLACK_PASSED_PAWN_MASKS)):
+        sign = -1 if color else 1
+
+        for file in range(8):
+            file_count = (pawns & FILE_MASKS[file]).bit_count()
+            if not file_count:
+                continue
+            features[DOUBLED_PAWNS] += sign * (file_count - 1)
+            if not pawns & ADJACENT_FILE_MASKS[file]:
+                features[ISOLATED_PAWNS] += sign * file_count
+
+        for square in iterate_bits(pawns):
+            if not enemy_pawns & passed_pawn_masks[square]:
+                # Ranks counted from the pawn's own side, its starting rank is 1
+                relative_rank = square >> 3 if color else 7 - (square >> 3)
+                features[PASSED_PAWNS + relative_rank] += sign
+
+    return features
+
+
+def evaluate_pawns(white_pawns: int, black_pawns: int) -> tuple:
+    # (mg_score, eg_score) of the pawn structure, white minus black
+    mg_score = 0
+    eg_score = 0
+    for feature, count in enumerate(count_pawn_features(white_pawns, black_pawns)):
+        if count:
+            mg_score += MG_PAWN_WEIGHTS[feature] * count
+            eg_score += EG_PAWN_WEIGHTS[feature] * count
+    return mg_score, eg_score
+
+
+def get_pawn_scores(position, pawn_hash_table=None) -> tuple:
+    if pawn_hash_table is None:
+        return evaluate_pawns(position.bitboards[0], position.bitboards[6])
+
+    scores = pawn_hash_table.probe(position.pawn_hash)
+    if scores is None:
+        scores = evaluate_pawns(position.bitboards[0], position.bitboards[6])
+        pawn_hash_table.store(position.pawn_hash, scores[0], scores[1])
+    return scores
+
+
+def taper(mg_score: int, eg_score: int, phase: int) -> int:
+    # Early promotions can push the phase past the starting material
+    phase = min(phase, TOTAL_PHASE)
+    return (mg_score * phase + eg_score * (TOTAL_PHASE - phase)) // TOTAL_PHASE
+
+
+def evaluate(position, pawn_hash_table=None) -> int:
+    # Scores are from the side to move's point of view, which is what negamax expects
+    pawn_mg_score, pawn_eg_score = get_pawn_scores(position, pawn_hash_table)
+    score = taper(position.mg_score + pawn_mg_score, position.eg_score + pawn_eg_score, position.phase)
+    return -score if position.color_to_move else score
+
+
+def compute_scores(piece_board: list) -> tuple:
+    # Full recompute of (mg_score, eg_score, phase), what Position keeps incrementally
+    mg_score = 0
+    eg_score = 0
+    phase = 0
+    for square, piece in enumerate(piece_board):
+        if piece is not None:
+            mg_score += MG_SCORES[piece][square]
+            eg_score += EG_SCORES[piece][square]
+            phase += PHASE_SCORES[piece]
+    return mg_score, eg_score, phase
+
+
+def evaluate_fen(fen: str) -> int:
+    # From white's point of view, the usual convention for tuning data
+    parser = Fen()
+    parser.parse_fen(fen)
+    mg_score, eg_score, phase = compute_scores(parser.piece_board)
+    pawn_mg_score, pawn_eg_score = evaluate_pawns(parser.white_pawns, parser.black_pawns)
+    return taper(mg_score + pawn_mg_score, eg_score + pawn_eg_score, phase)
+
+
+def build_features(fens: list) -> np.ndarray:
+    # One row per fen with a 1 for every (piece, square) on the board, piece * 64 + square,
+    # followed by the pawn structure counts
+    features = np.zeros((len(fens), FEATURE_COUNT), dtype=np.int8)
+    parser = Fen()
+    for row, fen in enumerate(fens):
+        parser.parse_fen(fen)
+        for square, piece in enumerate(parser.piece_board):
+            if piece is not None:
+                features[row, piece * 64 + square] = 1
+        features[row, 768:] = count_pawn_features(parser.white_pawns, parser.black_pawns)
+    return features
+
+
+def evaluate_batch(fens: list = None, features: np.ndarray = None, mg_weights: np.ndarray = MG_WEIGHTS, eg_weights: np.ndarray = EG_WEIGHTS) -> np.ndarray:
+    # evaluate_fen for many positions at once, from white's point of view. Tuning runs can build the
+    # features once and pass them in along with their own weights on every pass.
+    if features is None:
+        features = build_features(fens)
+
+    mg_scores = features @ mg_weights
+    eg_scores = features @ eg_weights
+    phases = np.minimum(features @ PHASE_WEIGHTS, TOTAL_PHASE)
+    return (mg_scores * phases + eg_scores * (TOTAL_PHASE - phases)) // TOTAL_PHASE
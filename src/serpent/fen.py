@@ -1,24 +1,70 @@
-import numpy as np
+from .attack_tables import PAWN_ATTACKS
+from .bitboard import set_bit
+from .move import SQUARES_TO_COORDS
 from .piece import Piece
+from .zobrist import compute_hash_from_board
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Castling rights are kept as a 4 bit mask
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING_RIGHTS = 15
+
+
+def parse_epd_operations(text: str) -> dict:
+    # 'bm Nf3 Qg6; id "WAC.001";' -> {"bm": ["Nf3", "Qg6"], "id": ["WAC.001"]}. Operations end with a
+    # semicolon and operands are split on spaces, except inside double quotes.
+    operations = {}
+    tokens = []
+    token = ""
+    in_quotes = False
+
+    for char in text:
+        if char == '"':
+            in_quotes = not in_quotes
+        elif in_quotes:
+            token += char
+        elif char == ";" or char.isspace():
+            if token:
+                tokens.append(token)
+                token = ""
+            if char == ";" and tokens:
+                operations[tokens[0]] = tokens[1:]
+                tokens = []
+        else:
+            token += char
+
+    # The last operation's semicolon is sometimes missing
+    if token:
+        tokens.append(token)
+    if tokens:
+        operations[tokens[0]] = tokens[1:]
+    return operations
 
 
 class Fen():
     def __init__(self) -> None:
-        self.white_pawns = np.uint64(0)
-        self.black_pawns = np.uint64(0)
-        self.white_knights = np.uint64(0)
-        self.black_knights = np.uint64(0)
-        self.white_bishops = np.uint64(0)
-        self.black_bishops = np.uint64(0)
-        self.white_rooks = np.uint64(0)
-        self.black_rooks = np.uint64(0)
-        self.white_queens = np.uint64(0)
-        self.black_queens = np.uint64(0)
-        self.white_king = np.uint64(0)
-        self.black_king = np.uint64(0)
-        self.full_board = np.uint64(0)
-        self.white_board = np.uint64(0)
-        self.black_board = np.uint64(0)
+        self.reset()
+
+    def reset(self) -> None:
+        self.white_pawns = 0
+        self.black_pawns = 0
+        self.white_knights = 0
+        self.black_knights = 0
+        self.white_bishops = 0
+        self.black_bishops = 0
+        self.white_rooks = 0
+        self.black_rooks = 0
+        self.white_queens = 0
+        self.black_queens = 0
+        self.white_king = 0
+        self.black_king = 0
+        self.full_board = 0
+        self.white_board = 0
+        self.black_board = 0
         self.piece_board = []
         self.color_to_move = None
         self.white_castle_kingside = False
@@ -26,15 +72,21 @@ class Fen():
         self.white_castle_queenside = False
         self.black_castle_queenside = False
         self.en_passant_target_square = None
+        self.castling_rights = 0
+        self.en_passant_square = None
+        self.hash = 0
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
         self.WHITE = 0
         self.BLACK = 1
-        self.UNSIGNED_LONG_1 = np.ulonglong(1)
 
     def parse_fen(self, fen) -> None:
+        # Clear anything left over from a previously parsed fen
+        self.reset()
 
         # Example start fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1 "
         # I split by spaces to make it easier to parse / more readable
-        split_fen = fen.split(" ")
+        split_fen = fen.split()
 
         # Parsing the first section of the fen. Finding the piece positions
         # and setting them to their corresponding squares
@@ -46,40 +98,40 @@ class Fen():
             if piece_positions[fen_index].isalpha():
                 char = piece_positions[fen_index]
                 if char == "P":
-                    self.white_pawns = self.set_bit(self.white_pawns, board_index)
+                    self.white_pawns = set_bit(self.white_pawns, board_index)
                     self.piece_board.append(Piece.WHITE_PAWN)
                 elif char == "R":
-                    self.white_rooks = self.set_bit(self.white_rooks, board_index)
+                    self.white_rooks = set_bit(self.white_rooks, board_index)
                     self.piece_board.append(Piece.WHITE_ROOK)
                 elif char == "B":
-                    self.white_bishops = self.set_bit(self.white_bishops, board_index)
+                    self.white_bishops = set_bit(self.white_bishops, board_index)
                     self.piece_board.append(Piece.WHITE_BISHOP)
                 elif char == "N":
-                    self.white_knights = self.set_bit(self.white_knights, board_index)
+                    self.white_knights = set_bit(self.white_knights, board_index)
                     self.piece_board.append(Piece.WHITE_KNIGHT)
                 elif char == "Q":
-                    self.white_queens = self.set_bit(self.white_queens, board_index)
+                    self.white_queens = set_bit(self.white_queens, board_index)
                     self.piece_board.append(Piece.WHITE_QUEEN)
                 elif char == "K":
-                    self.white_king = self.set_bit(self.white_king, board_index)
+                    self.white_king = set_bit(self.white_king, board_index)
                     self.piece_board.append(Piece.WHITE_KING)
                 elif char == "p":
-                    self.black_pawns = self.set_bit(self.black_pawns, board_index)
+                    self.black_pawns = set_bit(self.black_pawns, board_index)
                     self.piece_board.append(Piece.BLACK_PAWN)
                 elif char == "r":
-                    self.black_rooks = self.set_bit(self.black_rooks, board_index)
+                    self.black_rooks = set_bit(self.black_rooks, board_index)
                     self.piece_board.append(Piece.BLACK_ROOK)
                 elif char == "b":
-                    self.black_bishops = self.set_bit(self.black_bishops, board_index)
+                    self.black_bishops = set_bit(self.black_bishops, board_index)
                     self.piece_board.append(Piece.BLACK_BISHOP)
                 elif char == "n":
-                    self.black_knights = self.set_bit(self.black_knights, board_index)
+                    self.black_knights = set_bit(self.black_knights, board_index)
                     self.piece_board.append(Piece.BLACK_KNIGHT)
                 elif char == "q":
-                    self.black_queens = self.set_bit(self.black_queens, board_index)
+                    self.black_queens = set_bit(self.black_queens, board_index)
                     self.piece_board.append(Piece.BLACK_QUEEN)
                 elif char == "k":
-                    self.black_king = self.set_bit(self.black_king, board_index)
+                    self.black_king = set_bit(self.black_king, board_index)
                     self.piece_board.append(Piece.BLACK_KING)
             else:
                 board_index += int(piece_positions[fen_index]) - 1
@@ -106,12 +158,62 @@ class Fen():
         # Settings enpassant target square
         self.en_passant_target_square = None if "-" in split_fen[3] else split_fen[3]
 
+        # Move clocks are optional, epd leaves them off and may have operations where they would be
+        if len(split_fen) > 5 and split_fen[4].isdigit() and split_fen[5].isdigit():
+            self.halfmove_clock = int(split_fen[4])
+            self.fullmove_number = int(split_fen[5])
+
         self.set_full_board()
         self.set_white_board()
         self.set_black_board()
+        self.set_castling_rights()
+        self.set_en_passant_square()
+
+        # Computed once here, Position keeps it up to date with XORs from then on
+        self.hash = compute_hash_from_board(self.piece_board, self.color_to_move, self.castling_rights, self.en_passant_square)
+
+    def parse_epd(self, epd: str) -> dict:
+        # An epd line is the first four fen fields followed by operations like
+        #   bm Qg6; id "WAC.001";
+        # Parses the position like parse_fen and returns the operations, opcode -> list of operands.
+        # The hmvc and fmvn operations stand in for the move clocks. Lines that kept the fen's own clocks
+        # before the operations are read too.
+        split_epd = epd.split(maxsplit=4)
+        self.parse_fen(" ".join(split_epd[:4]))
+
+        rest = split_epd[4] if len(split_epd) > 4 else ""
+        clocks = rest.split(maxsplit=2)
+        if len(clocks) >= 2 and clocks[0].isdigit() and clocks[1].isdigit():
+            self.halfmove_clock = int(clocks[0])
+            self.fullmove_number = int(clocks[1])
+            rest = clocks[2] if len(clocks) > 2 else ""
+
+        operations = parse_epd_operations(rest)
+        if operations.get("hmvc", [""])[0].isdigit():
+            self.halfmove_clock = int(operations["hmvc"][0])
+        if operations.get("fmvn", [""])[0].isdigit():
+            self.fullmove_number = int(operations["fmvn"][0])
+        return operations
+
+    def set_castling_rights(self) -> None:
+        self.castling_rights = (
+            (WHITE_KINGSIDE if self.white_castle_kingside else 0)
+            | (WHITE_QUEENSIDE if self.white_castle_queenside else 0)
+            | (BLACK_KINGSIDE if self.black_castle_kingside else 0)
+            | (BLACK_QUEENSIDE if self.black_castle_queenside else 0)
+        )
+
+    def set_en_passant_square(self) -> None:
+        # Fens often list the en passant square after every double push. We only keep it when a
+        # pawn can actually capture there, otherwise the same position would get two keys.
+        self.en_passant_square = None
+        if self.en_passant_target_square is None:
+            return
 
-    def set_bit(self, board, index) -> None:
-        return board | (self.UNSIGNED_LONG_1 << np.ulonglong(index))
+        square = SQUARES_TO_COORDS.index(self.en_passant_target_square)
+        pawns = self.white_pawns if self.color_to_move == self.WHITE else self.black_pawns
+        if PAWN_ATTACKS[self.color_to_move ^ 1][square] & pawns:
+            self.en_passant_square = square
 
     def set_full_board(self) -> None:
         self.full_board = self.white_pawns | self.white_knights | self.white_bishops | self.white_queens | self.white_rooks | self.white_king | self.black_pawns | self.black_knights | self.black_bishops | self.black_queens | self.black_rooks | self.black_king
@@ -146,5 +248,10 @@ class Fen():
             "black_castle_kingside": self.black_castle_kingside,
             "black_castle_queenside": self.black_castle_queenside,
             "en_passant_target_square": self.en_passant_target_square,
+            "castling_rights": self.castling_rights,
+            "en_passant_square": self.en_passant_square,
+            "hash": self.hash,
+            "halfmove_clock": self.halfmove_clock,
+            "fullmove_number": self.fullmove_number,
             "color_to_move": self.color_to_move
         }
@@ -0,0 +1,196 @@
+import random
+from .bitboard import MASK_64, pop_count
+
+# Squares are indexed a8 = 0 through h1 = 63, the same as the rest of serpent.
+# Directions are (rank, file) steps.
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+# Found by MagicBitboards.find_magics with its default seed. Searching takes close to a minute in Python,
+# filling the attack tables from known magics a fraction of a second.
+BISHOP_MAGICS = [
+    0x0010C21808022040, 0x0890106E02802030, 0x400401020A101000, 0x8404040294003508,
+    0x0002021020800000, 0x8501100804004010, 0x421044100412002A, 0x0202008201016000,
+    0x1024400218021482, 0x0000420208420084, 0x0008C10410808021, 0x8200C22082004801,
+    0x3400108820805808, 0x5A0002C820100B02, 0x000004212808040C, 0x0004020201442224,
+    0x040410C010840110, 0x0410004802080065, 0x088401058C040040, 0x0014001840102000,
+    0x0005000190400028, 0x0500800108200200, 0x08420D4082100204, 0x3300260101011000,
+    0x0021700228100100, 0x0004020210424808, 0x0040405068020240, 0x060040400C010200,
+    0x0501001001004000, 0x001243010A048200, 0x0001220004009440, 0x880C008001005100,
+    0x8004100600400410, 0x0002108400100101, 0x0012105000480C80, 0x0302120180080080,
+    0x0040520021020080, 0x80A4024180341000, 0x00850D2400010448, 0x0000C08102248400,
+    0x0108822010006002, 0x4200920803006000, 0x0010140201000800, 0x0C08484010400200,
+    0x0880202009008082, 0x08404C1482804C08, 0x0002589304080100, 0x000A041902022230,
+    0x0014941420048800, 0x0408404808380401, 0x0801008400880102, 0x9008000042088000,
+    0x400004C405040020, 0x8800080B38020808, 0x0004200802008610, 0x0820210921010041,
+    0x5260184802082000, 0x1000030118010401, 0x5020480A02133400, 0x000000A00020A802,
+    0x0C00020010020212, 0x0040040820480220, 0x000108E018008108, 0x0002020801040880,
+]
+ROOK_MAGICS = [
+    0x26800422C0008110, 0x0040002000100040, 0x0200084200241080, 0x1880068010000800,
+    0x1900100402080100, 0x0200080490010200, 0x03000C4100008A00, 0x22800A4100042A80,
+    0xC814800022400086, 0x4400400020100048, 0xD200808020001000, 0x4412001008402600,
+    0x1001000408001100, 0x0212000802011004, 0x404200014A001488, 0x0040800080004100,
+    0x0000908000400822, 0x00B0004000402008, 0x0000848020001000, 0x0020090021001000,
+    0x1004008008000480, 0x0C01010002080400, 0x0000140028110250, 0x022002000100508C,
+    0xE000802080004001, 0x0410004040002010, 0x0081200100110B40, 0x0202004200100C20,
+    0x0004040080080080, 0x002A000200041009, 0x0024020080800100, 0xA280110200208044,
+    0x0000400080800023, 0x8000400080802001, 0x0000402001001900, 0x14D0008111800800,
+    0x0010040080800802, 0x0200020080800400, 0x6101000401010200, 0x0041040442000991,
+    0x000060C00D808002, 0x0450002000414000, 0x0001004020050010, 0x0001100500A10008,
+    0x0088040008008080, 0x0002200410080140, 0x0000010002008080, 0x0004108519520004,
+    0x002E2100C8801100, 0x0082401000200140, 0x0001001420004900, 0x2C00221000390300,
+    0x4981001008000500, 0x0010800400060180, 0x0040014210080400, 0x0000004C10810200,
+    0x0500914024800101, 0x0000402082010012, 0x0002200010084301, 0x8000100100200409,
+    0x0409000208009005, 0x8812000108041002, 0x0040100102482084, 0x0410102411008042,
+]
+
+
+def generate_slider_mask(square: int, directions: list) -> int:
+    # Every square a slider on this square could be blocked on. The last square of each ray
+    # is left out since a piece there can't block anything behind it.
+    mask = 0
+    rank, file = divmod(square, 8)
+
+    for rank_step, file_step in directions:
+        target_rank = rank + rank_step
+        target_file = file + file_step
+        while 0 <= target_rank + rank_step < 8 and 0 <= target_file + file_step < 8:
+            mask |= 1 << (target_rank * 8 + target_file)
+            target_rank += rank_step
+            target_file += file_step
+
+    return mask
+
+
+def generate_slider_attacks(square: int, occupancy: int, directions: list) -> int:
+    # Slow ray walk, only used to fill the tables and to verify magic candidates
+    attacks = 0
+    rank, file = divmod(square, 8)
+
+    for rank_step, file_step in directions:
+        target_rank = rank + rank_step
+        target_file = file + file_step
+        while 0 <= target_rank < 8 and 0 <= target_file < 8:
+            target_square = target_rank * 8 + target_file
+            attacks |= 1 << target_square
+            if occupancy & (1 << target_square):
+                break
+            target_rank += rank_step
+            target_file += file_step
+
+    return attacks
+
+
+def generate_occupancy(index: int, mask: int) -> int:
+    # Spread the bits of index over the set bits of mask, giving every blocker subset of
+    # the mask as index counts from 0 to 2^popcount(mask) - 1
+    occupancy = 0
+    bit = 0
+
+    while mask:
+        square_bit = mask & -mask
+        if index & (1 << bit):
+            occupancy |= square_bit
+        mask ^= square_bit
+        bit += 1
+
+    return occupancy
+
+
+def generate_attack_table(square: int, magic: int, mask: int, shift: int, directions: list) -> list:
+    # Attacks for every blocker subset of the mask, at the index its magic hashes it to. Each ray only
+    # depends on the blockers on it, so the rays are walked once per subset of their own few bits and
+    # the subsets of the whole mask just combine them.
+    rays = []
+    for direction in directions:
+        ray_mask = mask & generate_slider_attacks(square, 0, [direction])
+        ray_attacks = {}
+        occupancy = 0
+        while True:
+            ray_attacks[occupancy] = generate_slider_attacks(square, occupancy, [direction])
+            # Carry-Rippler, steps through every subset of the mask
+            occupancy = (occupancy - ray_mask) & ray_mask
+            if not occupancy:
+                break
+        rays.append((ray_mask, ray_attacks))
+
+    (mask_0, attacks_0), (mask_1, attacks_1), (mask_2, attacks_2), (mask_3, attacks_3) = rays
+    table = [0] * (1 << (64 - shift))
+    occupancy = 0
+    while True:
+        table[((occupancy * magic) & MASK_64) >> shift] = attacks_0[occupancy & mask_0] | attacks_1[occupancy & mask_1] | attacks_2[occupancy & mask_2] | attacks_3[occupancy & mask_3]
+        occupancy = (occupancy - mask) & mask
+        if not occupancy:
+            break
+    return table
+
+
+BISHOP_MASKS = [generate_slider_mask(square, BISHOP_DIRECTIONS) for square in range(64)]
+ROOK_MASKS = [generate_slider_mask(square, ROOK_DIRECTIONS) for square in range(64)]
+BISHOP_SHIFTS = [64 - pop_count(mask) for mask in BISHOP_MASKS]
+ROOK_SHIFTS = [64 - pop_count(mask) for mask in ROOK_MASKS]
+
+# Built once at import and shared by every MagicBitboards, nothing ever writes to them
+BISHOP_ATTACKS = [generate_attack_table(square, BISHOP_MAGICS[square], BISHOP_MASKS[square], BISHOP_SHIFTS[square], BISHOP_DIRECTIONS) for square in range(64)]
+ROOK_ATTACKS = [generate_attack_table(square, ROOK_MAGICS[square], ROOK_MASKS[square], ROOK_SHIFTS[square], ROOK_DIRECTIONS) for square in range(64)]
+
+
+class MagicBitboards():
+    def __init__(self) -> None:
+        self.bishop_masks = BISHOP_MASKS
+        self.rook_masks = ROOK_MASKS
+        self.bishop_shifts = BISHOP_SHIFTS
+        self.rook_shifts = ROOK_SHIFTS
+
+        self.bishop_magics = BISHOP_MAGICS
+        self.rook_magics = ROOK_MAGICS
+        self.bishop_attacks = BISHOP_ATTACKS
+        self.rook_attacks = ROOK_ATTACKS
+
+    def find_magics(self, seed: int = 1804289383) -> None:
+        # Searches for new magics, how BISHOP_MAGICS and ROOK_MAGICS were found. Seeded so every run
+        # finds the same ones. The results replace this instance's tables only.
+        rng = random.Random(seed)
+        self.bishop_magics = [0] * 64
+        self.rook_magics = [0] * 64
+        self.bishop_attacks = [[] for _ in range(64)]
+        self.rook_attacks = [[] for _ in range(64)]
+
+        for square in range(64):
+            self.bishop_magics[square], self.bishop_attacks[square] = self.find_magic(square, self.bishop_masks[square], self.bishop_shifts[square], BISHOP_DIRECTIONS, rng)
+            self.rook_magics[square], self.rook_attacks[square] = self.find_magic(square, self.rook_masks[square], self.rook_shifts[square], ROOK_DIRECTIONS, rng)
+
+    def find_magic(self, square: int, mask: int, shift: int, directions: list, rng: random.Random) -> tuple:
+        relevant_bits = 64 - shift
+        occupancy_count = 1 << relevant_bits
+
+        occupancies = [generate_occupancy(index, mask) for index in range(occupancy_count)]
+        attacks = [generate_slider_attacks(square, occupancy, directions) for occupancy in occupancies]
+
+        while True:
+            # Candidates with few set bits make much better magics
+            magic = rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
+            if pop_count((mask * magic) & 0xFF00000000000000) < 6:
+                continue
+
+            table = [None] * occupancy_count
+            for occupancy, attack in zip(occupancies, attacks):
+                index = ((occupancy * magic) & MASK_64) >> shift
+                if table[index] is None:
+                    table[index] = attack
+                elif table[index] != attack:
+                    break
+            else:
+                return magic, [attack or 0 for attack in table]
+
+    def get_bishop_attacks(self, square: int, occupancy: int) -> int:
+        index = (((occupancy & self.bishop_masks[square]) * self.bishop_magics[square]) & MASK_64) >> self.bishop_shifts[square]
+        return self.bishop_attacks[square][index]
+
+    def get_rook_attacks(self, square: int, occupancy: int) -> int:
+        index = (((occupancy & self.rook_masks[square]) * self.rook_magics[square]) & MASK_64) >> self.rook_shifts[square]
+        return self.rook_attacks[square][index]
+
+    def get_queen_attacks(self, square: int, occupancy: int) -> int:
+        return self.get_bishop_attacks(square, occupancy) | self.get_rook_attacks(square, occupancy)
@@ -0,0 +1,551 @@
+import math
+import os
+import queue
+import random
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from datetime import date
+from statistics import NormalDist
+from .fen import START_FEN, Fen
+from .move import NULL_MOVE
+from .move_generator import MoveGenerator
+from .piece import BISHOP, KNIGHT, PAWN, QUEEN, ROOK
+from .position import Position
+
+# "serpent" as an engine command runs this copy of Serpent with the same interpreter
+SERPENT_MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+# Seconds an engine gets to answer uci / isready
+ENGINE_START_TIMEOUT = 30.0
+# Slack past an engine's clock before it loses on time, pipes and process scheduling aren't free
+TIME_MARGIN = 0.1
+# Seconds to wait for a move searched to a depth or node count, where no clock says when it's late
+MOVE_TIMEOUT = 600.0
+
+# Engine scores are clamped to this, a mate counts as the biggest score there is
+MAX_SCORE = 100000
+
+DEFAULT_ADJUDICATION = {
+    # A side is adjudicated lost once both engines agreed it's down by resign_score for resign_moves moves
+    "resign_score": 1000,
+    "resign_moves": 3,
+    # A draw once both engines scored the game within draw_score for draw_moves moves, from move draw_move_number on
+    "draw_score": 10,
+    "draw_moves": 8,
+    "draw_move_number": 40,
+    # Games still going after this many moves are drawn
+    "max_moves": 200,
+}
+
+# SPRT error rates, the chances of accepting elo1 when elo0 is true and the other way round
+SPRT_ALPHA = 0.05
+SPRT_BETA = 0.05
+
+RESULT_WHITE_WINS = "1-0"
+RESULT_BLACK_WINS = "0-1"
+RESULT_DRAW = "1/2-1/2"
+
+
+class EngineError(Exception):
+    pass
+
+
+def parse_engine_spec(spec: str) -> tuple:
+    # "serpent option.Hash=32" -> (command, options). Anything of the form option.Name=Value becomes
+    # a setoption, the rest is the command line. A bare "serpent" starts this copy of Serpent.
+    command = []
+    options = {}
+    for token in shlex.split(spec):
+        if token.startswith("option.") and "=" in token:
+            name, value = token[len("option."):].split("=", 1)
+            options[name] = value
+        else:
+            command.append(token)
+
+    if command and command[0] == "serpent":
+        command = [sys.executable, SERPENT_MAIN] + command[1:]
+    return command, options
+
+
+def parse_time_control(time_control: str) -> tuple:
+    # "10+0.1" -> (10.0, 0.1), base and increment in seconds
+    base, _, increment = time_control.partition("+")
+    return float(base), float(increment) if increment else 0.0
+
+
+def read_openings(path: str) -> list:
+    # One fen or epd per line, epd operations other than the move clocks are ignored
+    openings = []
+    with open(path, "r") as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                parser = Fen()
+                fields = line.split()
+                if len(fields) == 6 and fields[4].isdigit() and fields[5].isdigit():
+                    parser.parse_fen(line)
+                else:
+                    parser.parse_epd(line)
+                position = Position()
+                position.generate_position_from_fen(parser.get_parsed_fen())
+                openings.append(position.get_fen())
+    return openings
+
+
+def has_insufficient_material(position: Position) -> bool:
+    # Bare kings, or one minor piece between both sides, can't mate
+    bitboards = position.bitboards
+    for piece in (PAWN, ROOK, QUEEN):
+        if bitboards[piece] or bitboards[6 + piece]:
+            return False
+    minor_pieces = bitboards[KNIGHT] | bitboards[BISHOP] | bitboards[6 + KNIGHT] | bitboards[6 + BISHOP]
+    return minor_pieces.bit_count() <= 1
+
+
+def get_game_result(move_generator: MoveGenerator, position: Position) -> tuple:
+    # (result, reason) once the rules end the game, (None, None) while it goes on
+    if not move_generator.generate_legal_moves(position):
+        if move_generator.is_in_check(position):
+            return (RESULT_BLACK_WINS, "Black mates") if position.color_to_move == 0 else (RESULT_WHITE_WINS, "White mates")
+        return RESULT_DRAW, "Draw by stalemate"
+    if position.halfmove_clock >= 100:
+        return RESULT_DRAW, "Draw by fifty move rule"
+    if position.count_repetitions() >= 2:
+        return RESULT_DRAW, "Draw by threefold repetition"
+    if has_insufficient_material(position):
+        return RESULT_DRAW, "Draw by insufficient material"
+    return None, None
+
+
+def get_elo(score: float) -> float:
+    if score <= 0.0:
+        return -math.inf
+    if score >= 1.0:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def get_score_stats(wins: int, draws: int, losses: int) -> tuple:
+    # Mean score per game and its per game variance
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    return score, variance
+
+
+def get_elo_difference(wins: int, draws: int, losses: int) -> tuple:
+    # (elo, 95% error margin) of the first engine over the second
+    games = wins + draws + losses
+    if not games:
+        return 0.0, 0.0
+    score, variance = get_score_stats(wins, draws, losses)
+    margin = NormalDist().inv_cdf(0.975) * math.sqrt(variance / games)
+    return get_elo(score), (get_elo(score + margin) - get_elo(score - margin)) / 2
+
+
+def get_los(wins: int, losses: int) -> float:
+    # Likelihood of superiority, the chance the first engine is the stronger one. Draws say nothing either way.
+    if not wins + losses:
+        return 0.5
+    return 0.5 * (1 + math.erf((wins - losses) / math.sqrt(2 * (wins + losses))))
+
+
+def get_sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    # Log likelihood ratio of elo1 against elo0, with the game scores taken as normally distributed
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    score, variance = get_score_stats(wins, draws, losses)
+    if variance == 0:
+        return 0.0
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def get_sprt_bounds(alpha: float = SPRT_ALPHA, beta: float = SPRT_BETA) -> tuple:
+    # elo0 is accepted below the lower bound, elo1 above the upper one
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def format_pgn(game: dict) -> str:
+    headers = [
+        ("Event", game["event"]),
+        ("Site", "?"),
+        ("Date", game["date"]),
+        ("Round", str(game["round"])),
+        ("White", game["white"]),
+        ("Black", game["black"]),
+        ("Result", game["result"]),
+    ]
+    if game["fen"] != START_FEN:
+        headers += [("SetUp", "1"), ("FEN", game["fen"])]
+    headers += [("TimeControl", game["time_control"]), ("Termination", game["termination"]), ("PlyCount", str(len(game["moves"])))]
+
+    tokens = []
+    fen_fields = game["fen"].split()
+    move_number = int(fen_fields[5])
+    black_to_move = fen_fields[1] == "b"
+    if black_to_move and game["moves"]:
+        tokens.append(f"{move_number}...")
+    for san in game["moves"]:
+        if not black_to_move:
+            tokens.append(f"{move_number}.")
+        tokens.append(san)
+        if black_to_move:
+            move_number += 1
+        black_to_move = not black_to_move
+    tokens += ["{" + game["reason"] + "}", game["result"]]
+
+    # Movetext lines stay under 80 characters
+    lines = []
+    line = ""
+    for token in tokens:
+        if line and len(line) + len(token) + 1 > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+
+    return "\n".join(f'[{name} "{value}"]' for name, value in headers) + "\n\n" + "\n".join(lines) + "\n\n"
+
+
+class UciEngine():
+    # One engine process spoken to over uci. A reader thread moves its output into a queue, so every
+    # wait on the engine can time out instead of hanging on a pipe.
+    def __init__(self, command: list, options: dict = None) -> None:
+        self.command = command
+        self.options = options if options else {}
+        self.name = os.path.basename(command[-1])
+        self.process = None
+        self.lines = None
+
+    def start(self) -> None:
+        try:
+            self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        except OSError as error:
+            raise EngineError(f"{self.name} could not be started: {error.strerror}")
+        self.lines = queue.Queue()
+        threading.Thread(target=self.read_output, args=(self.process, self.lines), daemon=True).start()
+
+        self.send("uci")
+        deadline = time.perf_counter() + ENGINE_START_TIMEOUT
+        while True:
+            line = self.read_line(deadline)
+            if line.startswith("id name "):
+                self.name = line[len("id name "):]
+            elif line == "uciok":
+                break
+
+        for name, value in self.options.items():
+            self.send(f"setoption name {name} value {value}")
+        self.wait_ready()
+
+    def read_output(self, process: subprocess.Popen, lines: queue.Queue) -> None:
+        for line in process.stdout:
+            lines.put(line.strip())
+        # The engine is gone
+        lines.put(None)
+
+    def send(self, line: str) -> None:
+        if self.process is None:
+            raise EngineError(f"{self.name} is not running")
+        try:
+            self.process.stdin.write(line + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise EngineError(f"{self.name} closed its input")
+
+    def read_line(self, deadline: float) -> str:
+        try:
+            line = self.lines.get(timeout=max(deadline - time.perf_counter(), 0))
+        except queue.Empty:
+            raise EngineError(f"{self.name} timed out")
+        if line is None:
+            raise EngineError(f"{self.name} exited")
+        return line
+
+    def wait_ready(self) -> None:
+        self.send("isready")
+        deadline = time.perf_counter() + ENGINE_START_TIMEOUT
+        while self.read_line(deadline) != "readyok":
+            pass
+
+    def new_game(self) -> None:
+        self.send("ucinewgame")
+        self.wait_ready()
+
+    def go(self, fen: str, moves: list, go_command: str, timeout: float) -> tuple:
+        # (uci move, score, seconds taken) for the position after the moves from fen. The score is the
+        # engine's last reported one, from its own point of view.
+        self.send(f"position fen {fen}" + (" moves " + " ".join(moves) if moves else ""))
+        start_time = time.perf_counter()
+        self.send(go_command)
+
+        score = None
+        deadline = start_time + timeout
+        while True:
+            line = self.read_line(deadline)
+            if line.startswith("bestmove"):
+                tokens = line.split()
+                return tokens[1] if len(tokens) > 1 else "0000", score, time.perf_counter() - start_time
+
+            tokens = line.split()
+            if tokens and tokens[0] == "info" and "score" in tokens:
+                index = tokens.index("score")
+                if index + 2 < len(tokens) and tokens[index + 2].lstrip("-").isdigit():
+                    value = int(tokens[index + 2])
+                    if tokens[index + 1] == "cp":
+                        score = max(min(value, MAX_SCORE), -MAX_SCORE)
+                    elif tokens[index + 1] == "mate":
+                        score = MAX_SCORE if value > 0 else -MAX_SCORE
+
+    def quit(self) -> None:
+        if self.process is None:
+            return
+        try:
+            self.send("quit")
+            self.process.wait(timeout=2)
+        except (EngineError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+
+class Match():
+    # Plays two uci engines against each other over a number of concurrent games. Every opening is
+    # played twice with the colors swapped. Each worker thread keeps its own pair of engine processes
+    # for all the games it plays, the threads only wait on pipes so the engines get the cores.
+    def __init__(self, engine_specs: list, games: int = 2, concurrency: int = 1, openings: list = None, time_control: str = None,
+                 limits: dict = None, adjudication: dict = None, pgn_path: str = None, sprt: tuple = None, seed: int = None) -> None:
+        # limits are a per move max_depth / max_nodes / max_time, used when there is no time control
+        self.engine_specs = engine_specs
+        self.games = games
+        self.concurrency = concurrency
+        # A copy, the shuffle below mustn't reorder the caller's list
+        self.openings = list(openings) if openings else [START_FEN]
+        self.time_control = time_control
+        self.limits = limits if limits else {}
+        self.adjudication = adjudication
+        self.pgn_path = pgn_path
+        self.sprt = sprt
+
+        if seed is not None:
+            random.Random(seed).shuffle(self.openings)
+
+        self.tasks = queue.Queue()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.results = []
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.engine_names = ["engine1", "engine2"]
+
+    def run(self) -> dict:
+        for game_index in range(self.games):
+            self.tasks.put(game_index)
+
+        start_time = time.perf_counter()
+        threads = [threading.Thread(target=self.run_worker) for _ in range(min(self.concurrency, self.games))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return {
+            "engines": self.engine_names,
+            "games": len(self.results),
+            "wins": self.wins,
+            "draws": self.draws,
+            "losses": self.losses,
+            "time": time.perf_counter() - start_time,
+            "results": sorted(self.results, key=lambda game: game["round"]),
+        }
+
+    def run_worker(self) -> None:
+        # Legal move and san work happens here, and MoveGenerator keeps per call state, so one per thread
+        move_generator = MoveGenerator()
+        engines = [UciEngine(*parse_engine_spec(spec)) for spec in self.engine_specs]
+        try:
+            while not self.stopped.is_set():
+                try:
+                    game_index = self.tasks.get_nowait()
+                except queue.Empty:
+                    break
+
+                # Engines that crashed or hung last game are started over
+                try:
+                    for engine in engines:
+                        if engine.process is None:
+                            engine.start()
+                        engine.new_game()
+                except EngineError as error:
+                    print(f"Could not start engine: {error}", flush=True)
+                    self.stopped.set()
+                    break
+
+                game = self.play_game(move_generator, engines, game_index)
+                self.add_result(game)
+        finally:
+            for engine in engines:
+                engine.quit()
+
+    def play_game(self, move_generator: MoveGenerator, engines: list, game_index: int) -> dict:
+        fen = self.openings[(game_index // 2) % len(self.openings)]
+        # Engine 1 is white in even games, the odd game after it replays the opening with colors swapped
+        players = engines if game_index % 2 == 0 else engines[::-1]
+
+        position = Position()
+        position.set_fen(fen)
+        uci_moves = []
+        san_moves = []
+        scores = []
+        result, reason, termination = None, None, "normal"
+
+        if self.time_control:
+            base, increment = parse_time_control(self.time_control)
+            clocks = [base, base]
+
+        while result is None:
+            result, reason = get_game_result(move_generator, position)
+            if result:
+                break
+            result, reason = self.adjudicate(scores)
+            if result:
+                termination = "adjudication"
+                break
+
+            color = position.color_to_move
+            engine = players[color]
+            if self.time_control:
+                go_command = f"go wtime {int(clocks[0] * 1000)} btime {int(clocks[1] * 1000)} winc {int(increment * 1000)} binc {int(increment * 1000)}"
+                timeout = clocks[color] + TIME_MARGIN
+            else:
+                go_command = "go"
+                if self.limits.get("max_depth"):
+                    go_command += f" depth {self.limits['max_depth']}"
+                if self.limits.get("max_nodes"):
+                    go_command += f" nodes {self.limits['max_nodes']}"
+                if self.limits.get("max_time"):
+                    go_command += f" movetime {int(self.limits['max_time'] * 1000)}"
+                timeout = self.limits["max_time"] + 1 if self.limits.get("max_time") else MOVE_TIMEOUT
+
+            loser_result = RESULT_BLACK_WINS if color == 0 else RESULT_WHITE_WINS
+            side = "White" if color == 0 else "Black"
+            try:
+                uci_move, score, elapsed_time = engine.go(fen, uci_moves, go_command, timeout)
+            except EngineError as error:
+                # A hung engine gets killed and restarted for its next game
+                engine.quit()
+                timed_out = str(error).endswith("timed out")
+                result, reason = loser_result, f"{side} loses on time" if timed_out else f"{side} disconnects"
+                termination = "time forfeit" if timed_out else "abandoned"
+                break
+
+            if self.time_control:
+                clocks[color] -= elapsed_time
+                if clocks[color] < -TIME_MARGIN:
+                    result, reason, termination = loser_result, f"{side} loses on time", "time forfeit"
+                    break
+                clocks[color] = max(clocks[color], 0) + increment
+
+            move = move_generator.parse_uci_move(position, uci_move)
+            if move == NULL_MOVE:
+                result, reason, termination = loser_result, f"{side} makes an illegal move: {uci_move}", "rules infraction"
+                break
+
+            san_moves.append(move_generator.move_to_san(position, move))
+            uci_moves.append(uci_move)
+            # Kept from white's point of view
+            scores.append(None if score is None else (score if color == 0 else -score))
+            position.make_move(move)
+
+        return {
+            "event": "Serpent match",
+            "date": date.today().strftime("%Y.%m.%d"),
+            "round": game_index + 1,
+            "white": players[0].name,
+            "black": players[1].name,
+            "engine1_white": game_index % 2 == 0,
+            "fen": fen,
+            "time_control": self.time_control if self.time_control else "-",
+            "moves": san_moves,
+            "result": result,
+            "reason": reason,
+            "termination": termination,
+        }
+
+    def adjudicate(self, scores: list) -> tuple:
+        # (result, reason) when the engines' own scores settle the game, (None, None) otherwise
+        adjudication = self.adjudication
+        if not adjudication:
+            return None, None
+
+        if len(scores) >= 2 * adjudication["max_moves"]:
+            return RESULT_DRAW, "Draw by move limit"
+
+        # Both engines have to agree, so look at the last moves of both sides
+        resign_plies = 2 * adjudication["resign_moves"]
+        recent_scores = scores[-resign_plies:]
+        if len(recent_scores) == resign_plies and None not in recent_scores:
+            if all(score >= adjudication["resign_score"] for score in recent_scores):
+                return RESULT_WHITE_WINS, "Black resigns (adjudication)"
+            if all(score <= -adjudication["resign_score"] for score in recent_scores):
+                return RESULT_BLACK_WINS, "White resigns (adjudication)"
+
+        draw_plies = 2 * adjudication["draw_moves"]
+        recent_scores = scores[-draw_plies:]
+        if len(scores) >= 2 * adjudication["draw_move_number"] and len(recent_scores) == draw_plies and None not in recent_scores:
+            if all(abs(score) <= adjudication["draw_score"] for score in recent_scores):
+                return RESULT_DRAW, "Draw (adjudication)"
+
+        return None, None
+
+    def add_result(self, game: dict) -> None:
+        with self.lock:
+            self.results.append(game)
+            engine1_white = game["engine1_white"]
+            self.engine_names = [game["white"], game["black"]] if engine1_white else [game["black"], game["white"]]
+
+            if game["result"] == RESULT_DRAW:
+                self.draws += 1
+            elif (game["result"] == RESULT_WHITE_WINS) == engine1_white:
+                self.wins += 1
+            else:
+                self.losses += 1
+
+            if self.pgn_path:
+                with open(self.pgn_path, "a") as file:
+                    file.write(format_pgn(game))
+
+            self.print_status(game)
+
+            if self.sprt:
+                lower_bound, upper_bound = get_sprt_bounds()
+                llr = get_sprt_llr(self.wins, self.draws, self.losses, *self.sprt)
+                if llr <= lower_bound or llr >= upper_bound:
+                    print(f"SPRT: {'H1' if llr >= upper_bound else 'H0'} accepted", flush=True)
+                    self.stopped.set()
+
+    def print_status(self, game: dict) -> None:
+        games = self.wins + self.draws + self.losses
+        print(f"Finished game {game['round']} ({game['white']} vs {game['black']}): {game['result']} {{{game['reason']}}}")
+        score, _ = get_score_stats(self.wins, self.draws, self.losses)
+        print(f"Score of {self.engine_names[0]} vs {self.engine_names[1]}: {self.wins} - {self.losses} - {self.draws} [{score:.3f}] {games}")
+
+        elo, margin = get_elo_difference(self.wins, self.draws, self.losses)
+        if math.isfinite(elo) and math.isfinite(margin):
+            print(f"Elo difference: {elo:.1f} +/- {margin:.1f}, LOS: {get_los(self.wins, self.losses):.1%}")
+        else:
+            print(f"Elo difference: {elo:.1f}, LOS: {get_los(self.wins, self.losses):.1%}")
+
+        if self.sprt:
+            lower_bound, upper_bound = get_sprt_bounds()
+            llr = get_sprt_llr(self.wins, self.draws, self.losses, *self.sprt)
+            print(f"SPRT: llr {llr:.2f} ({lower_bound:.2f}, {upper_bound:.2f}) [{self.sprt[0]:g}, {self.sprt[1]:g}]")
+        print(flush=True)
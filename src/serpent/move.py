@@ -0,0 +1,137 @@
+from array import array
+
+# Moves are packed into 16 bit ints:
+#   bits 0 - 5    source square
+#   bits 6 - 11   target square
+#   bits 12 - 15  flags
+# Flag layout follows the usual "from-to with flags" scheme, the capture flag is bit 2 of the
+# flags and the promotion flag is bit 3, with the promotion piece in the low two bits.
+
+QUIET = 0
+DOUBLE_PAWN_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EN_PASSANT = 5
+KNIGHT_PROMOTION = 8
+BISHOP_PROMOTION = 9
+ROOK_PROMOTION = 10
+QUEEN_PROMOTION = 11
+KNIGHT_PROMOTION_CAPTURE = 12
+BISHOP_PROMOTION_CAPTURE = 13
+ROOK_PROMOTION_CAPTURE = 14
+QUEEN_PROMOTION_CAPTURE = 15
+
+CAPTURE_FLAG = 4
+PROMOTION_FLAG = 8
+
+PROMOTIONS = [QUEEN_PROMOTION, KNIGHT_PROMOTION, ROOK_PROMOTION, BISHOP_PROMOTION]
+PROMOTION_CAPTURES = [QUEEN_PROMOTION_CAPTURE, KNIGHT_PROMOTION_CAPTURE, ROOK_PROMOTION_CAPTURE, BISHOP_PROMOTION_CAPTURE]
+PROMOTION_LETTERS = ["n", "b", "r", "q"]
+
+NULL_MOVE = 0
+
+# No legal chess position has more than 218 moves
+MAX_MOVES = 256
+
+SQUARES_TO_COORDS = [
+    "a8", "b8", "c8", "d8", "e8", "f8", "g8", "h8",
+    "a7", "b7", "c7", "d7", "e7", "f7", "g7", "h7",
+    "a6", "b6", "c6", "d6", "e6", "f6", "g6", "h6",
+    "a5", "b5", "c5", "d5", "e5", "f5", "g5", "h5",
+    "a4", "b4", "c4", "d4", "e4", "f4", "g4", "h4",
+    "a3", "b3", "c3", "d3", "e3", "f3", "g3", "h3",
+    "a2", "b2", "c2", "d2", "e2", "f2", "g2", "h2",
+    "a1", "b1", "c1", "d1", "e1", "f1", "g1", "h1",
+]
+
+
+def encode_move(source: int, target: int, flags: int = QUIET) -> int:
+    return source | (target << 6) | (flags << 12)
+
+
+def decode_move(move: int) -> tuple:
+    return move & 0x3F, (move >> 6) & 0x3F, move >> 12
+
+
+def get_source(move: int) -> int:
+    return move & 0x3F
+
+
+def get_target(move: int) -> int:
+    return (move >> 6) & 0x3F
+
+
+def get_flags(move: int) -> int:
+    return move >> 12
+
+
+def is_capture(move: int) -> bool:
+    return bool((move >> 12) & CAPTURE_FLAG)
+
+
+def is_promotion(move: int) -> bool:
+    return bool((move >> 12) & PROMOTION_FLAG)
+
+
+def is_castle(move: int) -> bool:
+    return (move >> 12) in (KING_CASTLE, QUEEN_CASTLE)
+
+
+def get_promotion_letter(move: int) -> str:
+    # Lower case to match the uci notation, ex: e7e8q
+    if not is_promotion(move):
+        return ""
+    return PROMOTION_LETTERS[(move >> 12) & 3]
+
+
+def move_to_uci(move: int) -> str:
+    if move == NULL_MOVE:
+        return "0000"
+    return SQUARES_TO_COORDS[move & 0x3F] + SQUARES_TO_COORDS[(move >> 6) & 0x3F] + get_promotion_letter(move)
+
+
+class MoveList():
+    # Fixed size buffer of encoded moves. Generators fill it in place so a search can keep one
+    # list per ply and clear it instead of building new lists at every node.
+    def __init__(self) -> None:
+        self.moves = array("H", bytes(2 * MAX_MOVES))
+        self.count = 0
+
+    def append(self, move: int) -> None:
+        self.moves[self.count] = move
+        self.count += 1
+
+    def clear(self) -> None:
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("MoveList index out of range")
+        return self.moves[index]
+
+    def __iter__(self):
+        moves = self.moves
+        for index in range(self.count):
+            yield moves[index]
+
+    def __contains__(self, move: int) -> bool:
+        return move in self.moves[:self.count]
+
+    def move_to_front(self, move: int) -> bool:
+        # Swaps move into the first slot so it gets searched first, False if it isn't in the list
+        moves = self.moves
+        for index in range(self.count):
+            if moves[index] == move:
+                moves[index] = moves[0]
+                moves[0] = move
+                return True
+        return False
+
+    def to_uci(self) -> list:
+        return [move_to_uci(move) for move in self]
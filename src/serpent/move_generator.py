@@ -1,6 +1,9 @@
-from .bitboard import Bitboard
-from .board import Board
-import numpy as np
+from .attack_tables import BETWEEN, KING_ATTACKS, KNIGHT_ATTACKS, LINE, PAWN_ATTACKS
+from .bitboard import MASK_64, get_bit, iterate_bits
+from .magic_bitboards import MagicBitboards
+from .move import CAPTURE, CAPTURE_FLAG, DOUBLE_PAWN_PUSH, EN_PASSANT, KING_CASTLE, NULL_MOVE, PROMOTION_CAPTURES, PROMOTION_FLAG, PROMOTION_LETTERS, PROMOTIONS, QUEEN_CASTLE, QUIET, SQUARES_TO_COORDS, MoveList, encode_move, move_to_uci
+from .piece import BISHOP, KING, KNIGHT, PAWN, PIECE_LETTERS, QUEEN, ROOK
+from .position import BLACK_KINGSIDE, BLACK_QUEENSIDE, WHITE_KINGSIDE, WHITE_QUEENSIDE, Position
 
 SQUARES = [
     A8, B8, C8, D8, E8, F8, G8, H8,
@@ -13,589 +16,568 @@ SQUARES = [
     A1, B1, C1, D1, E1, F1, G1, H1,
 ] = range(64)
 
-SQUARES_TO_COORDS = [
-    "a8", "b8", "c8", "d8", "e8", "f8", "g8", "h8",
-    "a7", "b7", "c7", "d7", "e7", "f7", "g7", "h7",
-    "a6", "b6", "c6", "d6", "e6", "f6", "g6", "h6",
-    "a5", "b5", "c5", "d5", "e5", "f5", "g5", "h5",
-    "a4", "b4", "c4", "d4", "e4", "f4", "g4", "h4",
-    "a3", "b3", "c3", "d3", "e3", "f3", "g3", "h3",
-    "a2", "b2", "c2", "d2", "e2", "f2", "g2", "h2",
-    "a1", "b1", "c1", "d1", "e1", "f1", "g1", "h1",
-]
-
-
-class MoveInfo():
-    def __init__(self, source: int, target: int, is_capture: bool, promotion: str, piece: str, en_passant_square: int, is_castle: bool) -> None:
-        self.source = source
-        self.target = target
-        self.is_capture = is_capture
-        self.promotion = promotion
-        self.piece = piece
-        self.en_passant_square = en_passant_square
-        self.is_castle = is_castle
+COORDS_TO_SQUARES = {coords: square for square, coords in enumerate(SQUARES_TO_COORDS)}
+FILES = "abcdefgh"
+RANKS = "12345678"
+
+# What generate_legal_moves fills the move list with
+GENERATE_ALL = 0
+GENERATE_CAPTURES = 1  # captures and promotions, the moves quiescence search looks at
+GENERATE_QUIETS = 2    # everything GENERATE_CAPTURES leaves out
 
 
 class MoveGenerator():
     def __init__(self) -> None:
         self.WHITE = 0
         self.BLACK = 1
-        self.UNSIGNED_LONG_1 = np.ulonglong(1)
-        self.not_h_file = np.ulonglong(9187201950435737471)
-        self.not_a_file = np.ulonglong(18374403900871474942)
-        self.not_hg_file = np.ulonglong(4557430888798830399)
-        self.not_ab_file = np.ulonglong(18229723555195321596)
 
-    def verify_moves(self, bitboard: Bitboard, color_to_move: int, moves: list) -> list:
-        verified_moves = []
+        self.magic_bitboards = MagicBitboards()
 
-        for move in moves:
-            if self.is_friendly_king_in_check_after_move(move, bitboard, color_to_move):
-                moves.remove(move)
-            pass
-            # check if move is legal
-            # check if YOUR king is in check
-            # check if move results in check
-            # check if other pieces can get to the same square
+        # Reused by generate_legal_moves, pin_rays[square] is only valid while square is set in the pinned board
+        self.pin_rays = [MASK_64] * 64
 
-        return verified_moves
+    def verify_moves(self, position: Position, moves: MoveList) -> MoveList:
+        # Slow make / unmake legality check, generate_legal_moves should be used instead.
+        # Kept around to cross check the legal generator when debugging.
+        verified_moves = MoveList()
 
-    def generate_moves(self, bitboard: Bitboard, board: Board) -> list:
+        for move in moves:
+            if not self.is_friendly_king_in_check_after_move(position, move):
+                verified_moves.append(move)
 
-        moves = []
-        pawn_moves = []
-        move_color = board.color_to_move
+        return verified_moves
 
-        if move_color:
-            pawn_moves = self.generate_black_pawn_moves(bitboard, board)
+    def generate_moves(self, position: Position, move_list: MoveList = None) -> MoveList:
+        # Pseudo legal moves, these can leave our own king in check
+        # Callers that generate often (search, perft) should pass in their own list to reuse
+        if move_list is None:
+            move_list = MoveList()
         else:
-            pawn_moves = self.generate_white_pawn_moves(bitboard, board)
-        moves.extend(pawn_moves)
-
-        bishop_moves = self.generate_bishop_moves(bitboard, move_color, is_queen=False)
-        moves.extend(bishop_moves)
+            move_list.clear()
 
-        knight_moves = self.generate_knight_moves(bitboard, move_color)
-        moves.extend(knight_moves)
+        move_color = position.color_to_move
 
-        rook_moves = self.generate_rook_moves(bitboard, move_color, is_queen=False)
-        moves.extend(rook_moves)
-
-        queen_moves = self.generate_queen_moves(bitboard, move_color)
-        moves.extend(queen_moves)
-
-        king_moves = self.generate_king_moves(bitboard, board, move_color)
-        moves.extend(king_moves)
-
-        return moves
-
-    # TODO: parameterize this somehow
-    def generate_white_pawn_moves(self, bitboard: Bitboard, board: Board) -> list:
-
-        moves = []
-        white_pawns = bitboard.white_pawns
-
-        for square in range(64):
-            if self.is_piece_on_square(white_pawns, square):
-                # Check if pawn can move up one
-                move_one_square = square - 8
-                if move_one_square > A8 and not self.is_piece_on_square(bitboard.full_board, move_one_square):
-                    # check if pawn is promoting
-                    if square >= A7 and square <= H7:
-                        moves.append(MoveInfo(target=move_one_square, source=square, is_capture=False, promotion="Q", piece="P", en_passant_square=None, is_castle=False))
-                        moves.append(MoveInfo(target=move_one_square, source=square, is_capture=False, promotion="N", piece="P", en_passant_square=None, is_castle=False))
-                        moves.append(MoveInfo(target=move_one_square, source=square, is_capture=False, promotion="B", piece="P", en_passant_square=None, is_castle=False))
-                        moves.append(MoveInfo(target=move_one_square, source=square, is_capture=False, promotion="R", piece="P", en_passant_square=None, is_castle=False))
-                    else:
-                        moves.append(MoveInfo(target=move_one_square, source=square, is_capture=False, promotion=None, piece="P", en_passant_square=None, is_castle=False))
-                        # Check if pawn can move up two
-                        move_two_squares = move_one_square - 8
-                        if (square >= A2 and square <= H2) and not self.is_piece_on_square(bitboard.full_board, move_two_squares):
-                            moves.append(MoveInfo(target=move_two_squares, source=square, is_capture=False, promotion=None, piece="P", en_passant_square=move_one_square, is_castle=False))
-
-                board = np.uint64(0)
-                board = self.set_bit(board, square)
-                if ((board >> np.uint64(7)) & self.not_a_file):
-                    target_square = self.get_least_sig_bit_index(board >> np.uint64(7))
-                    if self.is_piece_on_square(bitboard.black_board, target_square):
-                        moves.append(MoveInfo(target=target_square, source=square, is_capture=True, promotion=None, piece="P", en_passant_square=None, is_castle=False))
-                    elif target_square == board.en_passant_target_square:
-                        moves.append(MoveInfo(target=target_square, source=square, is_capture=True, promotion=None, piece="P", en_passant_square=None, is_castle=False))
-                if ((board >> np.uint64(9)) & self.not_h_file):
-                    target_square = self.get_least_sig_bit_index(board >> np.uint64(9))
-                    if self.is_piece_on_square(bitboard.black_board, target_square):
-                        moves.append(MoveInfo(target=target_square, source=square, is_capture=True, promotion=None, piece="P", en_passant_square=None, is_castle=False))
-                    elif target_square == board.en_passant_target_square:
-                        moves.append(MoveInfo(target=target_square, source=square, is_capture=True, promotion=None, piece="P", en_passant_square=None, is_castle=False))
-        return moves
-
-    # TODO: parameterize this somehow
-    def generate_black_pawn_moves(self, bitboard: Bitboard, board: Board) -> list:
-
-        moves = []
-        black_pawns = bitboard.black_pawns
-
-        for square in range(64):
-            if self.is_piece_on_square(black_pawns, square):
-                # Check if pawn can move up one
-                move_one_square = square + 8
-                if move_one_square < H1 and not self.is_piece_on_square(bitboard.full_board, move_one_square):
-                    # check if pawn is promoting
-                    if square >= A2 and square <= H2:
-                        moves.append(MoveInfo(target=move_one_square, source=square, is_capture=False, promotion="Q", piece="P", en_passant_square=None, is_castle=False))
-                        moves.append(MoveInfo(target=move_one_square, source=square, is_capture=False, promotion="N", piece="P", en_passant_square=None, is_castle=False))
-                        moves.append(MoveInfo(target=move_one_square, source=square, is_capture=False, promotion="B", piece="P", en_passant_square=None, is_castle=False))
-                        moves.append(MoveInfo(target=move_one_square, source=square, is_capture=False, promotion="R", piece="P", en_passant_square=None, is_castle=False))
-                    else:
-                        moves.append(MoveInfo(target=move_one_square, source=square, is_capture=False, promotion=None, piece="P", en_passant_square=None, is_castle=False))
-                        # Check if pawn can move up two
-                        move_two_squares = move_one_square + 8
-                        if (square >= A7 and square <= H7) and not self.is_piece_on_square(bitboard.full_board, move_two_squares):
-                            moves.append(MoveInfo(target=move_two_squares, source=square, is_capture=False, promotion=None, piece="P", en_passant_square=move_one_square, is_castle=False))
-
-                board = np.uint64(0)
-                board = self.set_bit(board, square)
-                if ((board << np.uint64(7)) & self.not_h_file):
-                    target_square = self.get_least_sig_bit_index(board << np.uint64(7))
-                    if self.is_piece_on_square(bitboard.white_board, target_square):
-                        moves.append(MoveInfo(target=target_square, source=square, is_capture=True, promotion=None, piece="P", en_passant_square=None, is_castle=False))
-                    elif target_square == board.en_passant_target_square:
-                        moves.append(MoveInfo(target=target_square, source=square, is_capture=True, promotion=None, piece="P", en_passant_square=None, is_castle=False))
-                if ((board << np.uint64(9)) & self.not_a_file):
-                    target_square = self.get_least_sig_bit_index(board << np.uint64(9))
-                    if self.is_piece_on_square(bitboard.white_board, target_square):
-                        moves.append(MoveInfo(target=target_square, source=square, is_capture=True, promotion=None, piece="P", en_passant_square=None, is_castle=False))
-                    elif target_square == board.en_passant_target_square:
-                        moves.append(MoveInfo(target=target_square, source=square, is_capture=True, promotion=None, piece="P", en_passant_square=None, is_castle=False))
-        return moves
-
-    def generate_bishop_moves(self, bitboard: Bitboard, color_to_move: bool, is_queen: bool) -> list:
-        moves = []
-        piece_letter = ""
-        # Queen can use the same exact algorithm
-        if is_queen:
-            bishops = bitboard.black_queens if color_to_move else bitboard.white_queens
-            piece_letter = "Q"
+        if move_color:
+            self.generate_black_pawn_moves(position, MASK_64, 0, move_list)
         else:
-            bishops = bitboard.black_bishops if color_to_move else bitboard.white_bishops
-            piece_letter = "B"
-
-        opponent_pieces = bitboard.white_board if color_to_move else bitboard.black_board
-
-        bishop_diagonal_ne_sw = 7
-        bishop_diagonal_nw_se = 9
-
-        for square in range(64):
-            if self.is_piece_on_square(bishops, square):
-
-                # Check southeast diagonal until we hit the edge of the board or a friendly piece
-                moves.extend(self.calculate_bishop_bitboard_moves(
-                    square=square,
-                    diagonal=bishop_diagonal_nw_se,
-                    file=self.not_a_file,
-                    left_shift=True,
-                    opponent_pieces=opponent_pieces,
-                    full_board=bitboard.full_board,
-                    piece_letter=piece_letter,
-                    subtract=False
-                ))
-
-                # Check northwest diagonal until we hit the edge of the board or a friendly piece
-                moves.extend(self.calculate_bishop_bitboard_moves(
-                    square=square,
-                    diagonal=bishop_diagonal_nw_se,
-                    file=self.not_h_file,
-                    left_shift=False,
-                    opponent_pieces=opponent_pieces,
-                    full_board=bitboard.full_board,
-                    piece_letter=piece_letter,
-                    subtract=True
-                ))
-
-                # Check southwest diagonal until we hit the edge of the board or a friendly piece
-                moves.extend(self.calculate_bishop_bitboard_moves(
-                    square=square,
-                    diagonal=bishop_diagonal_ne_sw,
-                    file=self.not_h_file,
-                    left_shift=True,
-                    opponent_pieces=opponent_pieces,
-                    full_board=bitboard.full_board,
-                    piece_letter=piece_letter,
-                    subtract=False
-                ))
-
-                # Check northeast diagonal until we hit the edge of the board or a friendly piece
-                moves.extend(self.calculate_bishop_bitboard_moves(
-                    square=square,
-                    diagonal=bishop_diagonal_ne_sw,
-                    file=self.not_a_file,
-                    left_shift=False,
-                    opponent_pieces=opponent_pieces,
-                    full_board=bitboard.full_board,
-                    piece_letter=piece_letter,
-                    subtract=True
-                ))
-
-        return moves
-
-    def generate_knight_moves(self, bitboard: Bitboard, color_to_move: int) -> list:
-        moves = []
-        knights = bitboard.black_knights if color_to_move else bitboard.white_knights
-        opponent_pieces = bitboard.white_board if color_to_move else bitboard.black_board
-
-        for square in range(64):
-            if self.is_piece_on_square(knights, square):
-                board = np.uint64(0)
-                board = self.set_bit(board, square)
-
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=17, file=self.not_h_file, left_shift=False, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter="N", source_square=square))
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=15, file=self.not_a_file, left_shift=False, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter="N", source_square=square))
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=10, file=self.not_hg_file, left_shift=False, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter="N", source_square=square))
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=6, file=self.not_ab_file, left_shift=False, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter="N", source_square=square))
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=17, file=self.not_a_file, left_shift=True, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter="N", source_square=square))
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=15, file=self.not_h_file, left_shift=True, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter="N", source_square=square))
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=10, file=self.not_ab_file, left_shift=True, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter="N", source_square=square))
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=6, file=self.not_hg_file, left_shift=True, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter="N", source_square=square))
-
-        return [move for move in moves if move is not None]
-
-    def generate_rook_moves(self, bitboard: Bitboard, color_to_move: bool, is_queen: bool) -> list:
-        moves = []
-        piece_letter = ""
-        # Queen can use the same exact algorithm
-        if is_queen:
-            rooks = bitboard.black_queens if color_to_move else bitboard.white_queens
-            piece_letter = "Q"
+            self.generate_white_pawn_moves(position, MASK_64, 0, move_list)
+
+        self.generate_bishop_moves(position, move_color, MASK_64, 0, move_list)
+        self.generate_knight_moves(position, move_color, MASK_64, 0, move_list)
+        self.generate_rook_moves(position, move_color, MASK_64, 0, move_list)
+        self.generate_queen_moves(position, move_color, MASK_64, 0, move_list)
+        self.generate_king_moves(position, move_color, False, move_list)
+
+        return move_list
+
+    def generate_legal_moves(self, position: Position, move_list: MoveList = None, mode: int = GENERATE_ALL) -> MoveList:
+        # Legal moves only. Checkers and pins are worked out once up front, then every piece's
+        # targets are masked with them instead of making each move and looking for check.
+        # In GENERATE_CAPTURES mode the targets are also masked with the opponent's pieces, so
+        # quiet moves are never generated in the first place. GENERATE_QUIETS masks them out instead.
+        if move_list is None:
+            move_list = MoveList()
         else:
-            rooks = bitboard.black_rooks if color_to_move else bitboard.white_rooks
-            piece_letter = "R"
-
-        opponent_pieces = bitboard.white_board if color_to_move else bitboard.black_board
-
-        for square in range(64):
-            if self.is_piece_on_square(rooks, square):
-                board = np.uint64(0)
-                board = self.set_bit(board, square)
-
-                shift_amount = 1
-
-                # Check right horizontal
-                while True:
-                    move = self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=shift_amount, file=self.not_a_file, left_shift=True, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter=piece_letter, source_square=square)
-                    if move:
-                        moves.append(move)
-                        if move.is_capture:
-                            break
-                        shift_amount += 1
-
-                    else:
-                        break
-
-                shift_amount = 1
-                # Check left horizontal
-                while True:
-                    move = self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=shift_amount, file=self.not_h_file, left_shift=False, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter=piece_letter, source_square=square)
-                    if move:
-                        moves.append(move)
-                        if move.is_capture:
-                            break
-                        shift_amount += 1
-                    else:
-                        break
-
-                shift_amount = 8
-                # Check up
-                while True:
-                    move = self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=shift_amount, file=self.not_h_file, left_shift=False, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter=piece_letter, source_square=square)
-                    if move:
-                        moves.append(move)
-                        if move.is_capture:
-                            break
-                        shift_amount += 8
-                    else:
-                        break
-
-                shift_amount = 8
-                # Check down
-                while True:
-                    move = self.calculate_rook_knight_king_bitboard_moves(board=board, shift_amount=shift_amount, file=self.not_a_file, left_shift=True, opponent_pieces=opponent_pieces, full_board=bitboard.full_board, piece_letter=piece_letter, source_square=square)
-                    if move:
-                        moves.append(move)
-                        if move.is_capture:
-                            break
-                        shift_amount += 8
-                    else:
-                        break
-
-        return [move for move in moves if move is not None]
+            move_list.clear()
 
-    def calculate_bishop_bitboard_moves(self, square: int, file: int, left_shift: bool, diagonal: int, opponent_pieces: np.uint64, full_board: np.uint64, piece_letter: str, subtract: bool) -> list:
-        moves = []
+        move_color = position.color_to_move
+        opponent_color = move_color ^ 1
+        king_square = position.get_king_square(move_color)
 
-        new_square = square
-        while True:
-            target_square = 0
-            board = np.uint64(0)
-            board = self.set_bit(board, new_square)
+        checkers = self.get_attackers_to(position, king_square, position.full_board) & position.occupancy[opponent_color]
+        pinned = self.get_pinned_pieces(position, move_color, king_square)
 
-            if left_shift:
-                if ((board << np.uint64(diagonal)) & file):
-                    target_square = self.get_least_sig_bit_index(board << np.uint64(diagonal))
-            else:
-                if ((board >> np.uint64(diagonal)) & file):
-                    target_square = self.get_least_sig_bit_index(board >> np.uint64(diagonal))
-
-            if target_square == 0:
-                break
-
-            if self.is_piece_on_square(opponent_pieces, target_square):
-                moves.append(MoveInfo(target=target_square, source=square, is_capture=True, promotion=None, piece=piece_letter.upper(), en_passant_square=None, is_castle=False))
-                break
-            elif not self.is_piece_on_square(full_board, target_square):
-                if subtract:
-                    new_square = new_square - diagonal
-                else:
-                    new_square = new_square + diagonal
-                moves.append(MoveInfo(target=target_square, source=square, is_capture=False, promotion=None, piece=piece_letter.upper(), en_passant_square=None, is_castle=False))
-            else:
-                break
+        if checkers & (checkers - 1):
+            # Double check, only the king can move
+            self.generate_king_moves(position, move_color, True, move_list, mode)
+            return move_list
 
-        return moves
-
-    def calculate_rook_knight_king_bitboard_moves(self, board: np.uint64, shift_amount: int, file: np.uint64, left_shift: bool, opponent_pieces: np.uint64, full_board: np.uint64, piece_letter: str, source_square: int) -> MoveInfo:
-        target_square = 0
+        if checkers:
+            # Single check, either capture the checker or block between it and the king
+            check_mask = checkers | BETWEEN[king_square][checkers.bit_length() - 1]
+        else:
+            check_mask = MASK_64
 
-        if left_shift:
-            if file == 0 or ((board << np.uint64(shift_amount)) & file):
-                target_square = self.get_least_sig_bit_index(board << np.uint64(shift_amount))
+        # Pawns handle the mode themselves since their promotions aren't captures
+        if move_color:
+            self.generate_black_pawn_moves(position, check_mask, pinned, move_list, mode)
         else:
-            if file == 0 or ((board >> np.uint64(shift_amount)) & file):
-                target_square = self.get_least_sig_bit_index(board >> np.uint64(shift_amount))
+            self.generate_white_pawn_moves(position, check_mask, pinned, move_list, mode)
+
+        if mode == GENERATE_CAPTURES:
+            check_mask &= position.occupancy[opponent_color]
+        elif mode == GENERATE_QUIETS:
+            check_mask &= ~position.occupancy[opponent_color]
+
+        self.generate_bishop_moves(position, move_color, check_mask, pinned, move_list)
+        self.generate_knight_moves(position, move_color, check_mask, pinned, move_list)
+        self.generate_rook_moves(position, move_color, check_mask, pinned, move_list)
+        self.generate_queen_moves(position, move_color, check_mask, pinned, move_list)
+        self.generate_king_moves(position, move_color, True, move_list, mode)
+
+        return move_list
+
+    def get_pinned_pieces(self, position: Position, color: int, king_square: int) -> int:
+        # Find opponent sliders that would see our king if our own pieces weren't there. A single
+        # friendly piece between one of them and the king is pinned to the line through both.
+        bitboards = position.bitboards
+        opponent_offset = (color ^ 1) * 6
+        opponent_pieces = position.occupancy[color ^ 1]
+        friendly_pieces = position.occupancy[color]
+        queens = bitboards[opponent_offset + QUEEN]
+
+        snipers = (
+            (self.magic_bitboards.get_rook_attacks(king_square, opponent_pieces) & (bitboards[opponent_offset + ROOK] | queens))
+            | (self.magic_bitboards.get_bishop_attacks(king_square, opponent_pieces) & (bitboards[opponent_offset + BISHOP] | queens))
+        )
 
-        if target_square == 0:
-            return None
+        pinned = 0
+        for sniper_square in iterate_bits(snipers):
+            blockers = BETWEEN[king_square][sniper_square] & position.full_board
+            if blockers and not blockers & (blockers - 1) and blockers & friendly_pieces:
+                pinned |= blockers
+                self.pin_rays[blockers.bit_length() - 1] = LINE[king_square][sniper_square]
 
-        if self.is_piece_on_square(opponent_pieces, target_square):
-            return MoveInfo(target=target_square, source=source_square, is_capture=True, promotion=None, piece=piece_letter.upper(), en_passant_square=None, is_castle=False)
-        elif not self.is_piece_on_square(full_board, target_square):
-            return MoveInfo(target=target_square, source=source_square, is_capture=False, promotion=None, piece=piece_letter.upper(), en_passant_square=None, is_castle=False)
-        else:
-            return None
-
-    def generate_queen_moves(self, bitboard: Bitboard, color_to_move: bool) -> list:
-        moves = []
-
-        moves.extend(self.generate_rook_moves(bitboard=bitboard, color_to_move=color_to_move, is_queen=True))
-        moves.extend(self.generate_bishop_moves(bitboard=bitboard, color_to_move=color_to_move, is_queen=True))
-
-        return moves
-
-    def generate_king_moves(self, bitboard: Bitboard, board_obj: Board, color_to_move: bool) -> list:
-        moves = []
-        king = bitboard.black_king if color_to_move else bitboard.white_king
-        opponent_pieces = bitboard.white_board if color_to_move else bitboard.black_board
-
-        # TODO: There is only one king, no need to check all 64 squares
-        for square in range(64):
-            if self.is_piece_on_square(king, square):
-                board = np.uint64(0)
-                board = self.set_bit(board, square)
-
-                if color_to_move:
-                    if board_obj.black_castle_kingside and not self.is_piece_on_square(bitboard.full_board, F8) and not self.is_piece_on_square(bitboard.full_board, G8):
-                        moves.append(MoveInfo(target=F8, source=square, is_capture=False, promotion=None, piece="K", en_passant_square=None, is_castle=True))
-                        moves.append(MoveInfo(target=G8, source=square, is_capture=False, promotion=None, piece="K", en_passant_square=None, is_castle=True))
-
-                    if board_obj.black_castle_queenside and not self.is_piece_on_square(bitboard.full_board, D8) and not self.is_piece_on_square(bitboard.full_board, C8):
-                        moves.append(MoveInfo(target=D8, source=square, is_capture=False, promotion=None, piece="K", en_passant_square=None, is_castle=True))
-                        moves.append(MoveInfo(target=C8, source=square, is_capture=False, promotion=None, piece="K", en_passant_square=None, is_castle=True))
-                else:
-                    if board_obj.white_castle_kingside and not self.is_piece_on_square(bitboard.full_board, F1) and not self.is_piece_on_square(bitboard.full_board, G1):
-                        moves.append(MoveInfo(target=F1, source=square, is_capture=False, promotion=None, piece="K", en_passant_square=None, is_castle=True))
-                        moves.append(MoveInfo(target=G1, source=square, is_capture=False, promotion=None, piece="K", en_passant_square=None, is_castle=True))
-
-                    if board_obj.white_castle_queenside and not self.is_piece_on_square(bitboard.full_board, D1) and not self.is_piece_on_square(bitboard.full_board, C1):
-                        moves.append(MoveInfo(target=D1, source=square, is_capture=False, promotion=None, piece="K", en_passant_square=None, is_castle=True))
-                        moves.append(MoveInfo(target=C1, source=square, is_capture=False, promotion=None, piece="K", en_passant_square=None, is_castle=True))
-                # up
-                if square > H8:
-                    moves.append(self.calculate_rook_knight_king_bitboard_moves(
-                        board=board,
-                        shift_amount=8,
-                        file=np.uint64(0),
-                        left_shift=False,
-                        opponent_pieces=opponent_pieces,
-                        full_board=bitboard.full_board,
-                        piece_letter="K",
-                        source_square=square
-                    ))
-
-                # down
-                if square < A1:
-                    moves.append(self.calculate_rook_knight_king_bitboard_moves(
-                        board=board,
-                        shift_amount=8,
-                        file=np.uint64(0),
-                        left_shift=True,
-                        opponent_pieces=opponent_pieces,
-                        full_board=bitboard.full_board,
-                        piece_letter="K",
-                        source_square=square
-                    ))
-
-                # west
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(
-                    board=board,
-                    shift_amount=1,
-                    file=self.not_h_file,
-                    left_shift=False,
-                    opponent_pieces=opponent_pieces,
-                    full_board=bitboard.full_board,
-                    piece_letter="K",
-                    source_square=square
-                ))
-
-                # northwest
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(
-                    board=board,
-                    shift_amount=9,
-                    file=self.not_h_file,
-                    left_shift=False,
-                    opponent_pieces=opponent_pieces,
-                    full_board=bitboard.full_board,
-                    piece_letter="K",
-                    source_square=square
-                ))
-
-                # northeast
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(
-                    board=board,
-                    shift_amount=7,
-                    file=self.not_a_file,
-                    left_shift=False,
-                    opponent_pieces=opponent_pieces,
-                    full_board=bitboard.full_board,
-                    piece_letter="K",
-                    source_square=square
-                ))
-
-                # east
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(
-                    board=board,
-                    shift_amount=1,
-                    file=self.not_a_file,
-                    left_shift=True,
-                    opponent_pieces=opponent_pieces,
-                    full_board=bitboard.full_board,
-                    piece_letter="K",
-                    source_square=square
-                ))
-
-                # southeast
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(
-                    board=board,
-                    shift_amount=9,
-                    file=self.not_a_file,
-                    left_shift=True,
-                    opponent_pieces=opponent_pieces,
-                    full_board=bitboard.full_board,
-                    piece_letter="K",
-                    source_square=square
-                ))
-
-                # southwest
-                moves.append(self.calculate_rook_knight_king_bitboard_moves(
-                    board=board,
-                    shift_amount=7,
-                    file=self.not_h_file,
-                    left_shift=True,
-                    opponent_pieces=opponent_pieces,
-                    full_board=bitboard.full_board,
-                    piece_letter="K",
-                    source_square=square
-                ))
-
-        return [move for move in moves if move is not None]
-
-    def is_friendly_king_in_check_after_move(self, bitboard: Bitboard, move: str, color_to_move: int) -> bool:
-        pseduo_move_bitboards = self.make_pseduo_move(bitboard, move, color_to_move)
-
-    def make_pseduo_move(self, bitboard: Bitboard, move: str, color_to_move: int) -> Bitboard:
-
-        board = np.uint64(0)
-        if "=" in move:
-            square = SQUARES_TO_COORDS.index(move[:2])
-            board = self.set_bit(board, square)
-        elif "+" in move:
-            square = SQUARES_TO_COORDS.index(move[-3:-1])
-            board = self.set_bit(board, square)
-        else:
-            square = SQUARES_TO_COORDS.index(move[-2])
-            board = self.set_bit(board, square)
-
-        if color_to_move:
-            white_pawns = bitboard.white_pawns ^ board if self.is_piece_on_square(bitboard.white_pawns, square) else bitboard.white_pawns
-            white_bishops = bitboard.white_bishops ^ board if self.is_piece_on_square(bitboard.white_bishops, square) else bitboard.white_bishops
-            white_knights = bitboard.white_knights ^ board if self.is_piece_on_square(bitboard.white_knights, square) else bitboard.white_knights
-            white_rooks = bitboard.white_rooks ^ board if self.is_piece_on_square(bitboard.white_rooks, square) else bitboard.white_rooks
-            white_queens = bitboard.white_queens ^ board if self.is_piece_on_square(bitboard.white_queens, square) else bitboard.white_queens
-            white_king = bitboard.white_king
-
-            if "=Q" in move:
-                black_queens = bitboard.black_queens ^ board
-
-            if "B" == move[0]:
-                black_bishops = bitboard.black_bishops ^ board
-            else:
-                black_bishops = bitboard.black_bishops
+        return pinned
 
-            if "R" == move[0]:
-                black_rooks = bitboard.black_rooks ^ board
-            else:
-                black_rooks = bitboard.black_rooks
+    def get_target_mask(self, square: int, target_mask: int, pinned: int) -> int:
+        if pinned & (1 << square):
+            return target_mask & self.pin_rays[square]
+        return target_mask
 
-            if "Q" == move[0]:
-                black_queens = bitboard.black_queens ^ board
-            else:
-                black_queens = bitboard.black_queens
+    # TODO: parameterize this somehow
+    def generate_white_pawn_moves(self, position: Position, target_mask: int, pinned: int, move_list: MoveList, mode: int = GENERATE_ALL) -> None:
+        white_pawns = position.bitboards[PAWN]
+        full_board = position.full_board
+
+        for square in iterate_bits(white_pawns):
+            is_promoting = square >= A7 and square <= H7
+            allowed_targets = self.get_target_mask(square, target_mask, pinned)
+
+            # Check if pawn can move up one. Pushes that promote count as captures, the rest as quiets
+            move_one_square = square - 8
+            if (mode == GENERATE_ALL or (mode == GENERATE_CAPTURES) == is_promoting) and move_one_square >= A8 and not self.is_piece_on_square(full_board, move_one_square):
+                if self.is_piece_on_square(allowed_targets, move_one_square):
+                    if is_promoting:
+                        for flags in PROMOTIONS:
+                            move_list.append(encode_move(square, move_one_square, flags))
+                    else:
+                        move_list.append(encode_move(square, move_one_square, QUIET))
+                # Check if pawn can move up two
+                move_two_squares = move_one_square - 8
+                if (square >= A2 and square <= H2) and not self.is_piece_on_square(full_board, move_two_squares) and self.is_piece_on_square(allowed_targets, move_two_squares):
+                    move_list.append(encode_move(square, move_two_squares, DOUBLE_PAWN_PUSH))
+
+            if mode == GENERATE_QUIETS:
+                continue
+
+            self.generate_pawn_captures(
+                position=position,
+                attacks=PAWN_ATTACKS[self.WHITE][square],
+                opponent_pieces=position.occupancy[self.BLACK],
+                source_square=square,
+                is_promoting=is_promoting,
+                target_mask=allowed_targets,
+                move_list=move_list
+            )
 
-            if "K" == move[0]:
-                black_king = bitboard.black_king ^ board
+    # TODO: parameterize this somehow
+    def generate_black_pawn_moves(self, position: Position, target_mask: int, pinned: int, move_list: MoveList, mode: int = GENERATE_ALL) -> None:
+        black_pawns = position.bitboards[6 + PAWN]
+        full_board = position.full_board
+
+        for square in iterate_bits(black_pawns):
+            is_promoting = square >= A2 and square <= H2
+            allowed_targets = self.get_target_mask(square, target_mask, pinned)
+
+            # Check if pawn can move up one. Pushes that promote count as captures, the rest as quiets
+            move_one_square = square + 8
+            if (mode == GENERATE_ALL or (mode == GENERATE_CAPTURES) == is_promoting) and move_one_square <= H1 and not self.is_piece_on_square(full_board, move_one_square):
+                if self.is_piece_on_square(allowed_targets, move_one_square):
+                    if is_promoting:
+                        for flags in PROMOTIONS:
+                            move_list.append(encode_move(square, move_one_square, flags))
+                    else:
+                        move_list.append(encode_move(square, move_one_square, QUIET))
+                # Check if pawn can move up two
+                move_two_squares = move_one_square + 8
+                if (square >= A7 and square <= H7) and not self.is_piece_on_square(full_board, move_two_squares) and self.is_piece_on_square(allowed_targets, move_two_squares):
+                    move_list.append(encode_move(square, move_two_squares, DOUBLE_PAWN_PUSH))
+
+            if mode == GENERATE_QUIETS:
+                continue
+
+            self.generate_pawn_captures(
+                position=position,
+                attacks=PAWN_ATTACKS[self.BLACK][square],
+                opponent_pieces=position.occupancy[self.WHITE],
+                source_square=square,
+                is_promoting=is_promoting,
+                target_mask=allowed_targets,
+                move_list=move_list
+            )
+
+    def generate_bishop_moves(self, position: Position, color_to_move: int, target_mask: int, pinned: int, move_list: MoveList) -> None:
+        bishops = position.bitboards[color_to_move * 6 + BISHOP]
+        friendly_pieces = position.occupancy[color_to_move]
+        opponent_pieces = position.occupancy[color_to_move ^ 1]
+
+        for square in iterate_bits(bishops):
+            self.calculate_attack_table_moves(
+                attacks=self.magic_bitboards.get_bishop_attacks(square, position.full_board) & self.get_target_mask(square, target_mask, pinned),
+                friendly_pieces=friendly_pieces,
+                opponent_pieces=opponent_pieces,
+                source_square=square,
+                move_list=move_list
+            )
+
+    def generate_knight_moves(self, position: Position, color_to_move: int, target_mask: int, pinned: int, move_list: MoveList) -> None:
+        # A pinned knight can never move
+        knights = position.bitboards[color_to_move * 6 + KNIGHT] & ~pinned
+        friendly_pieces = position.occupancy[color_to_move]
+        opponent_pieces = position.occupancy[color_to_move ^ 1]
+
+        for square in iterate_bits(knights):
+            self.calculate_attack_table_moves(
+                attacks=KNIGHT_ATTACKS[square] & target_mask,
+                friendly_pieces=friendly_pieces,
+                opponent_pieces=opponent_pieces,
+                source_square=square,
+                move_list=move_list
+            )
+
+    def generate_rook_moves(self, position: Position, color_to_move: int, target_mask: int, pinned: int, move_list: MoveList) -> None:
+        rooks = position.bitboards[color_to_move * 6 + ROOK]
+        friendly_pieces = position.occupancy[color_to_move]
+        opponent_pieces = position.occupancy[color_to_move ^ 1]
+
+        for square in iterate_bits(rooks):
+            self.calculate_attack_table_moves(
+                attacks=self.magic_bitboards.get_rook_attacks(square, position.full_board) & self.get_target_mask(square, target_mask, pinned),
+                friendly_pieces=friendly_pieces,
+                opponent_pieces=opponent_pieces,
+                source_square=square,
+                move_list=move_list
+            )
+
+    def calculate_attack_table_moves(self, attacks: int, friendly_pieces: int, opponent_pieces: int, source_square: int, move_list: MoveList) -> None:
+        # One lookup in the precomputed table gives every target, friendly pieces are the only squares we can't land on
+        for target_square in iterate_bits(attacks & ~friendly_pieces):
+            flags = CAPTURE if self.is_piece_on_square(opponent_pieces, target_square) else QUIET
+            move_list.append(encode_move(source_square, target_square, flags))
+
+    def generate_pawn_captures(self, position: Position, attacks: int, opponent_pieces: int, source_square: int, is_promoting: bool, target_mask: int, move_list: MoveList) -> None:
+        for target_square in iterate_bits(attacks & opponent_pieces & target_mask):
+            if is_promoting:
+                for flags in PROMOTION_CAPTURES:
+                    move_list.append(encode_move(source_square, target_square, flags))
             else:
-                black_king = bitboard.black_king
-
-            if "N" == move[0]:
-                black_knights = bitboard.black_knights ^ board
+                move_list.append(encode_move(source_square, target_square, CAPTURE))
+
+        en_passant_square = position.en_passant_square
+        if en_passant_square is not None and self.is_piece_on_square(attacks, en_passant_square):
+            move = encode_move(source_square, en_passant_square, EN_PASSANT)
+            # En passant removes two pieces from the capturing pawn's rank and can capture a checking pawn
+            # without landing on the check mask, which masks can't describe. It's rare enough to just try the move.
+            if not self.is_friendly_king_in_check_after_move(position, move):
+                move_list.append(move)
+
+    def generate_queen_moves(self, position: Position, color_to_move: int, target_mask: int, pinned: int, move_list: MoveList) -> None:
+        queens = position.bitboards[color_to_move * 6 + QUEEN]
+        friendly_pieces = position.occupancy[color_to_move]
+        opponent_pieces = position.occupancy[color_to_move ^ 1]
+
+        for square in iterate_bits(queens):
+            self.calculate_attack_table_moves(
+                attacks=self.magic_bitboards.get_queen_attacks(square, position.full_board) & self.get_target_mask(square, target_mask, pinned),
+                friendly_pieces=friendly_pieces,
+                opponent_pieces=opponent_pieces,
+                source_square=square,
+                move_list=move_list
+            )
+
+    def generate_king_moves(self, position: Position, color_to_move: int, legal_only: bool, move_list: MoveList, mode: int = GENERATE_ALL) -> None:
+        king = position.bitboards[color_to_move * 6 + KING]
+        friendly_pieces = position.occupancy[color_to_move]
+        opponent_pieces = position.occupancy[color_to_move ^ 1]
+        full_board = position.full_board
+        # Castling is never a capture
+        castling_rights = position.castling_rights if mode != GENERATE_CAPTURES else 0
+        opponent_color = color_to_move ^ 1
+
+        for square in iterate_bits(king):
+            # Castling moves are encoded as the king moving two squares. The king can't castle out of,
+            # or through check, landing in check is checked with the rest of the king moves.
+            if color_to_move:
+                if castling_rights & BLACK_KINGSIDE and not self.is_piece_on_square(full_board, F8) and not self.is_piece_on_square(full_board, G8):
+                    if not self.is_square_attacked(position, E8, opponent_color) and not self.is_square_attacked(position, F8, opponent_color):
+                        if not legal_only or not self.is_square_attacked(position, G8, opponent_color):
+                            move_list.append(encode_move(square, G8, KING_CASTLE))
+
+                if castling_rights & BLACK_QUEENSIDE and not self.is_piece_on_square(full_board, D8) and not self.is_piece_on_square(full_board, C8) and not self.is_piece_on_square(full_board, B8):
+                    if not self.is_square_attacked(position, E8, opponent_color) and not self.is_square_attacked(position, D8, opponent_color):
+                        if not legal_only or not self.is_square_attacked(position, C8, opponent_color):
+                            move_list.append(encode_move(square, C8, QUEEN_CASTLE))
             else:
-                black_knights = bitboard.black_knights
-
-            black_board = black_pawns | black_knights | black_bishops | black_queens | black_rooks | black_king
-            white_board = white_pawns | white_knights | white_bishops | white_queens | white_rooks | white_king
-
-        else:
-            black_pawns = bitboard.black_pawns ^ board if self.is_piece_on_square(bitboard.black_pawns, square) else bitboard.black_pawns
-            black_bishops = bitboard.black_bishops ^ board if self.is_piece_on_square(bitboard.black_bishops, square) else bitboard.black_bishops
-            black_knights = bitboard.black_knights ^ board if self.is_piece_on_square(bitboard.black_knights, square) else bitboard.black_knights
-            black_rooks = bitboard.black_rooks ^ board if self.is_piece_on_square(bitboard.black_rooks, square) else bitboard.black_rooks
-            black_queens = bitboard.black_queens ^ board if self.is_piece_on_square(bitboard.black_queens, square) else bitboard.black_queens
-            black_board = black_pawns | black_knights | black_bishops | black_queens | black_rooks | black_king
-            white_board = white_pawns | white_knights | white_bishops | white_queens | white_rooks | white_king
-
-        full_board = white_pawns | white_knights | white_bishops | white_queens | white_rooks | white_king | black_pawns | black_knights | black_bishops | black_queens | black_rooks | black_king
-
-        new_bitboards = Bitboard()
-        new_bitboards.generate_bitboards_from_bitboards(
-            white_pawns="a"
+                if castling_rights & WHITE_KINGSIDE and not self.is_piece_on_square(full_board, F1) and not self.is_piece_on_square(full_board, G1):
+                    if not self.is_square_attacked(position, E1, opponent_color) and not self.is_square_attacked(position, F1, opponent_color):
+                        if not legal_only or not self.is_square_attacked(position, G1, opponent_color):
+                            move_list.append(encode_move(square, G1, KING_CASTLE))
+
+                if castling_rights & WHITE_QUEENSIDE and not self.is_piece_on_square(full_board, D1) and not self.is_piece_on_square(full_board, C1) and not self.is_piece_on_square(full_board, B1):
+                    if not self.is_square_attacked(position, E1, opponent_color) and not self.is_square_attacked(position, D1, opponent_color):
+                        if not legal_only or not self.is_square_attacked(position, C1, opponent_color):
+                            move_list.append(encode_move(square, C1, QUEEN_CASTLE))
+
+            attacks = KING_ATTACKS[square] & ~friendly_pieces
+            if mode == GENERATE_CAPTURES:
+                attacks &= opponent_pieces
+            elif mode == GENERATE_QUIETS:
+                attacks &= ~opponent_pieces
+            if legal_only:
+                # Take the king off the board so sliders checking it also attack the squares behind it
+                occupancy_without_king = full_board ^ king
+                for target_square in iterate_bits(attacks):
+                    if self.is_square_attacked(position, target_square, opponent_color, occupancy_without_king):
+                        attacks ^= 1 << target_square
+
+            self.calculate_attack_table_moves(
+                attacks=attacks,
+                friendly_pieces=friendly_pieces,
+                opponent_pieces=opponent_pieces,
+                source_square=square,
+                move_list=move_list
+            )
+
+    def get_attackers_to(self, position: Position, square: int, occupancy: int) -> int:
+        # Every piece of either color attacking the square, sliders are blocked by the given occupancy
+        bitboards = position.bitboards
+        bishops_queens = bitboards[BISHOP] | bitboards[QUEEN] | bitboards[6 + BISHOP] | bitboards[6 + QUEEN]
+        rooks_queens = bitboards[ROOK] | bitboards[QUEEN] | bitboards[6 + ROOK] | bitboards[6 + QUEEN]
+
+        return (
+            (PAWN_ATTACKS[self.BLACK][square] & bitboards[PAWN])
+            | (PAWN_ATTACKS[self.WHITE][square] & bitboards[6 + PAWN])
+            | (KNIGHT_ATTACKS[square] & (bitboards[KNIGHT] | bitboards[6 + KNIGHT]))
+            | (KING_ATTACKS[square] & (bitboards[KING] | bitboards[6 + KING]))
+            | (self.magic_bitboards.get_bishop_attacks(square, occupancy) & bishops_queens)
+            | (self.magic_bitboards.get_rook_attacks(square, occupancy) & rooks_queens)
         )
 
-    def is_piece_on_square(self, bitboard: np.uint64, square: int) -> bool:
-        return bool(np.ulonglong(bitboard) & (self.UNSIGNED_LONG_1 << np.ulonglong(square)))
-
-    def set_bit(self, bitboard: np.uint64, square: int) -> np.uint64:
-        return np.ulonglong(bitboard) | (self.UNSIGNED_LONG_1 << np.ulonglong(square))
-
-    def get_least_sig_bit_index(self, board: np.uint64) -> int:
-        if board:
-            return (int(board) & int(-board)).bit_length()-1
+    def is_square_attacked(self, position: Position, square: int, attacking_color: int, occupancy: int = None) -> bool:
+        # Look outwards from the square with each piece's attacks and see if we hit an attacker of that type
+        bitboards = position.bitboards
+        offset = attacking_color * 6
+        if occupancy is None:
+            occupancy = position.full_board
+
+        if PAWN_ATTACKS[attacking_color ^ 1][square] & bitboards[offset + PAWN]:
+            return True
+        if KNIGHT_ATTACKS[square] & bitboards[offset + KNIGHT]:
+            return True
+        if KING_ATTACKS[square] & bitboards[offset + KING]:
+            return True
+        if self.magic_bitboards.get_bishop_attacks(square, occupancy) & (bitboards[offset + BISHOP] | bitboards[offset + QUEEN]):
+            return True
+        if self.magic_bitboards.get_rook_attacks(square, occupancy) & (bitboards[offset + ROOK] | bitboards[offset + QUEEN]):
+            return True
+        return False
+
+    def is_in_check(self, position: Position) -> bool:
+        color_to_move = position.color_to_move
+        return self.is_square_attacked(position, position.get_king_square(color_to_move), color_to_move ^ 1)
+
+    def parse_uci_move(self, position: Position, uci_move: str) -> int:
+        # The legal move matching a uci string like e2e4 or e7e8q, NULL_MOVE if there isn't one
+        for move in self.generate_legal_moves(position):
+            if move_to_uci(move) == uci_move:
+                return move
+        return NULL_MOVE
+
+    def move_to_san(self, position: Position, move: int, legal_moves: MoveList = None, check_suffix: bool = True) -> str:
+        # Standard algebraic notation like Nbd7, exd6, e8=Q+ or O-O. legal_moves saves generating them
+        # again when the caller has them, the check / mate suffix costs a make / unmake.
+        source = move & 0x3F
+        target = (move >> 6) & 0x3F
+        flags = move >> 12
+
+        if flags == KING_CASTLE:
+            san = "O-O"
+        elif flags == QUEEN_CASTLE:
+            san = "O-O-O"
         else:
-            return -1
+            piece_type = position.piece_board[source] % 6
+            capture = "x" if flags & CAPTURE_FLAG else ""
+            if piece_type == PAWN:
+                san = (SQUARES_TO_COORDS[source][0] + capture if capture else "") + SQUARES_TO_COORDS[target]
+                if flags & PROMOTION_FLAG:
+                    san += "=" + PROMOTION_LETTERS[flags & 3].upper()
+            else:
+                if legal_moves is None:
+                    legal_moves = self.generate_legal_moves(position)
+
+                # Other pieces of the same type that can reach the target decide how much of the source to give
+                same_file = same_rank = ambiguous = False
+                for other_move in legal_moves:
+                    other_source = other_move & 0x3F
+                    if other_source != source and (other_move >> 6) & 0x3F == target and position.piece_board[other_source] % 6 == piece_type:
+                        ambiguous = True
+                        same_file |= other_source % 8 == source % 8
+                        same_rank |= other_source // 8 == source // 8
+
+                disambiguation = ""
+                if ambiguous:
+                    if not same_file:
+                        disambiguation = SQUARES_TO_COORDS[source][0]
+                    elif not same_rank:
+                        disambiguation = SQUARES_TO_COORDS[source][1]
+                    else:
+                        disambiguation = SQUARES_TO_COORDS[source]
+                san = PIECE_LETTERS[piece_type] + disambiguation + capture + SQUARES_TO_COORDS[target]
+
+        if check_suffix:
+            position.make_move(move)
+            if self.is_in_check(position):
+                san += "+" if self.generate_legal_moves(position) else "#"
+            position.unmake_move(move)
+        return san
+
+    def parse_san_move(self, position: Position, san_move: str) -> int:
+        # The legal move matching a san string, NULL_MOVE if there isn't exactly one. Check marks and
+        # annotations are ignored, castling with zeros, redundant disambiguation, promotions without the =
+        # and uci strings are accepted too. The san is taken apart instead of writing out every legal
+        # move's san to compare, bulk pgn replay spends most of its time here.
+        san_move = san_move.rstrip("+#!?").removesuffix("e.p.").replace("0", "O")
+        legal_moves = self.generate_legal_moves(position)
+
+        if san_move == "O-O" or san_move == "O-O-O":
+            flags = KING_CASTLE if san_move == "O-O" else QUEEN_CASTLE
+            for move in legal_moves:
+                if move >> 12 == flags:
+                    return move
+            return NULL_MOVE
+
+        if len(san_move) in (4, 5) and san_move[0] in FILES and san_move[1] in RANKS and san_move[2] in FILES and san_move[3] in RANKS:
+            for move in legal_moves:
+                if move_to_uci(move) == san_move:
+                    return move
+            return NULL_MOVE
+
+        promotion = None
+        if "=" in san_move:
+            san_move, promotion = san_move.split("=", 1)
+        elif len(san_move) > 2 and san_move[-1] in "NBRQ" and san_move[0] in FILES:
+            san_move, promotion = san_move[:-1], san_move[-1]
+        if promotion is not None:
+            if len(promotion) != 1 or promotion.upper() not in "NBRQ":
+                return NULL_MOVE
+            promotion = PROMOTION_LETTERS.index(promotion.lower())
+
+        piece_type = PAWN
+        if san_move and san_move[0] in "NBRQK":
+            piece_type = PIECE_LETTERS.index(san_move[0])
+            san_move = san_move[1:]
+
+        target = COORDS_TO_SQUARES.get(san_move[-2:])
+        if target is None:
+            return NULL_MOVE
+        capture = "x" in san_move
+        disambiguation = san_move[:-2].replace("x", "")
+        if any(char not in FILES and char not in RANKS for char in disambiguation):
+            return NULL_MOVE
+
+        piece_board = position.piece_board
+        found_move = NULL_MOVE
+        for move in legal_moves:
+            flags = move >> 12
+            source = move & 0x3F
+            if (move >> 6) & 0x3F != target or piece_board[source] % 6 != piece_type or flags == KING_CASTLE or flags == QUEEN_CASTLE:
+                continue
+            if (promotion is None) != (not flags & PROMOTION_FLAG) or promotion is not None and flags & 3 != promotion:
+                continue
+            # A pawn's capture mark is what tells exd5 from d5
+            if piece_type == PAWN and capture != bool(flags & CAPTURE_FLAG):
+                continue
+            if any(char not in SQUARES_TO_COORDS[source] for char in disambiguation):
+                continue
+            if found_move != NULL_MOVE:
+                # Ambiguous
+                return NULL_MOVE
+            found_move = move
+        return found_move
+
+    def is_legal_move(self, position: Position, move: int) -> bool:
+        # For moves that didn't come from the generator in this position, like hash moves and killers.
+        # Checks the move is one the piece on its source square could make, flags included, then tries it.
+        source = move & 0x3F
+        target = (move >> 6) & 0x3F
+        flags = move >> 12
+        color = position.color_to_move
+        piece = position.piece_board[source]
+        captured_piece = position.piece_board[target]
+
+        if move == NULL_MOVE or piece is None or piece // 6 != color:
+            return False
+
+        if flags == EN_PASSANT:
+            if piece % 6 != PAWN or target != position.en_passant_square:
+                return False
+        elif flags & CAPTURE_FLAG:
+            if captured_piece is None or captured_piece // 6 == color or captured_piece % 6 == KING:
+                return False
+        elif captured_piece is not None:
+            return False
+
+        piece_type = piece % 6
+        target_bit = 1 << target
+        if piece_type == PAWN:
+            # Promotion flags have to match the pawn reaching the last rank
+            if bool(flags & PROMOTION_FLAG) != (target < A7 if color == self.WHITE else target > H2):
+                return False
+            forward = -8 if color == self.WHITE else 8
+            if flags & CAPTURE_FLAG:
+                if not PAWN_ATTACKS[color][source] & target_bit:
+                    return False
+            elif flags == DOUBLE_PAWN_PUSH:
+                start_rank = (A2 <= source <= H2) if color == self.WHITE else (A7 <= source <= H7)
+                if not start_rank or target != source + 2 * forward or self.is_piece_on_square(position.full_board, source + forward):
+                    return False
+            elif target != source + forward:
+                return False
+        elif flags & PROMOTION_FLAG or flags == DOUBLE_PAWN_PUSH:
+            return False
+        elif flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            # Rare enough to just check against the generated king moves
+            if piece_type != KING:
+                return False
+            king_moves = MoveList()
+            self.generate_king_moves(position, color, True, king_moves)
+            return move in king_moves
+        elif piece_type == KNIGHT:
+            if not KNIGHT_ATTACKS[source] & target_bit:
+                return False
+        elif piece_type == BISHOP:
+            if not self.magic_bitboards.get_bishop_attacks(source, position.full_board) & target_bit:
+                return False
+        elif piece_type == ROOK:
+            if not self.magic_bitboards.get_rook_attacks(source, position.full_board) & target_bit:
+                return False
+        elif piece_type == QUEEN:
+            if not self.magic_bitboards.get_queen_attacks(source, position.full_board) & target_bit:
+                return False
+        elif not KING_ATTACKS[source] & target_bit:
+            return False
+
+        return not self.is_friendly_king_in_check_after_move(position, move)
+
+    def is_friendly_king_in_check_after_move(self, position: Position, move: int) -> bool:
+        color_to_move = position.color_to_move
+
+        position.make_move(move)
+        is_in_check = self.is_square_attacked(position, position.get_king_square(color_to_move), color_to_move ^ 1)
+        position.unmake_move(move)
+
+        return is_in_check
+
+    def is_piece_on_square(self, bitboard: int, square: int) -> bool:
+        return get_bit(bitboard, square)
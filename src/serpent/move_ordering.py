@@ -0,0 +1,176 @@
+from .move import CAPTURE_FLAG, EN_PASSANT, NULL_MOVE, PROMOTION_FLAG, MoveList
+from .move_generator import GENERATE_CAPTURES, GENERATE_QUIETS, MoveGenerator
+from .piece import PAWN
+from .position import Position
+from .see import SEE_VALUES, see
+
+# MovePicker stages, in the order moves come out
+STAGE_HASH_MOVE = 0
+STAGE_GENERATE_CAPTURES = 1
+STAGE_GOOD_CAPTURES = 2
+STAGE_KILLERS = 3
+STAGE_GENERATE_QUIETS = 4
+STAGE_QUIETS = 5
+STAGE_BAD_CAPTURES = 6
+STAGE_DONE = 7
+
+# History scores are halved once any of them reaches this, so old cutoffs fade out
+MAX_HISTORY = 1 << 16
+
+CAPTURE_OR_PROMOTION = CAPTURE_FLAG | PROMOTION_FLAG
+
+
+def get_mvv_lva_score(position: Position, move: int) -> int:
+    # Most valuable victim first, least valuable attacker breaks ties. Promotions count the new piece.
+    piece_board = position.piece_board
+    flags = move >> 12
+    victim = piece_board[(move >> 6) & 0x3F]
+
+    score = SEE_VALUES[victim % 6] * 10 if victim is not None else 0
+    if flags == EN_PASSANT:
+        score = SEE_VALUES[PAWN] * 10
+    if flags & PROMOTION_FLAG:
+        score += SEE_VALUES[(flags & 3) + 1] * 10
+    return score - SEE_VALUES[piece_board[move & 0x3F] % 6] // 100
+
+
+def is_losing_capture(move_generator: MoveGenerator, position: Position, move: int) -> bool:
+    # Taking a piece worth at least as much as the capturer can't lose, only run the full exchange otherwise
+    piece_board = position.piece_board
+    victim = piece_board[(move >> 6) & 0x3F]
+    if victim is not None and SEE_VALUES[victim % 6] >= SEE_VALUES[piece_board[move & 0x3F] % 6]:
+        return False
+    return see(move_generator, position, move) < 0
+
+
+def is_quiet(move: int) -> bool:
+    return not (move >> 12) & CAPTURE_OR_PROMOTION
+
+
+class MoveOrdering():
+    # Killers and history, what the search has learned about quiet moves. Killers are the last two
+    # quiet moves that caused a beta cutoff at each ply, history counts cutoffs per side and
+    # from / to squares (the low 12 bits of the move) weighted by the depth squared.
+    def __init__(self, max_ply: int) -> None:
+        self.max_ply = max_ply
+        self.killers = [[NULL_MOVE, NULL_MOVE] for _ in range(max_ply)]
+        self.history = [0] * (2 * 4096)
+
+    def clear(self) -> None:
+        self.killers = [[NULL_MOVE, NULL_MOVE] for _ in range(self.max_ply)]
+        self.history = [0] * (2 * 4096)
+
+    def new_search(self) -> None:
+        # Killers belong to the last position searched, history is still a decent guess
+        self.killers = [[NULL_MOVE, NULL_MOVE] for _ in range(self.max_ply)]
+        self.history = [score >> 1 for score in self.history]
+
+    def update_quiet_cutoff(self, color: int, move: int, depth: int, ply: int) -> None:
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+        index = (color << 12) | (move & 0xFFF)
+        self.history[index] += depth * depth
+        if self.history[index] >= MAX_HISTORY:
+            self.history = [score >> 1 for score in self.history]
+
+    def get_history_score(self, color: int, move: int) -> int:
+        return self.history[(color << 12) | (move & 0xFFF)]
+
+
+class MovePicker():
+    # Hands out legal moves one at a time, best guess first: the hash move, captures that don't lose
+    # material by MVV-LVA, killers, quiets by history, then the losing captures. Each group is only
+    # generated and sorted when the one before it runs out, so a cutoff on the hash move or a capture
+    # never generates quiet moves at all. Search keeps one picker per ply and resets it at every node.
+    def __init__(self, move_generator: MoveGenerator, move_ordering: MoveOrdering) -> None:
+        self.move_generator = move_generator
+        self.move_ordering = move_ordering
+        self.move_list = MoveList()
+
+        self.position = None
+        self.hash_move = NULL_MOVE
+        self.ply = 0
+        self.stage = STAGE_DONE
+        self.moves = []
+        self.index = 0
+        self.bad_captures = []
+        self.killers = (NULL_MOVE, NULL_MOVE)
+
+    def reset(self, position: Position, hash_move: int, ply: int) -> None:
+        self.position = position
+        self.hash_move = hash_move
+        self.ply = ply
+        self.stage = STAGE_HASH_MOVE
+        self.moves = []
+        self.index = 0
+        self.bad_captures = []
+        self.killers = (NULL_MOVE, NULL_MOVE)
+
+    def next_move(self) -> int:
+        # NULL_MOVE once every legal move has been handed out
+        position = self.position
+
+        if self.stage == STAGE_HASH_MOVE:
+            self.stage = STAGE_GENERATE_CAPTURES
+            if self.hash_move != NULL_MOVE and self.move_generator.is_legal_move(position, self.hash_move):
+                return self.hash_move
+            self.hash_move = NULL_MOVE
+
+        if self.stage == STAGE_GENERATE_CAPTURES:
+            captures = self.move_generator.generate_legal_moves(position, self.move_list, GENERATE_CAPTURES)
+            self.moves = sorted(captures, key=lambda move: get_mvv_lva_score(position, move), reverse=True)
+            self.index = 0
+            self.stage = STAGE_GOOD_CAPTURES
+
+        if self.stage == STAGE_GOOD_CAPTURES:
+            while self.index < len(self.moves):
+                move = self.moves[self.index]
+                self.index += 1
+                if move == self.hash_move:
+                    continue
+                if is_losing_capture(self.move_generator, position, move):
+                    self.bad_captures.append(move)
+                    continue
+                return move
+            self.stage = STAGE_KILLERS
+            self.index = 0
+
+        if self.stage == STAGE_KILLERS:
+            killers = self.move_ordering.killers[self.ply]
+            while self.index < 2:
+                move = killers[self.index]
+                self.index += 1
+                if move != NULL_MOVE and move != self.hash_move and self.move_generator.is_legal_move(position, move):
+                    self.killers = (self.killers[1], move)
+                    return move
+            self.stage = STAGE_GENERATE_QUIETS
+
+        if self.stage == STAGE_GENERATE_QUIETS:
+            quiets = self.move_generator.generate_legal_moves(position, self.move_list, GENERATE_QUIETS)
+            color = position.color_to_move
+            history = self.move_ordering.history
+            self.moves = sorted(quiets, key=lambda move: history[(color << 12) | (move & 0xFFF)], reverse=True)
+            self.index = 0
+            self.stage = STAGE_QUIETS
+
+        if self.stage == STAGE_QUIETS:
+            while self.index < len(self.moves):
+                move = self.moves[self.index]
+                self.index += 1
+                if move == self.hash_move or move in self.killers:
+                    continue
+                return move
+            self.stage = STAGE_BAD_CAPTURES
+            self.index = 0
+
+        if self.stage == STAGE_BAD_CAPTURES:
+            if self.index < len(self.bad_captures):
+                move = self.bad_captures[self.index]
+                self.index += 1
+                return move
+            self.stage = STAGE_DONE
+
+        return NULL_MOVE
@@ -0,0 +1,65 @@
+from array import array
+
+DEFAULT_PAWN_HASH_SIZE_MB = 1
+
+
+class PawnHashTable():
+    # Fixed size pawn key -> pawn structure score cache. Each entry is the key and the midgame and
+    # endgame scores packed as two 16 bit ints, in two flat array('Q') buffers. Pawn structures repeat
+    # so often within a search that a small always replace table catches nearly all of them.
+    ENTRY_SIZE = 16
+
+    def __init__(self, size_mb: int = DEFAULT_PAWN_HASH_SIZE_MB) -> None:
+        entry_count = max(1, (size_mb * 1024 * 1024) // self.ENTRY_SIZE)
+        # Round down to a power of two so the index is a mask
+        entry_count = 1 << (entry_count.bit_length() - 1)
+
+        self.size_mb = size_mb
+        self.index_mask = entry_count - 1
+        self.entry_count = entry_count
+        self.keys = array("Q", bytes(8 * entry_count))
+        # Bit 32 marks the slot as used, a zero key is a real pawn key (no pawns at all)
+        self.data = array("Q", bytes(8 * entry_count))
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def clear(self) -> None:
+        self.keys = array("Q", bytes(8 * self.entry_count))
+        self.data = array("Q", bytes(8 * self.entry_count))
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def probe(self, key: int):
+        # Returns (mg_score, eg_score), or None when the structure isn't in the table
+        self.probes += 1
+        index = key & self.index_mask
+        data = self.data[index]
+        if not data or self.keys[index] != key:
+            return None
+
+        self.hits += 1
+        mg_score = data & 0xFFFF
+        eg_score = (data >> 16) & 0xFFFF
+        return mg_score - 0x10000 if mg_score & 0x8000 else mg_score, eg_score - 0x10000 if eg_score & 0x8000 else eg_score
+
+    def store(self, key: int, mg_score: int, eg_score: int) -> None:
+        self.stores += 1
+        index = key & self.index_mask
+        self.keys[index] = key
+        self.data[index] = (1 << 32) | ((eg_score & 0xFFFF) << 16) | (mg_score & 0xFFFF)
+
+    def get_stats(self) -> dict:
+        return {
+            "size_mb": self.size_mb,
+            "entries": self.entry_count,
+            "probes": self.probes,
+            "hits": self.hits,
+            "stores": self.stores,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+        }
@@ -0,0 +1,375 @@
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .fen import START_FEN
+from .move import MoveList, move_to_uci
+from .move_generator import MoveGenerator
+from .position import Position
+
+MAX_PERFT_DEPTH = 64
+
+# Standard perft positions with their known node counts, indexed by depth - 1.
+# https://www.chessprogramming.org/Perft_Results
+PERFT_SUITE = [
+    {
+        "name": "startpos",
+        "fen": START_FEN,
+        "nodes": [20, 400, 8902, 197281, 4865609, 119060324],
+    },
+    {
+        "name": "kiwipete",
+        "fen": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        "nodes": [48, 2039, 97862, 4085603, 193690690],
+    },
+    {
+        "name": "position 3",
+        "fen": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        "nodes": [14, 191, 2812, 43238, 674624, 11030083, 178633661],
+    },
+    {
+        "name": "position 4",
+        "fen": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        "nodes": [6, 264, 9467, 422333, 15833292],
+    },
+    {
+        "name": "position 4 mirrored",
+        "fen": "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+        "nodes": [6, 264, 9467, 422333, 15833292],
+    },
+    {
+        "name": "position 5",
+        "fen": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        "nodes": [44, 1486, 62379, 2103487, 89941194],
+    },
+    {
+        "name": "position 6",
+        "fen": "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        "nodes": [46, 2079, 89890, 3894594, 164075551],
+    },
+]
+
+
+worker_perft = None
+
+
+def init_perft_worker(hash_size_mb: int = 0, debug_hash: bool = False) -> None:
+    global worker_perft
+    worker_perft = Perft(hash_size_mb=hash_size_mb, debug_hash=debug_hash)
+
+
+def run_perft_task(task: tuple) -> tuple:
+    # Tasks only carry a fen, so nothing but a short string gets pickled to the worker
+    root_move, fen, depth = task
+
+    position = Position(worker_perft.debug_hash)
+    position.set_fen(fen)
+
+    start_time = time.perf_counter()
+    nodes = worker_perft.perft(position, depth)
+    hash_stats = worker_perft.hash_table.get_stats() if worker_perft.hash_table else None
+    return root_move, nodes, time.perf_counter() - start_time, os.getpid(), hash_stats
+
+
+class PerftHashTable():
+    # Fixed size (position key, depth) -> node count cache. Entries are two 64 bit words, the key and
+    # the node count shifted up 8 bits with the depth in the low byte, in two flat array('Q') buffers.
+    # Every bucket has two slots, the first keeps the deepest subtree seen and the second is always replaced.
+    ENTRY_SIZE = 16
+    BUCKET_SLOTS = 2
+
+    def __init__(self, size_mb: int) -> None:
+        bucket_count = max(1, (size_mb * 1024 * 1024) // (self.ENTRY_SIZE * self.BUCKET_SLOTS))
+        # Round down to a power of two so the bucket index is a mask
+        bucket_count = 1 << (bucket_count.bit_length() - 1)
+
+        self.size_mb = size_mb
+        self.bucket_mask = bucket_count - 1
+        self.entry_count = bucket_count * self.BUCKET_SLOTS
+        self.keys = array("Q", bytes(8 * self.entry_count))
+        self.data = array("Q", bytes(8 * self.entry_count))
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def clear(self) -> None:
+        self.keys = array("Q", bytes(8 * self.entry_count))
+        self.data = array("Q", bytes(8 * self.entry_count))
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def probe(self, key: int, depth: int) -> int:
+        # Returns the stored node count, or -1 when the subtree isn't in the table
+        self.probes += 1
+        index = (key & self.bucket_mask) << 1
+
+        for slot in (index, index + 1):
+            data = self.data[slot]
+            if self.keys[slot] == key and data & 0xFF == depth:
+                self.hits += 1
+                return data >> 8
+
+        return -1
+
+    def store(self, key: int, depth: int, nodes: int) -> None:
+        self.stores += 1
+        index = (key & self.bucket_mask) << 1
+        data = (nodes << 8) | depth
+
+        deepest_data = self.data[index]
+        if not deepest_data or depth >= deepest_data & 0xFF:
+            # The old deepest entry still gets a second chance in the always replace slot
+            if deepest_data:
+                self.replacements += 1
+                self.keys[index + 1] = self.keys[index]
+                self.data[index + 1] = deepest_data
+            self.keys[index] = key
+            self.data[index] = data
+        else:
+            if self.data[index + 1]:
+                self.replacements += 1
+            self.keys[index + 1] = key
+            self.data[index + 1] = data
+
+    def get_stats(self) -> dict:
+        return {
+            "size_mb": self.size_mb,
+            "entries": self.entry_count,
+            "probes": self.probes,
+            "hits": self.hits,
+            "stores": self.stores,
+            "replacements": self.replacements,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+        }
+
+
+class Perft():
+    def __init__(self, move_generator: MoveGenerator = None, hash_size_mb: int = 0, debug_hash: bool = False) -> None:
+        self.move_generator = move_generator if move_generator else MoveGenerator()
+        # One move list per ply so the recursion never allocates
+        self.move_lists = [MoveList() for _ in range(MAX_PERFT_DEPTH)]
+        self.hash_size_mb = hash_size_mb
+        self.hash_table = PerftHashTable(hash_size_mb) if hash_size_mb > 0 else None
+        # Check the incremental Zobrist key against a full recompute after every make / unmake
+        self.debug_hash = debug_hash
+
+    def perft(self, position: Position, depth: int) -> int:
+        if self.hash_table is not None:
+            return self.perft_hashed(position, depth)
+
+        if depth == 0:
+            return 1
+
+        moves = self.move_generator.generate_legal_moves(position, self.move_lists[depth])
+
+        # Bulk counting, the number of legal moves is the number of leaves one ply down
+        if depth == 1:
+            return len(moves)
+
+        nodes = 0
+        for move in moves:
+            position.make_move(move)
+            nodes += self.perft(position, depth - 1)
+            position.unmake_move(move)
+
+        return nodes
+
+    def perft_hashed(self, position: Position, depth: int) -> int:
+        if depth == 0:
+            return 1
+
+        # Depth 1 is cheaper to count than to look up, so only cache bigger subtrees
+        if depth == 1:
+            return len(self.move_generator.generate_legal_moves(position, self.move_lists[depth]))
+
+        # Probed before generating moves, a hit never needs them
+        key = position.hash
+        nodes = self.hash_table.probe(key, depth)
+        if nodes >= 0:
+            return nodes
+
+        moves = self.move_generator.generate_legal_moves(position, self.move_lists[depth])
+        nodes = 0
+        for move in moves:
+            position.make_move(move)
+            nodes += self.perft_hashed(position, depth - 1)
+            position.unmake_move(move)
+
+        self.hash_table.store(key, depth, nodes)
+        return nodes
+
+    def divide(self, position: Position, depth: int) -> dict:
+        # Node counts for every root move, keyed by the move in uci notation
+        divided_nodes = {}
+        if depth < 1:
+            return divided_nodes
+
+        # Copy the root moves out since the per ply lists get reused below
+        root_moves = list(self.move_generator.generate_legal_moves(position, MoveList()))
+        for move in root_moves:
+            position.make_move(move)
+            divided_nodes[move_to_uci(move)] = self.perft(position, depth - 1)
+            position.unmake_move(move)
+
+        return divided_nodes
+
+    def run(self, fen: str, depth: int, divide: bool = False) -> dict:
+        position = Position(self.debug_hash)
+        position.set_fen(fen)
+
+        # Entries are still valid for the next position, only the counters start over
+        if self.hash_table:
+            self.hash_table.reset_stats()
+
+        start_time = time.perf_counter()
+        # perft(0) is the root itself, there are no root moves to divide it over
+        if divide and depth > 0:
+            divided_nodes = self.divide(position, depth)
+            nodes = sum(divided_nodes.values())
+        else:
+            divided_nodes = {}
+            nodes = self.perft(position, depth)
+        elapsed_time = time.perf_counter() - start_time
+
+        return {
+            "fen": fen,
+            "depth": depth,
+            "nodes": nodes,
+            "divided_nodes": divided_nodes,
+            "time": elapsed_time,
+            "nps": int(nodes / elapsed_time) if elapsed_time > 0 else 0,
+            "hash": self.hash_table.get_stats() if self.hash_table else None,
+        }
+
+    def run_parallel(self, fen: str, depth: int, jobs: int, split_depth: int = 1) -> dict:
+        # Splits the tree split_depth plies below the root and counts each subtree in a worker process.
+        # Counts are always kept per root move, so this doubles as a parallel divide.
+        # Nothing to split below depth 2, the serial count is instant
+        if depth <= 1:
+            result = self.run(fen, depth, divide=True)
+            result.update(jobs=jobs, split_depth=0, tasks=0, workers={})
+            return result
+
+        position = Position(self.debug_hash)
+        position.set_fen(fen)
+
+        split_depth = max(1, min(split_depth, depth - 1))
+        tasks = []
+        self.generate_split_tasks(position, split_depth, depth, None, tasks)
+
+        start_time = time.perf_counter()
+        divided_nodes = {move_to_uci(move): 0 for move in self.move_generator.generate_legal_moves(position)}
+        workers = {}
+
+        if tasks:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=init_perft_worker, initargs=(self.hash_size_mb, self.debug_hash)) as executor:
+                futures = [executor.submit(run_perft_task, task) for task in tasks]
+
+                # Merge the partial counts as they come back instead of waiting on every task in order
+                for future in as_completed(futures):
+                    root_move, nodes, task_time, worker_pid, hash_stats = future.result()
+                    divided_nodes[root_move] += nodes
+
+                    worker = workers.setdefault(worker_pid, {"tasks": 0, "nodes": 0, "time": 0.0})
+                    worker["tasks"] += 1
+                    worker["nodes"] += nodes
+                    worker["time"] += task_time
+                    # Worker tables live for the whole pool, so the latest stats are the running totals
+                    if hash_stats:
+                        worker["hash"] = hash_stats
+
+        elapsed_time = time.perf_counter() - start_time
+        nodes = sum(divided_nodes.values())
+
+        for worker in workers.values():
+            worker["nps"] = int(worker["nodes"] / worker["time"]) if worker["time"] > 0 else 0
+
+        return {
+            "fen": fen,
+            "depth": depth,
+            "nodes": nodes,
+            "divided_nodes": divided_nodes,
+            "time": elapsed_time,
+            "nps": int(nodes / elapsed_time) if elapsed_time > 0 else 0,
+            "jobs": jobs,
+            "split_depth": split_depth,
+            "tasks": len(tasks),
+            "workers": workers,
+            "hash": self.merge_worker_hash_stats(workers),
+        }
+
+    def merge_worker_hash_stats(self, workers: dict) -> dict:
+        worker_stats = [worker["hash"] for worker in workers.values() if "hash" in worker]
+        if not worker_stats:
+            return None
+
+        merged_stats = {"size_mb": self.hash_size_mb * len(worker_stats), "entries": 0, "probes": 0, "hits": 0, "stores": 0, "replacements": 0}
+        for stats in worker_stats:
+            for name in ("entries", "probes", "hits", "stores", "replacements"):
+                merged_stats[name] += stats[name]
+        merged_stats["hit_rate"] = merged_stats["hits"] / merged_stats["probes"] if merged_stats["probes"] else 0.0
+
+        return merged_stats
+
+    def generate_split_tasks(self, position: Position, split_depth: int, depth: int, root_move: str, tasks: list) -> None:
+        if split_depth == 0:
+            tasks.append((root_move, position.get_fen(), depth))
+            return
+
+        for move in list(self.move_generator.generate_legal_moves(position, MoveList())):
+            position.make_move(move)
+            self.generate_split_tasks(position, split_depth - 1, depth - 1, root_move or move_to_uci(move), tasks)
+            position.unmake_move(move)
+
+    def run_suite(self, max_depth: int = 3, jobs: int = 1) -> list:
+        results = []
+
+        for test in PERFT_SUITE:
+            for depth, expected_nodes in enumerate(test["nodes"][:max_depth], start=1):
+                if jobs > 1:
+                    result = self.run_parallel(test["fen"], depth, jobs)
+                else:
+                    result = self.run(test["fen"], depth)
+                result["name"] = test["name"]
+                result["expected_nodes"] = expected_nodes
+                result["passed"] = result["nodes"] == expected_nodes
+                results.append(result)
+
+        return results
+
+    def print_result(self, result: dict) -> None:
+        for move, nodes in result["divided_nodes"].items():
+            print(f"{move}: {nodes}")
+        if result["divided_nodes"]:
+            print("")
+
+        print(f"Depth: {result['depth']}")
+        print(f"Nodes: {result['nodes']}")
+        print(f"Time: {result['time']:.3f}s")
+        print(f"NPS: {result['nps']}")
+
+        if result.get("workers"):
+            print(f"\nJobs: {result['jobs']}, split depth: {result['split_depth']}, tasks: {result['tasks']}")
+            for worker_pid, worker in sorted(result["workers"].items()):
+                print(f"Worker {worker_pid}: {worker['tasks']} tasks, {worker['nodes']} nodes in {worker['time']:.3f}s ({worker['nps']} nps)")
+
+        if result.get("hash"):
+            hash_stats = result["hash"]
+            print(f"\nHash: {hash_stats['size_mb']} MB, {hash_stats['entries']} entries, {hash_stats['probes']} probes, {hash_stats['hits']} hits ({hash_stats['hit_rate']:.1%}), {hash_stats['stores']} stores, {hash_stats['replacements']} replacements")
+
+    def print_suite_results(self, results: list) -> None:
+        for result in results:
+            status = "PASS" if result["passed"] else "FAIL"
+            print(f"{status} {result['name']:<20} depth {result['depth']}  nodes {result['nodes']:>12}  expected {result['expected_nodes']:>12}  {result['time']:8.3f}s  {result['nps']:>9} nps")
+
+        total_nodes = sum(result["nodes"] for result in results)
+        total_time = sum(result["time"] for result in results)
+        failed = sum(1 for result in results if not result["passed"])
+        print(f"\n{len(results) - failed}/{len(results)} passed, {total_nodes} nodes in {total_time:.3f}s ({int(total_nodes / total_time) if total_time > 0 else 0} nps)")
@@ -0,0 +1,236 @@
+import bz2
+import gzip
+import os
+import re
+import time
+from .fen import START_FEN
+from .move import NULL_MOVE
+from .move_generator import MoveGenerator
+from .position import Position
+from .worker_pool import map_unordered
+
+# Bytes of the file per parallel task. Each task only holds the results of its own games, so memory
+# stays flat however big the file is.
+SHARD_SIZE = 4 * 1024 * 1024
+
+# Shards start and end on these lines. Event is the first tag of the seven every pgn game has.
+GAME_START = b"[Event "
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+HEADER_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Move numbers like 12. or 12... sometimes run straight into the move, 12.e4
+MOVE_NUMBER_PATTERN = re.compile(r"^\d+\.+")
+
+
+def open_pgn(path: str):
+    # Binary file object for a plain, .gz or .bz2 pgn. The compressed ones decompress as they're read.
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(".gz") or path.endswith(".bz2")
+
+
+def read_pgn_lines(file, start: int = 0, end: int = None):
+    # Yields the decoded lines of the games starting in [start, end) bytes into the file, one line at a
+    # time. A shard that starts mid file skips ahead to the first game start line, and stops at the first
+    # game start line at or past end, so every game is read by exactly one shard.
+    offset = start
+    if start:
+        # Stepping back a byte keeps a game that starts exactly at start from being skipped as a partial line
+        file.seek(start - 1)
+        offset += len(file.readline()) - 1
+        for line in file:
+            if line.startswith(GAME_START):
+                break
+            offset += len(line)
+        else:
+            return
+        if end is not None and offset >= end:
+            return
+        yield line.decode("utf-8", errors="replace")
+        offset += len(line)
+
+    for line in file:
+        if end is not None and offset >= end and line.startswith(GAME_START):
+            return
+        offset += len(line)
+        yield line.decode("utf-8", errors="replace")
+
+
+def read_pgn_games(lines):
+    # Yields every game in the lines as {"headers": {name: value}, "moves": [san, ...], "result": str}.
+    # Comments, variations, NAGs and move numbers are dropped. Only the game being read is ever held.
+    headers = {}
+    moves = []
+    result = None
+    comment_depth = 0
+    variation_depth = 0
+
+    for line in lines:
+        line = line.strip()
+        if comment_depth == 0 and variation_depth == 0:
+            if not line or line.startswith("%"):
+                continue
+            if line.startswith("["):
+                # Tags after movetext start the next game, even when the last one had no result
+                if moves or result:
+                    yield {"headers": headers, "moves": moves, "result": result if result else headers.get("Result", "*")}
+                    headers, moves, result = {}, [], None
+                match = HEADER_PATTERN.match(line)
+                if match:
+                    headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                continue
+
+        # Spaces around the brackets make them tokens of their own
+        for token in line.replace("{", " { ").replace("}", " } ").replace("(", " ( ").replace(")", " ) ").split():
+            if comment_depth:
+                if token == "}":
+                    comment_depth = 0
+                continue
+            if token == "{":
+                comment_depth = 1
+            elif token.startswith(";"):
+                # Comment to the end of the line
+                break
+            elif token == "(":
+                variation_depth += 1
+            elif token == ")":
+                variation_depth = max(variation_depth - 1, 0)
+            elif variation_depth or token.startswith("$"):
+                continue
+            elif token in RESULTS:
+                result = token
+            else:
+                token = MOVE_NUMBER_PATTERN.sub("", token)
+                if token:
+                    moves.append(token)
+
+    if moves or result or headers:
+        yield {"headers": headers, "moves": moves, "result": result if result else headers.get("Result", "*")}
+
+
+def get_start_fen(game: dict) -> str:
+    return game["headers"].get("FEN", START_FEN)
+
+
+def replay_game(move_generator: MoveGenerator, game: dict, position: Position = None):
+    # Yields (position, move) before every move of the game, then makes the move. The position is the
+    # same object every time, copy it to keep it. Stops early with game["error"] set when a move isn't
+    # legal, so a broken game never takes the rest of the file down with it.
+    if position is None:
+        position = Position()
+    try:
+        position.set_fen(get_start_fen(game))
+    except (IndexError, KeyError, ValueError):
+        game["error"] = f"bad fen: {get_start_fen(game)}"
+        return
+
+    for ply, san in enumerate(game["moves"]):
+        move = move_generator.parse_san_move(position, san)
+        if move == NULL_MOVE:
+            game["error"] = f"illegal move {san} at ply {ply + 1}"
+            return
+        yield position, move
+        position.make_move(move)
+
+
+def count_game(move_generator: MoveGenerator, game: dict) -> dict:
+    # Default per game handler, replays the game to check every move and counts the positions
+    positions = sum(1 for _ in replay_game(move_generator, game))
+    return {
+        "white": game["headers"].get("White", "?"),
+        "black": game["headers"].get("Black", "?"),
+        "result": game["result"],
+        "positions": positions,
+        "error": game.get("error"),
+    }
+
+
+def get_shards(path: str, shard_size: int = SHARD_SIZE) -> list:
+    # Byte ranges splitting the file for parallel reading, their edges are moved onto game starts by read_pgn_lines
+    size = os.path.getsize(path)
+    return [(start, min(start + shard_size, size)) for start in range(0, size, shard_size)]
+
+
+worker_move_generator = None
+worker_handler = None
+
+
+def init_pgn_worker(handler) -> None:
+    global worker_move_generator, worker_handler
+    worker_move_generator = MoveGenerator()
+    worker_handler = handler
+
+
+def run_pgn_shard(task: tuple) -> list:
+    # Handler results for every game in one byte range of the file
+    path, start, end = task
+    with open_pgn(path) as file:
+        return [worker_handler(worker_move_generator, game) for game in read_pgn_games(read_pgn_lines(file, start, end))]
+
+
+class PgnReader():
+    # Streams the games of a pgn database, plain or compressed, one game at a time. map runs a handler
+    # over every game, in worker processes on byte range shards of the file when jobs > 1. Compressed
+    # files can't be seeked into, so they're always read in this process.
+    def __init__(self, path: str, jobs: int = 1, shard_size: int = SHARD_SIZE) -> None:
+        self.path = path
+        self.jobs = jobs
+        self.shard_size = shard_size
+
+    def games(self):
+        with open_pgn(self.path) as file:
+            yield from read_pgn_games(read_pgn_lines(file))
+
+    def positions(self):
+        # (game, position, move) before every move of every game, read in this process
+        move_generator = MoveGenerator()
+        position = Position()
+        for game in self.games():
+            for position, move in replay_game(move_generator, game, position):
+                yield game, position, move
+
+    def map(self, handler=count_game):
+        # Yields handler(move_generator, game) for every game. The handler has to be a module level function
+        # for worker processes to find it. Results come in file order within a shard, shards in completion order.
+        if self.jobs > 1 and not is_compressed(self.path):
+            tasks = ((self.path, start, end) for start, end in get_shards(self.path, self.shard_size))
+            for results in map_unordered(run_pgn_shard, tasks, self.jobs, init_pgn_worker, (handler,)):
+                yield from results
+        else:
+            move_generator = MoveGenerator()
+            for game in self.games():
+                yield handler(move_generator, game)
+
+    def run(self) -> dict:
+        # Replays every game with count_game and sums it up
+        start_time = time.perf_counter()
+        summary = {"games": 0, "positions": 0, "errors": 0, "results": dict.fromkeys(RESULTS, 0)}
+        for result in self.map(count_game):
+            summary["games"] += 1
+            summary["positions"] += result["positions"]
+            summary["results"][result["result"] if result["result"] in RESULTS else "*"] += 1
+            if result["error"]:
+                summary["errors"] += 1
+
+        elapsed_time = time.perf_counter() - start_time
+        summary["time"] = elapsed_time
+        summary["games_per_second"] = int(summary["games"] / elapsed_time) if elapsed_time > 0 else 0
+        summary["positions_per_second"] = int(summary["positions"] / elapsed_time) if elapsed_time > 0 else 0
+        return summary
+
+    def print_summary(self, summary: dict) -> None:
+        print(f"Games: {summary['games']}")
+        print("Results: " + ", ".join(f"{result} {count}" for result, count in summary["results"].items()))
+        print(f"Positions: {summary['positions']}")
+        if summary["errors"]:
+            print(f"Games with illegal moves: {summary['errors']}")
+        print(f"Time: {summary['time']:.3f}s")
+        print(f"Games per second: {summary['games_per_second']}")
+        print(f"Positions per second: {summary['positions_per_second']}")
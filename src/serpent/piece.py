@@ -1,7 +1,9 @@
-from enum import Enum
+from enum import IntEnum
 
 
-class Piece(Enum):
+# Piece values double as indexes into Position.bitboards, white pieces are 0 - 5 and
+# black pieces are the same piece type offset by 6
+class Piece(IntEnum):
     WHITE_PAWN = 0
     WHITE_KNIGHT = 1
     WHITE_BISHOP = 2
@@ -14,3 +16,13 @@ class Piece(Enum):
     BLACK_ROOK = 9
     BLACK_QUEEN = 10
     BLACK_KING = 11
+
+
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+
+PIECE_LETTERS = "PNBRQKpnbrqk"
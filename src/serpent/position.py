@@ -0,0 +1,343 @@
+from .attack_tables import PAWN_ATTACKS
+from .evaluation import EG_SCORES, MG_SCORES, PHASE_SCORES
+from .fen import ALL_CASTLING_RIGHTS, BLACK_KINGSIDE, BLACK_QUEENSIDE, WHITE_KINGSIDE, WHITE_QUEENSIDE, Fen
+from .move import CAPTURE_FLAG, DOUBLE_PAWN_PUSH, EN_PASSANT, KING_CASTLE, PROMOTION_FLAG, QUEEN_CASTLE, SQUARES_TO_COORDS, move_to_uci
+from .piece import KING, PAWN, PIECE_LETTERS, ROOK, Piece
+from .zobrist import CASTLING_KEYS, EN_PASSANT_FILE_KEYS, PIECE_SQUARE_KEYS, SIDE_TO_MOVE_KEY, compute_hash, compute_pawn_hash
+
+WHITE = 0
+BLACK = 1
+
+# Rights that survive a piece moving from or to a square. Moving the king or a rook, or
+# capturing a rook on its home square, removes the matching rights.
+CASTLING_RIGHTS_MASK = [ALL_CASTLING_RIGHTS] * 64
+CASTLING_RIGHTS_MASK[0] = ALL_CASTLING_RIGHTS ^ BLACK_QUEENSIDE     # a8
+CASTLING_RIGHTS_MASK[4] = ALL_CASTLING_RIGHTS ^ (BLACK_KINGSIDE | BLACK_QUEENSIDE)  # e8
+CASTLING_RIGHTS_MASK[7] = ALL_CASTLING_RIGHTS ^ BLACK_KINGSIDE      # h8
+CASTLING_RIGHTS_MASK[56] = ALL_CASTLING_RIGHTS ^ WHITE_QUEENSIDE    # a1
+CASTLING_RIGHTS_MASK[60] = ALL_CASTLING_RIGHTS ^ (WHITE_KINGSIDE | WHITE_QUEENSIDE)  # e1
+CASTLING_RIGHTS_MASK[63] = ALL_CASTLING_RIGHTS ^ WHITE_KINGSIDE     # h1
+
+# Rook source and target squares, keyed by the king's target square when castling
+CASTLING_ROOK_SQUARES = {
+    62: (63, 61),  # g1: h1 -> f1
+    58: (56, 59),  # c1: a1 -> d1
+    6: (7, 5),     # g8: h8 -> f8
+    2: (0, 3),     # c8: a8 -> d8
+}
+
+
+class Position():
+    # Bitboards and the mailbox board in one object. make_move / unmake_move update them in
+    # place, everything that can't be recovered from the move itself goes on state_stack.
+    # hash is the Zobrist key, updated with XORs as pieces and state change. With debug_hash set
+    # every make / unmake checks it and pawn_hash, the key of the pawns alone, against a full
+    # recompute. mg_score, eg_score and phase are the
+    # running evaluation terms, see evaluation.py.
+    def __init__(self, debug_hash: bool = False) -> None:
+        self.bitboards = [0] * 12
+        self.occupancy = [0, 0]
+        self.full_board = 0
+        self.piece_board = [None] * 64
+        self.color_to_move = WHITE
+        self.castling_rights = 0
+        self.en_passant_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.hash = 0
+        self.pawn_hash = 0
+        self.mg_score = 0
+        self.eg_score = 0
+        self.phase = 0
+        self.state_stack = []
+        # Keys of every earlier position, for repetition checks
+        self.hash_history = []
+        self.debug_hash = debug_hash
+
+    def set_fen(self, fen: str) -> None:
+        parser = Fen()
+        parser.parse_fen(fen)
+        self.generate_position_from_fen(parser.get_parsed_fen())
+
+    def generate_position_from_fen(self, fen) -> None:
+        self.__init__(self.debug_hash)
+
+        for square, piece in enumerate(fen["piece_board"]):
+            if piece is not None:
+                self.add_piece(int(piece), square)
+
+        self.color_to_move = fen["color_to_move"]
+        self.castling_rights = fen["castling_rights"]
+        self.en_passant_square = fen["en_passant_square"]
+        self.halfmove_clock = fen.get("halfmove_clock", 0)
+        self.fullmove_number = fen.get("fullmove_number", 1)
+        self.hash = fen["hash"]
+
+        if self.debug_hash:
+            self.verify_hash()
+
+    def verify_hash(self, move: int = None) -> None:
+        expected_hash = compute_hash(self)
+        if self.hash != expected_hash:
+            after_move = f" after {move_to_uci(move)}" if move is not None else ""
+            raise RuntimeError(f"Zobrist key mismatch{after_move} in {self.get_fen()}: incremental {self.hash:016x}, recomputed {expected_hash:016x}")
+
+        expected_pawn_hash = compute_pawn_hash(self)
+        if self.pawn_hash != expected_pawn_hash:
+            after_move = f" after {move_to_uci(move)}" if move is not None else ""
+            raise RuntimeError(f"Pawn key mismatch{after_move} in {self.get_fen()}: incremental {self.pawn_hash:016x}, recomputed {expected_pawn_hash:016x}")
+
+    def get_fen(self) -> str:
+        ranks = []
+        for rank in range(8):
+            rank_string = ""
+            empty_squares = 0
+            for square in range(rank * 8, rank * 8 + 8):
+                piece = self.piece_board[square]
+                if piece is None:
+                    empty_squares += 1
+                    continue
+                if empty_squares:
+                    rank_string += str(empty_squares)
+                    empty_squares = 0
+                rank_string += PIECE_LETTERS[piece]
+            if empty_squares:
+                rank_string += str(empty_squares)
+            ranks.append(rank_string)
+
+        castling_rights = ""
+        for right, letter in ((WHITE_KINGSIDE, "K"), (WHITE_QUEENSIDE, "Q"), (BLACK_KINGSIDE, "k"), (BLACK_QUEENSIDE, "q")):
+            if self.castling_rights & right:
+                castling_rights += letter
+
+        return " ".join([
+            "/".join(ranks),
+            "b" if self.color_to_move else "w",
+            castling_rights or "-",
+            SQUARES_TO_COORDS[self.en_passant_square] if self.en_passant_square is not None else "-",
+            str(self.halfmove_clock),
+            str(self.fullmove_number),
+        ])
+
+    def add_piece(self, piece: int, square: int) -> None:
+        square_bit = 1 << square
+        self.bitboards[piece] |= square_bit
+        self.occupancy[piece // 6] |= square_bit
+        self.full_board |= square_bit
+        self.piece_board[square] = piece
+        self.hash ^= PIECE_SQUARE_KEYS[piece][square]
+        if piece % 6 == PAWN:
+            self.pawn_hash ^= PIECE_SQUARE_KEYS[piece][square]
+        self.mg_score += MG_SCORES[piece][square]
+        self.eg_score += EG_SCORES[piece][square]
+        self.phase += PHASE_SCORES[piece]
+
+    def remove_piece(self, piece: int, square: int) -> None:
+        square_bit = 1 << square
+        self.bitboards[piece] ^= square_bit
+        self.occupancy[piece // 6] ^= square_bit
+        self.full_board ^= square_bit
+        self.piece_board[square] = None
+        self.hash ^= PIECE_SQUARE_KEYS[piece][square]
+        if piece % 6 == PAWN:
+            self.pawn_hash ^= PIECE_SQUARE_KEYS[piece][square]
+        self.mg_score -= MG_SCORES[piece][square]
+        self.eg_score -= EG_SCORES[piece][square]
+        self.phase -= PHASE_SCORES[piece]
+
+    def move_piece(self, piece: int, source: int, target: int) -> None:
+        move_bits = (1 << source) | (1 << target)
+        self.bitboards[piece] ^= move_bits
+        self.occupancy[piece // 6] ^= move_bits
+        self.full_board ^= move_bits
+        self.piece_board[source] = None
+        self.piece_board[target] = piece
+        piece_keys = PIECE_SQUARE_KEYS[piece]
+        self.hash ^= piece_keys[source] ^ piece_keys[target]
+        if piece % 6 == PAWN:
+            self.pawn_hash ^= piece_keys[source] ^ piece_keys[target]
+        mg_scores = MG_SCORES[piece]
+        self.mg_score += mg_scores[target] - mg_scores[source]
+        eg_scores = EG_SCORES[piece]
+        self.eg_score += eg_scores[target] - eg_scores[source]
+
+    def make_move(self, move: int) -> None:
+        # The move has to be at least pseudo legal for this position
+        source = move & 0x3F
+        target = (move >> 6) & 0x3F
+        flags = move >> 12
+        color = self.color_to_move
+        piece = self.piece_board[source]
+        captured_piece = self.piece_board[target]
+
+        self.state_stack.append((captured_piece, self.castling_rights, self.en_passant_square, self.halfmove_clock))
+        self.hash_history.append(self.hash)
+
+        if flags == EN_PASSANT:
+            # The captured pawn sits behind the target square
+            captured_square = target + 8 if color == WHITE else target - 8
+            self.remove_piece(self.piece_board[captured_square], captured_square)
+        elif captured_piece is not None:
+            self.remove_piece(captured_piece, target)
+
+        if flags & PROMOTION_FLAG:
+            self.remove_piece(piece, source)
+            # Promotion flags list the pieces as knight, bishop, rook, queen
+            self.add_piece(color * 6 + (flags & 3) + 1, target)
+        else:
+            self.move_piece(piece, source, target)
+
+        if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            rook_source, rook_target = CASTLING_ROOK_SQUARES[target]
+            self.move_piece(color * 6 + ROOK, rook_source, rook_target)
+
+        castling_rights = self.castling_rights
+        self.castling_rights &= CASTLING_RIGHTS_MASK[source] & CASTLING_RIGHTS_MASK[target]
+        if self.castling_rights != castling_rights:
+            self.hash ^= CASTLING_KEYS[castling_rights] ^ CASTLING_KEYS[self.castling_rights]
+
+        # Only keep an en passant square when an opponent pawn can actually take on it
+        if self.en_passant_square is not None:
+            self.hash ^= EN_PASSANT_FILE_KEYS[self.en_passant_square & 7]
+            self.en_passant_square = None
+        if flags == DOUBLE_PAWN_PUSH:
+            en_passant_square = (source + target) >> 1
+            if PAWN_ATTACKS[color][en_passant_square] & self.bitboards[(color ^ 1) * 6 + PAWN]:
+                self.en_passant_square = en_passant_square
+                self.hash ^= EN_PASSANT_FILE_KEYS[en_passant_square & 7]
+
+        if piece % 6 == PAWN or flags & CAPTURE_FLAG:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        if color == BLACK:
+            self.fullmove_number += 1
+
+        self.color_to_move = color ^ 1
+        self.hash ^= SIDE_TO_MOVE_KEY
+
+        if self.debug_hash:
+            self.verify_hash(move)
+
+    def unmake_move(self, move: int) -> None:
+        source = move & 0x3F
+        target = (move >> 6) & 0x3F
+        flags = move >> 12
+
+        color = self.color_to_move ^ 1
+        self.color_to_move = color
+        if color == BLACK:
+            self.fullmove_number -= 1
+
+        # XOR the side, castling and en passant keys back out before restoring the old state
+        key = self.hash ^ SIDE_TO_MOVE_KEY ^ CASTLING_KEYS[self.castling_rights]
+        if self.en_passant_square is not None:
+            key ^= EN_PASSANT_FILE_KEYS[self.en_passant_square & 7]
+
+        captured_piece, self.castling_rights, self.en_passant_square, self.halfmove_clock = self.state_stack.pop()
+        self.hash_history.pop()
+
+        key ^= CASTLING_KEYS[self.castling_rights]
+        if self.en_passant_square is not None:
+            key ^= EN_PASSANT_FILE_KEYS[self.en_passant_square & 7]
+        self.hash = key
+
+        if flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            rook_source, rook_target = CASTLING_ROOK_SQUARES[target]
+            self.move_piece(color * 6 + ROOK, rook_target, rook_source)
+
+        if flags & PROMOTION_FLAG:
+            self.remove_piece(self.piece_board[target], target)
+            self.add_piece(color * 6 + PAWN, source)
+        else:
+            self.move_piece(self.piece_board[target], target, source)
+
+        if flags == EN_PASSANT:
+            captured_square = target + 8 if color == WHITE else target - 8
+            self.add_piece((color ^ 1) * 6 + PAWN, captured_square)
+        elif captured_piece is not None:
+            self.add_piece(captured_piece, target)
+
+        if self.debug_hash:
+            self.verify_hash(move)
+
+    def is_repetition(self) -> bool:
+        # Only positions since the last capture or pawn move can repeat, and only every other
+        # one has the same side to move
+        hash_history = self.hash_history
+        oldest_index = max(len(hash_history) - self.halfmove_clock, 0)
+        for index in range(len(hash_history) - 2, oldest_index - 1, -2):
+            if hash_history[index] == self.hash:
+                return True
+        return False
+
+    def count_repetitions(self) -> int:
+        # How many times the current position came up before, 2 makes this a threefold repetition
+        hash_history = self.hash_history
+        oldest_index = max(len(hash_history) - self.halfmove_clock, 0)
+        count = 0
+        for index in range(len(hash_history) - 2, oldest_index - 1, -2):
+            if hash_history[index] == self.hash:
+                count += 1
+        return count
+
+    def get_king_square(self, color: int) -> int:
+        return (self.bitboards[color * 6 + KING]).bit_length() - 1
+
+    # Named access to the bitboards, the same names Bitboard used
+    @property
+    def white_pawns(self) -> int:
+        return self.bitboards[Piece.WHITE_PAWN]
+
+    @property
+    def black_pawns(self) -> int:
+        return self.bitboards[Piece.BLACK_PAWN]
+
+    @property
+    def white_knights(self) -> int:
+        return self.bitboards[Piece.WHITE_KNIGHT]
+
+    @property
+    def black_knights(self) -> int:
+        return self.bitboards[Piece.BLACK_KNIGHT]
+
+    @property
+    def white_bishops(self) -> int:
+        return self.bitboards[Piece.WHITE_BISHOP]
+
+    @property
+    def black_bishops(self) -> int:
+        return self.bitboards[Piece.BLACK_BISHOP]
+
+    @property
+    def white_rooks(self) -> int:
+        return self.bitboards[Piece.WHITE_ROOK]
+
+    @property
+    def black_rooks(self) -> int:
+        return self.bitboards[Piece.BLACK_ROOK]
+
+    @property
+    def white_queens(self) -> int:
+        return self.bitboards[Piece.WHITE_QUEEN]
+
+    @property
+    def black_queens(self) -> int:
+        return self.bitboards[Piece.BLACK_QUEEN]
+
+    @property
+    def white_king(self) -> int:
+        return self.bitboards[Piece.WHITE_KING]
+
+    @property
+    def black_king(self) -> int:
+        return self.bitboards[Piece.BLACK_KING]
+
+    @property
+    def white_board(self) -> int:
+        return self.occupancy[WHITE]
+
+    @property
+    def black_board(self) -> int:
+        return self.occupancy[BLACK]
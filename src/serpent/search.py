@@ -0,0 +1,390 @@
+import time
+from .bitbases import BITBASE_DRAW, BITBASE_WIN, Bitbases, get_mop_up_score
+from .evaluation import evaluate
+from .move import NULL_MOVE, MoveList, move_to_uci
+from .move_generator import GENERATE_ALL, GENERATE_CAPTURES, MoveGenerator
+from .move_ordering import MoveOrdering, MovePicker, get_mvv_lva_score, is_losing_capture, is_quiet
+from .pawn_hash_table import PawnHashTable
+from .position import Position
+from .smp import HelperPool, is_skipped_depth, vote_best_result
+from .time_manager import TimeManager
+from .transposition_table import BOUND_EXACT, BOUND_LOWER, BOUND_UPPER, TranspositionTable, score_from_tt, score_to_tt, unpack_entry
+
+MAX_PLY = 64
+INFINITY = 50000
+MATE_SCORE = 32000
+# Anything past this is a forced mate, the difference is the number of plies to it
+MATE_THRESHOLD = MATE_SCORE - MAX_PLY
+DRAW_SCORE = 0
+# Bitbase wins score this plus the static eval and get_mop_up_score, so entering a won endgame closer
+# to mate scores higher. Well below mate scores, a found mate is always better.
+BITBASE_WIN_SCORE = 20000
+
+# Clock and node limits are only checked every this many nodes, reading the clock is not free
+CHECK_INTERVAL_MASK = 1023
+
+DEFAULT_HASH_SIZE_MB = 16
+
+
+def format_score(score: int) -> str:
+    # uci style, either "cp <centipawns>" or "mate <moves>" with a negative count when we get mated
+    if score >= MATE_THRESHOLD:
+        return f"mate {(MATE_SCORE - score + 1) // 2}"
+    if score <= -MATE_THRESHOLD:
+        return f"mate -{(MATE_SCORE + score) // 2}"
+    return f"cp {score}"
+
+
+def format_iteration(iteration: dict) -> str:
+    return (
+        f"info depth {iteration['depth']} score {format_score(iteration['score'])} nodes {iteration['nodes']} "
+        f"nps {iteration['nps']} hashfull {iteration['hashfull']} time {int(iteration['time'] * 1000)} pv {' '.join(move_to_uci(move) for move in iteration['pv'])}"
+    )
+
+
+class Search():
+    # Negamax alpha-beta with iterative deepening. Every iteration searches one ply deeper than the last
+    # and starts from the best move it found, a search stopped by a limit returns the last finished iteration.
+    def __init__(self, move_generator: MoveGenerator = None, hash_size_mb: int = DEFAULT_HASH_SIZE_MB, hash_buffer=None) -> None:
+        self.move_generator = move_generator if move_generator else MoveGenerator()
+        self.transposition_table = TranspositionTable(hash_size_mb, hash_buffer)
+        # With more than one thread the extra ones are Lazy SMP helper processes sharing the transposition table
+        self.threads = 1
+        self.helper_pool = None
+        # Set in helper processes, the main search stops them all through it
+        self.shared_stop = None
+        self.pawn_hash_table = PawnHashTable()
+        self.bitbases = Bitbases()
+        # Piece counts of the root, bitbase wins only end the search in endgames with different material
+        self.root_material = None
+        # One move list per ply so the recursion never allocates
+        self.move_lists = [MoveList() for _ in range(MAX_PLY + 1)]
+        self.move_ordering = MoveOrdering(MAX_PLY)
+        self.move_pickers = [MovePicker(self.move_generator, self.move_ordering) for _ in range(MAX_PLY)]
+        # Triangular pv table, pv_table[ply] holds the best line found from ply onwards
+        self.pv_table = [[NULL_MOVE] * MAX_PLY for _ in range(MAX_PLY)]
+        self.pv_length = [0] * MAX_PLY
+
+        self.nodes = 0
+        self.stopped = False
+        self.start_time = 0.0
+        self.max_nodes = None
+        self.end_time = None
+        self.time_manager = None
+
+    def set_hash_size(self, size_mb: int) -> None:
+        if size_mb != self.transposition_table.size_mb:
+            self.start_helpers(size_mb, self.threads)
+
+    def set_threads(self, threads: int) -> None:
+        if threads != self.threads:
+            self.start_helpers(self.transposition_table.size_mb, threads)
+
+    def start_helpers(self, size_mb: int, threads: int) -> None:
+        # Builds a new transposition table, in shared memory when there are helpers to share it with
+        helper_pool = self.helper_pool
+        # Nothing may still point into the old shared memory block when it's closed
+        self.transposition_table = None
+        self.helper_pool = None
+        if helper_pool:
+            helper_pool.close()
+
+        self.threads = threads
+        if threads > 1:
+            self.helper_pool = HelperPool(threads - 1, size_mb)
+            self.transposition_table = TranspositionTable(size_mb, self.helper_pool.shared_memory.buf)
+        else:
+            self.transposition_table = TranspositionTable(size_mb)
+
+    def close(self) -> None:
+        # Shuts down the helper processes, the search still works afterwards on one thread
+        if self.helper_pool:
+            self.start_helpers(self.transposition_table.size_mb, 1)
+
+    def new_game(self) -> None:
+        # Nothing learned about the last game carries over
+        self.transposition_table.clear()
+        self.pawn_hash_table.clear()
+        self.move_ordering.clear()
+        if self.helper_pool:
+            self.helper_pool.new_game()
+
+    def stop(self) -> None:
+        # Safe to call from another thread, the search notices at its next limit check
+        self.stopped = True
+
+    def set_time_limit(self, max_time: float) -> None:
+        # Gives a running search a time limit counted from now, for uci ponderhit
+        self.end_time = time.perf_counter() + max_time
+
+    def start_time_manager(self, time_manager: TimeManager) -> None:
+        # Same for a clock, the time manager's limits start counting now
+        time_manager.start()
+        self.end_time = time_manager.get_hard_deadline()
+        self.time_manager = time_manager
+
+    def search(self, position: Position, max_depth: int = None, max_nodes: int = None, max_time: float = None, on_iteration=None, time_manager: TimeManager = None, helper_index: int = 0) -> dict:
+        # Limits are a depth in plies, a node count, a time in seconds and a time manager for playing on a
+        # clock. Any left as None don't apply, with none at all the search runs until stop() is called or
+        # it reaches MAX_PLY. helper_index is only set in Lazy SMP helper processes.
+        self.nodes = 0
+        self.stopped = False
+        self.start_time = time.perf_counter()
+        self.max_nodes = max_nodes
+        self.end_time = self.start_time + max_time if max_time is not None else None
+        self.time_manager = None
+        if time_manager:
+            self.start_time_manager(time_manager)
+        max_depth = min(max_depth, MAX_PLY - 1) if max_depth else MAX_PLY - 1
+        # Helpers are handed the main search's age with the root
+        if not helper_index:
+            self.transposition_table.new_search()
+        self.transposition_table.reset_stats()
+        self.pawn_hash_table.reset_stats()
+        self.move_ordering.new_search()
+
+        self.root_material = self.get_material(position)
+
+        root_moves = list(self.move_generator.generate_legal_moves(position, MoveList()))
+        result = {"best_move": root_moves[0] if root_moves else NULL_MOVE, "score": 0, "depth": 0, "pv": [], "iterations": []}
+
+        helpers_started = self.helper_pool is not None and bool(root_moves)
+        if helpers_started:
+            self.helper_pool.start_search(position, max_depth, self.transposition_table.age)
+
+        for depth in range(1, max_depth + 1):
+            if not root_moves:
+                break
+            if is_skipped_depth(helper_index, depth):
+                continue
+
+            score = self.search_root(position, root_moves, depth)
+            # A partly searched iteration is only trusted when there is nothing better to fall back on
+            if self.stopped and (result["depth"] > 0 or not self.pv_length[0]):
+                break
+
+            elapsed_time = time.perf_counter() - self.start_time
+            pv = self.pv_table[0][:self.pv_length[0]]
+            iteration = {
+                "depth": depth,
+                "score": score,
+                "nodes": self.nodes,
+                "time": elapsed_time,
+                "nps": int(self.nodes / elapsed_time) if elapsed_time > 0 else 0,
+                "hashfull": self.transposition_table.hashfull(),
+                "pv": pv,
+            }
+            result["iterations"].append(iteration)
+            result.update(best_move=pv[0] if pv else root_moves[0], score=score, depth=depth, pv=pv)
+            if on_iteration:
+                on_iteration(iteration)
+
+            # Search the best move first next iteration, it gives the tightest bounds soonest
+            if pv:
+                root_moves.remove(pv[0])
+                root_moves.insert(0, pv[0])
+
+            if self.stopped:
+                break
+
+            # Read once, ponderhit can hand the search a time manager at any point
+            time_manager = self.time_manager
+            if time_manager:
+                time_manager.update(result["best_move"], score)
+                # With one legal move there is nothing to think about
+                if len(root_moves) == 1 or time_manager.should_stop():
+                    break
+
+        nodes = self.nodes
+        if helpers_started:
+            helper_results = self.helper_pool.stop_search()
+            nodes += sum(helper_result["nodes"] for helper_result in helper_results)
+            # Helpers stopped before finishing an iteration have nothing to say
+            candidates = [result] + [helper_result for helper_result in helper_results if helper_result["depth"]]
+            best_result = vote_best_result(candidates)
+            result.update(best_move=best_result["best_move"], score=best_result["score"], depth=best_result["depth"], pv=best_result["pv"])
+
+        elapsed_time = time.perf_counter() - self.start_time
+        result.update(nodes=nodes, time=elapsed_time, nps=int(nodes / elapsed_time) if elapsed_time > 0 else 0, hash=self.transposition_table.get_stats(), pawn_hash=self.pawn_hash_table.get_stats())
+        return result
+
+    def search_root(self, position: Position, root_moves: list, depth: int) -> int:
+        # Same as negamax, but over the ordered root move list
+        alpha = -INFINITY
+        beta = INFINITY
+        self.pv_length[0] = 0
+        self.nodes += 1
+
+        for move in root_moves:
+            position.make_move(move)
+            score = -self.negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake_move(move)
+
+            if self.stopped:
+                break
+
+            if score > alpha:
+                alpha = score
+                self.update_pv(0, move)
+
+        if not self.stopped and self.pv_length[0]:
+            self.transposition_table.store(position.hash, self.pv_table[0][0], score_to_tt(alpha, 0), depth, BOUND_EXACT)
+        return alpha
+
+    def negamax(self, position: Position, depth: int, alpha: int, beta: int, ply: int) -> int:
+        if depth <= 0:
+            return self.quiescence(position, alpha, beta, ply)
+
+        self.pv_length[ply] = ply
+        self.nodes += 1
+
+        if not self.nodes & CHECK_INTERVAL_MASK:
+            self.check_limits()
+        if self.stopped:
+            return 0
+
+        if position.halfmove_clock >= 100 or position.is_repetition():
+            return DRAW_SCORE
+
+        # Known endgames end the search here, the root still has to pick a move. A draw is exact anywhere. A win
+        # only ends the search on the way into an endgame, a capture or promotion away from the root's material.
+        # Inside the root's own endgame every won position would score about the same and the search would
+        # shuffle instead of mating, so it searches on for the mate there.
+        if ply:
+            result = self.bitbases.probe(position)
+            if result is not None:
+                if result == BITBASE_DRAW:
+                    return DRAW_SCORE
+                # A mated side has no moves, the move loop below scores that as the mate it is
+                if self.get_material(position) != self.root_material and (result == BITBASE_WIN or self.move_generator.generate_legal_moves(position)):
+                    strong_color = position.color_to_move if result == BITBASE_WIN else position.color_to_move ^ 1
+                    return result * (BITBASE_WIN_SCORE + get_mop_up_score(position, strong_color)) + evaluate(position, self.pawn_hash_table)
+
+        if ply >= MAX_PLY - 1:
+            return evaluate(position, self.pawn_hash_table)
+
+        # A deep enough entry can settle the node outright, any entry at all gives a move to try first
+        key = position.hash
+        hash_move = NULL_MOVE
+        data = self.transposition_table.probe(key)
+        if data:
+            hash_move, hash_score, hash_depth, hash_bound = unpack_entry(data)
+            if hash_depth >= depth:
+                hash_score = score_from_tt(hash_score, ply)
+                if hash_bound == BOUND_EXACT or (hash_bound == BOUND_LOWER and hash_score >= beta) or (hash_bound == BOUND_UPPER and hash_score <= alpha):
+                    return hash_score
+
+        move_picker = self.move_pickers[ply]
+        move_picker.reset(position, hash_move, ply)
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = NULL_MOVE
+        moves_searched = 0
+        while True:
+            move = move_picker.next_move()
+            if move == NULL_MOVE:
+                break
+            moves_searched += 1
+
+            position.make_move(move)
+            score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move(move)
+
+            if self.stopped:
+                return 0
+
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    best_move = move
+                    self.update_pv(ply, move)
+                    if alpha >= beta:
+                        if is_quiet(move):
+                            self.move_ordering.update_quiet_cutoff(position.color_to_move, move, depth, ply)
+                        break
+
+        if not moves_searched:
+            # Checkmate or stalemate, shorter mates score higher
+            return -MATE_SCORE + ply if self.move_generator.is_in_check(position) else DRAW_SCORE
+
+        if best_score >= beta:
+            bound = BOUND_LOWER
+        elif best_score > original_alpha:
+            bound = BOUND_EXACT
+        else:
+            bound = BOUND_UPPER
+        self.transposition_table.store(key, best_move, score_to_tt(best_score, ply), depth, bound)
+
+        return best_score
+
+    def quiescence(self, position: Position, alpha: int, beta: int, ply: int) -> int:
+        # Only captures and promotions are searched past the horizon, so the static evaluation is never
+        # taken in the middle of an exchange. The side to move can always stand pat instead of capturing,
+        # except in check where every evasion is searched.
+        self.pv_length[ply] = ply
+        self.nodes += 1
+
+        if not self.nodes & CHECK_INTERVAL_MASK:
+            self.check_limits()
+        if self.stopped:
+            return 0
+
+        if ply >= MAX_PLY - 1:
+            return evaluate(position, self.pawn_hash_table)
+
+        in_check = self.move_generator.is_in_check(position)
+        if in_check:
+            moves = self.move_generator.generate_legal_moves(position, self.move_lists[ply], GENERATE_ALL)
+            if not moves:
+                return -MATE_SCORE + ply
+            best_score = -INFINITY
+        else:
+            best_score = evaluate(position, self.pawn_hash_table)
+            if best_score >= beta:
+                return best_score
+            if best_score > alpha:
+                alpha = best_score
+            moves = self.move_generator.generate_legal_moves(position, self.move_lists[ply], GENERATE_CAPTURES)
+
+        for move in sorted(moves, key=lambda move: get_mvv_lva_score(position, move), reverse=True):
+            # Captures that lose material once the exchange plays out can't raise the stand pat score
+            if not in_check and is_losing_capture(self.move_generator, position, move):
+                continue
+
+            position.make_move(move)
+            score = -self.quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move(move)
+
+            if self.stopped:
+                return 0
+
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    self.update_pv(ply, move)
+                    if alpha >= beta:
+                        break
+
+        return best_score
+
+    def get_material(self, position: Position) -> list:
+        return [bitboard.bit_count() for bitboard in position.bitboards]
+
+    def update_pv(self, ply: int, move: int) -> None:
+        # The new line is this move followed by the best line one ply down
+        pv_table = self.pv_table
+        pv_table[ply][ply] = move
+        next_length = self.pv_length[ply + 1]
+        pv_table[ply][ply + 1:next_length] = pv_table[ply + 1][ply + 1:next_length]
+        self.pv_length[ply] = max(next_length, ply + 1)
+
+    def check_limits(self) -> None:
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            self.stopped = True
+        elif self.end_time is not None and time.perf_counter() >= self.end_time:
+            self.stopped = True
+        elif self.shared_stop is not None and self.shared_stop.is_set():
+            self.stopped = True
@@ -0,0 +1,76 @@
+from .move import EN_PASSANT, PROMOTION_FLAG
+from .piece import BISHOP, KING, PAWN, QUEEN, ROOK
+
+# Exchange values, the king is worth more than everything else together so capturing with it
+# always comes last
+SEE_VALUES = [100, 320, 330, 500, 900, 20000]
+
+
+def see(move_generator, position, move: int) -> int:
+    # Static exchange evaluation: the material the side to move ends up with after both sides keep
+    # recapturing on the target square, cheapest piece first, each stopping whenever it would lose
+    # more. Works on the bitboards alone, pieces are taken off a local occupancy board and sliders
+    # behind them are picked up as x-rays. Pins are ignored.
+    bitboards = position.bitboards
+    piece_board = position.piece_board
+    magic_bitboards = move_generator.magic_bitboards
+
+    source = move & 0x3F
+    target = (move >> 6) & 0x3F
+    flags = move >> 12
+    color = position.color_to_move
+    occupancy = position.full_board ^ (1 << source)
+
+    if flags == EN_PASSANT:
+        # The captured pawn isn't on the target square
+        occupancy ^= 1 << (target + 8 if color == 0 else target - 8)
+        gain = SEE_VALUES[PAWN]
+    else:
+        victim = piece_board[target]
+        gain = SEE_VALUES[victim % 6] if victim is not None else 0
+
+    attacker_value = SEE_VALUES[piece_board[source] % 6]
+    if flags & PROMOTION_FLAG:
+        promotion_value = SEE_VALUES[(flags & 3) + 1]
+        gain += promotion_value - SEE_VALUES[PAWN]
+        attacker_value = promotion_value
+
+    gains = [gain]
+    bishops_queens = bitboards[BISHOP] | bitboards[QUEEN] | bitboards[6 + BISHOP] | bitboards[6 + QUEEN]
+    rooks_queens = bitboards[ROOK] | bitboards[QUEEN] | bitboards[6 + ROOK] | bitboards[6 + QUEEN]
+    attackers = move_generator.get_attackers_to(position, target, occupancy) & occupancy
+    color ^= 1
+
+    while True:
+        side_attackers = attackers & position.occupancy[color]
+        if not side_attackers:
+            break
+
+        offset = color * 6
+        for piece_type in range(PAWN, KING + 1):
+            piece_attackers = side_attackers & bitboards[offset + piece_type]
+            if piece_attackers:
+                break
+
+        # The king can only take last, when nothing defends the square any more
+        if piece_type == KING and attackers & position.occupancy[color ^ 1]:
+            break
+
+        # What this side gets if it captures, given the other side kept going
+        gains.append(attacker_value - gains[-1])
+        attacker_value = SEE_VALUES[piece_type]
+
+        occupancy ^= piece_attackers & -piece_attackers
+        # Taking a piece off the board can uncover a slider behind it
+        if piece_type == PAWN or piece_type == BISHOP or piece_type == QUEEN:
+            attackers |= magic_bitboards.get_bishop_attacks(target, occupancy) & bishops_queens
+        if piece_type == ROOK or piece_type == QUEEN:
+            attackers |= magic_bitboards.get_rook_attacks(target, occupancy) & rooks_queens
+        attackers &= occupancy
+        color ^= 1
+
+    # Either side can stop capturing, so walk back choosing the better option at every step
+    for index in range(len(gains) - 1, 0, -1):
+        gains[index - 1] = -max(-gains[index - 1], gains[index])
+
+    return gains[0]
@@ -1,12 +1,18 @@
 from pprint import pformat
 import logging
-from .bitboard import Bitboard
-from .board import Board
-from .fen import Fen
+from .bitbases import build_bitbases
+from .epd import EpdRunner
+from .fen import START_FEN, Fen
+from .match import DEFAULT_ADJUDICATION, Match, read_openings
+from .move import NULL_MOVE, move_to_uci
 from .move_generator import MoveGenerator
+from .perft import Perft
+from .pgn import PgnReader
+from .polyglot import PolyglotBook
+from .position import Position
+from .search import Search, format_iteration
+from .uci import UCI
 from . visuals import Visuals
-import cProfile
-import pstats
 import sys
 
 
@@ -21,71 +27,155 @@ class Serpent():
         self.debug_logger = logging.getLogger("serpent")
         self.debug_logger.setLevel(logging.DEBUG)
 
-        self.bitboard = Bitboard()
-        self.board = Board()
+        self.position = Position()
         self.fen = Fen()
         self.move_generator = MoveGenerator()
         self.visuals = Visuals()
+        self.search = Search(self.move_generator)
 
         self.user_color = None
+        self.search_limits = {}
+        self.book = None
+        self.fen_string = None
 
     def start_serpent(self) -> None:
         self.info_logger.info("Starting Serpent")
+        self.visuals.print_board()
 
-        serpent_isrunning = True
-        need_to_generate_moves = True
-
-        while serpent_isrunning:
-            if need_to_generate_moves:
-                with cProfile.Profile() as pr:
-                    moves = self.move_generator.generate_moves(self.bitboard, self.board)
-                    # moves = self.move_generator.verify_moves(self.bitboard, self.board.color_to_move, moves)
-                stats = pstats.Stats(pr)
-                stats.sort_stats(pstats.SortKey.TIME)
-                stats.print_stats()
-                need_to_generate_moves = False
-                self.visuals.print_board()
-
-            while True:
-                color_to_move = "Black" if self.board.color_to_move else "White"
-                move = input(color_to_move + " to move. Enter a move: ")
-                if move in moves:
-                    # set move in self.board object
-                    self.visuals.set_board(self.board.piece_board)
-                    self.visuals.print_board()
-                    break
+        while True:
+            moves = self.move_generator.generate_legal_moves(self.position)
+            if not moves:
+                if self.move_generator.is_in_check(self.position):
+                    print(("White" if self.position.color_to_move else "Black") + " wins by checkmate")
                 else:
+                    print("Draw by stalemate")
+                break
+
+            color_to_move = "Black" if self.position.color_to_move else "White"
+            if self.user_color is not None and self.position.color_to_move != self.user_color:
+                self.position.make_move(self.select_move())
+            else:
+                move = input(color_to_move + " to move. Enter a move (ex: e2e4): ")
+                uci_moves = moves.to_uci()
+                if move not in uci_moves:
                     self.visuals.print_board()
                     print("That move is not possible in this position. Please select another move")
-
-            serpent_isrunning = False
+                    continue
+                self.position.make_move(moves[uci_moves.index(move)])
+
+            self.visuals.set_board(self.position.piece_board)
+            self.visuals.print_board()
+
+    def select_move(self) -> int:
+        # A book move when there is one, they cost no search time
+        if self.book:
+            move = self.book.get_move(self.move_generator, self.position)
+            if move != NULL_MOVE:
+                print(f"Serpent plays {move_to_uci(move)} from the book")
+                return move
+
+        result = self.search.search(self.position, on_iteration=self.print_iteration, **self.search_limits)
+        print(f"Serpent plays {move_to_uci(result['best_move'])}")
+        return result["best_move"]
+
+    def run_search(self) -> None:
+        result = self.search.search(self.position, on_iteration=self.print_iteration, **self.search_limits)
+        print(f"bestmove {move_to_uci(result['best_move'])}")
+        print(f"Nodes: {result['nodes']}")
+        print(f"Time: {result['time']:.3f}s")
+        print(f"NPS: {result['nps']}")
+        print(f"Hash hit rate: {result['hash']['hit_rate']:.1%}, fill {result['hash']['fill']:.1%}")
+        print(f"Pawn hash hit rate: {result['pawn_hash']['hit_rate']:.1%}")
+
+    def start_uci(self) -> None:
+        UCI(self.search, self.book).loop()
+
+    def print_iteration(self, iteration: dict) -> None:
+        print(format_iteration(iteration))
+
+    def run_perft(self, depth: int, divide: bool, jobs: int = 1, split_depth: int = 1, hash_size_mb: int = 0, debug_hash: bool = False) -> None:
+        perft = Perft(self.move_generator, hash_size_mb, debug_hash)
+        if jobs > 1:
+            result = perft.run_parallel(self.fen_string, depth, jobs, split_depth)
+            if not divide:
+                result["divided_nodes"] = {}
+        else:
+            result = perft.run(self.fen_string, depth, divide)
+        perft.print_result(result)
+
+    def run_epd(self, path: str, jobs: int = 1, hash_size_mb: int = 16, output_path: str = None) -> None:
+        runner = EpdRunner(hash_size_mb, jobs)
+        run = runner.run(path, on_result=runner.print_result, **self.search_limits)
+        runner.print_summary(run["summary"])
+        if output_path:
+            runner.write_json(run, output_path)
+            print(f"Results written to {output_path}")
+
+    def run_match(self, args) -> None:
+        # Explicit per move limits replace the clock, otherwise the games are played on a time control
+        time_control = args.tc
+        limits = {}
+        if args.depth or args.movetime or args.nodes:
+            limits = self.search_limits
+        elif not time_control:
+            time_control = "10+0.1"
+
+        openings = read_openings(args.openings) if args.openings else None
+        sprt = tuple(float(elo) for elo in args.sprt.split(",")) if args.sprt else None
+        match = Match(
+            [args.engine1, args.engine2],
+            games=args.games,
+            concurrency=args.concurrency,
+            openings=openings,
+            time_control=time_control,
+            limits=limits,
+            adjudication=None if args.no_adjudication else DEFAULT_ADJUDICATION,
+            pgn_path=args.pgn,
+            sprt=sprt,
+            seed=None if openings is None else 0
+        )
+        result = match.run()
+        print(f"Finished match of {result['games']} games in {result['time']:.1f}s")
+
+    def run_pgn_replay(self, path: str, jobs: int = 1) -> None:
+        reader = PgnReader(path, jobs)
+        reader.print_summary(reader.run())
+
+    def build_bitbases(self, jobs: int = 1) -> None:
+        print("Building endgame bitbases")
+        build_bitbases(jobs=jobs)
+
+    def run_perft_suite(self, max_depth: int, jobs: int = 1, hash_size_mb: int = 0, debug_hash: bool = False) -> None:
+        perft = Perft(self.move_generator, hash_size_mb, debug_hash)
+        results = perft.run_suite(max_depth, jobs)
+        perft.print_suite_results(results)
 
     def parse_args(self, args) -> None:
 
         self.parse_fen(args)
         self.parse_user_color(args)
+        self.parse_search_limits(args)
+        self.parse_book(args)
 
     def parse_fen(self, args) -> None:
         # Only parsing fens for now as that is the only argument possible
-        base_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-
         if args.fen:
-            self.fen.parse_fen(args.fen)
+            self.fen_string = args.fen
             self.info_logger.info(f"Using fen: {args.fen}")
         else:
-            self.fen.parse_fen(base_fen)
-            self.info_logger.info(f"No fen selected, using base fen: {base_fen}")
+            self.fen_string = START_FEN
+            self.info_logger.info(f"No fen selected, using base fen: {START_FEN}")
+        self.fen.parse_fen(self.fen_string)
 
         parsed_fen = self.fen.get_parsed_fen()
         self.debug_logger.debug(f"Parsed fen is {pformat(parsed_fen)}")
         self.init_helpers_from_fen(parsed_fen)
 
     def init_helpers_from_fen(self, fen) -> None:
-        self.info_logger.info("Setting bitboards, board, and visuals")
+        self.info_logger.info("Setting position and visuals")
 
-        self.bitboard.generate_bitboards_from_fen(fen)
-        self.board.generate_board_values_from_fen(fen)
-        self.visuals.set_board(self.board.piece_board)
+        self.position.generate_position_from_fen(fen)
+        self.visuals.set_board(self.position.piece_board)
 
     def parse_user_color(self, args) -> None:
         if args.color:
@@ -97,3 +187,20 @@ class Serpent():
                 print("ERROR: Color argument did not specify white or black.")
                 print("Exiting Serpent")
                 sys.exit()
+
+    def parse_search_limits(self, args) -> None:
+        # Serpent needs some limit to play a game, without any it thinks for five seconds a move
+        self.search_limits = {
+            "max_depth": args.depth,
+            "max_nodes": args.nodes,
+            "max_time": args.movetime / 1000 if args.movetime else None,
+        }
+        if not any(self.search_limits.values()):
+            self.search_limits["max_time"] = 5.0
+        self.search.set_hash_size(args.hash)
+        self.search.set_threads(args.threads)
+
+    def parse_book(self, args) -> None:
+        if args.book:
+            self.info_logger.info(f"Using opening book: {args.book}")
+            self.book = PolyglotBook(args.book, args.book_best)
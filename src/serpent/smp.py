@@ -0,0 +1,132 @@
+import atexit
+import copy
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from .transposition_table import TranspositionTable
+
+# Helpers skip some iterations so they spread over more depths than the main search does. Helper i
+# skips depth d when ((d + SKIP_PHASE[i]) // SKIP_SIZE[i]) is odd, the same pattern Stockfish used
+# for its Lazy SMP threads.
+SKIP_SIZE = [1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4]
+SKIP_PHASE = [0, 1, 0, 1, 2, 3, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5, 6, 7]
+
+# Helper process commands
+COMMAND_SEARCH = 0
+COMMAND_NEW_GAME = 1
+COMMAND_QUIT = 2
+
+
+def is_skipped_depth(helper_index: int, depth: int) -> bool:
+    # The main search (index 0) never skips, the first helper gets the pattern after it
+    if not helper_index:
+        return False
+    index = (helper_index - 1) % len(SKIP_SIZE)
+    return bool(((depth + SKIP_PHASE[index]) // SKIP_SIZE[index]) % 2)
+
+
+def run_helper(helper_index: int, shared_memory_name: str, hash_size_mb: int, commands, results, stop_event) -> None:
+    # Helper process main loop. Searches whatever root it's sent with a transposition table in the
+    # shared memory block until it's told to quit.
+    # Imported here, search.py imports this module to start the helpers
+    from .search import Search
+
+    shared_memory = SharedMemory(name=shared_memory_name)
+    search = Search(hash_size_mb=hash_size_mb, hash_buffer=shared_memory.buf)
+    search.shared_stop = stop_event
+
+    while True:
+        command = commands.get()
+        if command[0] == COMMAND_QUIT:
+            break
+        if command[0] == COMMAND_NEW_GAME:
+            search.pawn_hash_table.clear()
+            search.move_ordering.clear()
+            continue
+
+        _, position, max_depth, age = command
+        search.transposition_table.age = age
+        result = search.search(position, max_depth, helper_index=helper_index)
+        results.put({
+            "best_move": result["best_move"],
+            "score": result["score"],
+            "depth": result["depth"],
+            "pv": result["pv"],
+            "nodes": result["nodes"],
+        })
+
+    # The table's view of the block has to go before the block can be closed
+    search.transposition_table = None
+    shared_memory.close()
+
+
+def vote_best_result(results: list) -> dict:
+    # Every search votes for its best move, weighted by how deep it got and how good it thinks the move is.
+    # The winner is the deepest search behind the move with the most votes.
+    min_score = min(result["score"] for result in results)
+    votes = {}
+    for result in results:
+        votes[result["best_move"]] = votes.get(result["best_move"], 0) + (result["score"] - min_score + 14) * result["depth"]
+
+    best_result = results[0]
+    for result in results[1:]:
+        if votes[result["best_move"]] > votes[best_result["best_move"]]:
+            best_result = result
+        elif result["best_move"] == best_result["best_move"] and result["depth"] > best_result["depth"]:
+            best_result = result
+    return best_result
+
+
+class HelperPool():
+    # The Lazy SMP helper processes and the shared memory block holding the transposition table they
+    # share with the main search. Python threads can't search in parallel because of the GIL, processes can.
+    def __init__(self, helper_count: int, hash_size_mb: int) -> None:
+        self.helper_count = helper_count
+        self.hash_size_mb = hash_size_mb
+        self.shared_memory = SharedMemory(create=True, size=TranspositionTable.get_buffer_size(hash_size_mb))
+        self.stop_event = multiprocessing.Event()
+        self.results = multiprocessing.Queue()
+        self.command_queues = []
+        self.processes = []
+        self.closed = False
+
+        for helper_index in range(1, helper_count + 1):
+            commands = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=run_helper,
+                args=(helper_index, self.shared_memory.name, hash_size_mb, commands, self.results, self.stop_event),
+                daemon=True
+            )
+            process.start()
+            self.command_queues.append(commands)
+            self.processes.append(process)
+
+        # Shared memory outlives the process unless it's unlinked
+        atexit.register(self.close)
+
+    def start_search(self, position, max_depth: int, age: int) -> None:
+        self.stop_event.clear()
+        # Queues pickle on a background thread, by then the search is already making moves on the original
+        position = copy.deepcopy(position)
+        for commands in self.command_queues:
+            commands.put((COMMAND_SEARCH, position, max_depth, age))
+
+    def stop_search(self) -> list:
+        # Stops the helpers and waits for every one of them to report
+        self.stop_event.set()
+        return [self.results.get() for _ in range(self.helper_count)]
+
+    def new_game(self) -> None:
+        for commands in self.command_queues:
+            commands.put((COMMAND_NEW_GAME,))
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        for commands in self.command_queues:
+            commands.put((COMMAND_QUIT,))
+        for process in self.processes:
+            process.join()
+        self.shared_memory.close()
+        self.shared_memory.unlink()
@@ -0,0 +1,85 @@
+import time
+
+# Time kept back from the clock for the gui and the pipe, in milliseconds
+MOVE_OVERHEAD_MS = 50
+# Moves the rest of the clock is spread over when the time control doesn't say
+DEFAULT_MOVES_TO_GO = 30
+MAX_MOVES_TO_GO = 50
+
+# The hard limit is this many soft limits, but never more than this share of the clock
+HARD_TIME_FACTOR = 4
+MAX_TIME_FRACTION = 0.5
+LAST_MOVE_TIME_FRACTION = 0.9
+
+# How far the soft limit is stretched or shortened between iterations
+MIN_STABILITY_FACTOR = 0.7
+BEST_MOVE_CHANGE_FACTOR = 0.5
+MIN_SCORE_FACTOR = 0.9
+MAX_SCORE_FACTOR = 1.6
+# A score drop of this many centipawns between iterations doubles the time
+SCORE_DROP_SCALE = 150
+
+
+class TimeManager():
+    # Turns a clock into two limits for one move. The search never runs past the hard limit, and
+    # doesn't start another iteration once it is past the soft one. After every iteration the soft
+    # limit is scaled: a best move that keeps changing or a score that keeps dropping means the
+    # position is hard and gets more time, a best move that has held for a while gets less.
+    def __init__(self, time_left: int, increment: int = 0, moves_to_go: int = None, move_overhead: int = MOVE_OVERHEAD_MS) -> None:
+        # Clock arguments are in milliseconds, like uci sends them, the limits are in seconds
+        available = max(time_left - move_overhead, 1)
+        moves_to_go = min(moves_to_go, MAX_MOVES_TO_GO) if moves_to_go else DEFAULT_MOVES_TO_GO
+        # With one move to go until the next time control there is nothing to save the clock for
+        max_fraction = LAST_MOVE_TIME_FRACTION if moves_to_go == 1 else MAX_TIME_FRACTION
+
+        move_time = available / moves_to_go + increment * 3 / 4
+        self.hard_time = min(move_time * HARD_TIME_FACTOR, available * max_fraction) / 1000
+        self.soft_time = min(move_time / 1000, self.hard_time)
+
+        self.start_time = 0.0
+        self.best_move = None
+        self.best_move_changes = 0.0
+        self.stable_iterations = 0
+        self.previous_score = None
+        self.scale = 1.0
+
+    def start(self) -> None:
+        # Limits count from here, pondering only starts the clock on ponderhit
+        self.start_time = time.perf_counter()
+        self.best_move = None
+        self.best_move_changes = 0.0
+        self.stable_iterations = 0
+        self.previous_score = None
+        self.scale = 1.0
+
+    def get_hard_deadline(self) -> float:
+        return self.start_time + self.hard_time
+
+    def get_soft_time(self) -> float:
+        # The soft limit after scaling, what the next iteration is checked against
+        return min(self.soft_time * self.scale, self.hard_time)
+
+    def update(self, best_move: int, score: int) -> None:
+        # Called after every finished iteration
+        # Older changes count for less, a move that flipped five iterations ago barely matters
+        self.best_move_changes /= 2
+        if self.best_move is not None and best_move != self.best_move:
+            self.best_move_changes += 1
+            self.stable_iterations = 0
+        else:
+            self.stable_iterations += 1
+        self.best_move = best_move
+
+        stability_factor = max(MIN_STABILITY_FACTOR, 1 - 0.05 * self.stable_iterations) + BEST_MOVE_CHANGE_FACTOR * self.best_move_changes
+
+        score_factor = 1.0
+        if self.previous_score is not None:
+            score_factor = 1 + (self.previous_score - score) / SCORE_DROP_SCALE
+            score_factor = min(max(score_factor, MIN_SCORE_FACTOR), MAX_SCORE_FACTOR)
+        self.previous_score = score
+
+        self.scale = stability_factor * score_factor
+
+    def should_stop(self) -> bool:
+        # True once there is no time for another iteration
+        return time.perf_counter() - self.start_time >= self.get_soft_time()
@@ -0,0 +1,196 @@
+from array import array
+from .move import NULL_MOVE
+
+# Bound types, what the stored score says about the real score of the position
+BOUND_NONE = 0
+BOUND_UPPER = 1  # every move failed low, the real score is at most this
+BOUND_LOWER = 2  # a move failed high, the real score is at least this
+BOUND_EXACT = 3
+
+# Entry data is one 64 bit word:
+#   bits 0 - 15   best move
+#   bits 16 - 31  score, as a 16 bit two's complement int
+#   bits 32 - 39  depth
+#   bits 40 - 41  bound
+#   bits 42 - 49  age of the search that stored it
+SCORE_SHIFT = 16
+DEPTH_SHIFT = 32
+BOUND_SHIFT = 40
+AGE_SHIFT = 42
+AGE_MASK = 0xFF
+
+# Scores past this are mates. They are stored relative to the node instead of the root, so the
+# same entry is right wherever the position turns up in the tree.
+MATE_BOUND = 31000
+
+
+def pack_entry(move: int, score: int, depth: int, bound: int, age: int) -> int:
+    return move | ((score & 0xFFFF) << SCORE_SHIFT) | (depth << DEPTH_SHIFT) | (bound << BOUND_SHIFT) | (age << AGE_SHIFT)
+
+
+def unpack_entry(data: int) -> tuple:
+    # (move, score, depth, bound) of an entry's data word
+    score = (data >> SCORE_SHIFT) & 0xFFFF
+    if score & 0x8000:
+        score -= 0x10000
+    return data & 0xFFFF, score, (data >> DEPTH_SHIFT) & 0xFF, (data >> BOUND_SHIFT) & 3
+
+
+def score_to_tt(score: int, ply: int) -> int:
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int) -> int:
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class TranspositionTable():
+    # Fixed size position key -> search result cache in one flat array('Q'). Every entry is two words,
+    # the key XORed with the data and the data itself, so an entry torn by a concurrent writer just
+    # fails the key check instead of handing back another position's data. That is what lets the
+    # Lazy SMP helper processes share one table in shared memory without any locking. Entries are grouped in
+    # buckets of four and the least valuable one, old or shallow, is replaced.
+    ENTRY_SIZE = 16
+    BUCKET_SLOTS = 4
+
+    def __init__(self, size_mb: int, buffer=None) -> None:
+        # With a buffer, shared memory for example, the entries live there instead of in a private array.
+        # It has to be at least get_buffer_size(size_mb) bytes.
+        bucket_count = self.get_bucket_count(size_mb)
+
+        self.size_mb = size_mb
+        self.bucket_mask = bucket_count - 1
+        self.entry_count = bucket_count * self.BUCKET_SLOTS
+        if buffer is not None:
+            self.entries = memoryview(buffer)[:self.ENTRY_SIZE * self.entry_count].cast("Q")
+        else:
+            self.entries = array("Q", bytes(self.ENTRY_SIZE * self.entry_count))
+        self.age = 0
+
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0
+        self.stores = 0
+        self.replacements = 0
+
+    @classmethod
+    def get_bucket_count(cls, size_mb: int) -> int:
+        bucket_count = max(1, (size_mb * 1024 * 1024) // (cls.ENTRY_SIZE * cls.BUCKET_SLOTS))
+        # Round down to a power of two so the bucket index is a mask
+        return 1 << (bucket_count.bit_length() - 1)
+
+    @classmethod
+    def get_buffer_size(cls, size_mb: int) -> int:
+        return cls.get_bucket_count(size_mb) * cls.BUCKET_SLOTS * cls.ENTRY_SIZE
+
+    def clear(self) -> None:
+        # Zeroed in place, other processes may be looking at the same buffer
+        self.entries[:] = array("Q", bytes(self.ENTRY_SIZE * self.entry_count))
+        self.age = 0
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def new_search(self) -> None:
+        # Entries from earlier searches are kept but become the first to go
+        self.age = (self.age + 1) & AGE_MASK
+
+    def probe(self, key: int) -> int:
+        # Returns the entry's data word, or 0 when the position isn't in the table
+        self.probes += 1
+        entries = self.entries
+        index = (key & self.bucket_mask) << 3
+        filled_slots = 0
+
+        for slot in range(index, index + 8, 2):
+            data = entries[slot + 1]
+            if data:
+                if entries[slot] ^ data == key:
+                    self.hits += 1
+                    return data
+                filled_slots += 1
+
+        # Every slot held some other position
+        if filled_slots == self.BUCKET_SLOTS:
+            self.collisions += 1
+        return 0
+
+    def store(self, key: int, move: int, score: int, depth: int, bound: int) -> None:
+        self.stores += 1
+        entries = self.entries
+        index = (key & self.bucket_mask) << 3
+        age = self.age
+
+        replace_slot = index
+        replace_value = None
+        for slot in range(index, index + 8, 2):
+            data = entries[slot + 1]
+            if not data or entries[slot] ^ data == key:
+                # Same position, keep the old best move if this search didn't find one
+                if data and move == NULL_MOVE:
+                    move = data & 0xFFFF
+                replace_slot = slot
+                break
+
+            # Older searches count against an entry as much as 8 plies of depth do
+            entry_age = (data >> AGE_SHIFT) & AGE_MASK
+            value = ((data >> DEPTH_SHIFT) & 0xFF) - 8 * ((age - entry_age) & AGE_MASK)
+            if replace_value is None or value < replace_value:
+                replace_slot = slot
+                replace_value = value
+        else:
+            self.replacements += 1
+
+        data = pack_entry(move, score, max(depth, 0), bound, age)
+        entries[replace_slot] = key ^ data
+        entries[replace_slot + 1] = data
+
+    def get_fill(self) -> float:
+        # Fraction of entries written by the current search
+        entries = self.entries
+        age = self.age
+        used = 0
+        for slot in range(1, len(entries), 2):
+            data = entries[slot]
+            if data and (data >> AGE_SHIFT) & AGE_MASK == age:
+                used += 1
+        return used / self.entry_count
+
+    def hashfull(self) -> int:
+        # Per mille fill from a sample of the first thousand entries, what uci "info hashfull" wants
+        entries = self.entries
+        age = self.age
+        sample_size = min(1000, self.entry_count)
+        used = 0
+        for slot in range(1, sample_size * 2, 2):
+            data = entries[slot]
+            if data and (data >> AGE_SHIFT) & AGE_MASK == age:
+                used += 1
+        return used * 1000 // sample_size
+
+    def get_stats(self) -> dict:
+        return {
+            "size_mb": self.size_mb,
+            "entries": self.entry_count,
+            "probes": self.probes,
+            "hits": self.hits,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "replacements": self.replacements,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            # Sampled, a full get_fill scan of a big table takes longer than a fast search
+            "fill": self.hashfull() / 1000,
+        }
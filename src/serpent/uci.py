@@ -0,0 +1,246 @@
+import copy
+import os
+import sys
+import threading
+from .fen import START_FEN
+from .move import NULL_MOVE, move_to_uci
+from .piece import KING
+from .polyglot import PolyglotBook
+from .position import Position
+from .search import DEFAULT_HASH_SIZE_MB, Search, format_iteration
+from .time_manager import MOVE_OVERHEAD_MS, TimeManager
+
+ENGINE_NAME = "Serpent"
+ENGINE_AUTHOR = "Michael Stiffler"
+
+MIN_HASH_SIZE_MB = 1
+MAX_HASH_SIZE_MB = 4096
+MAX_THREADS = os.cpu_count() or 1
+
+# go arguments that take a number
+GO_INT_OPTIONS = ["wtime", "btime", "winc", "binc", "movestogo", "depth", "nodes", "movetime"]
+
+
+def parse_go_options(tokens: list) -> dict:
+    # "go wtime 1000 btime 1000 infinite" -> {"wtime": 1000, "btime": 1000, "infinite": True}
+    options = {}
+    index = 1
+    while index < len(tokens):
+        token = tokens[index]
+        if token in GO_INT_OPTIONS:
+            if index + 1 == len(tokens):
+                raise ValueError(f"{token} needs a value")
+            options[token] = int(tokens[index + 1])
+            index += 2
+        else:
+            # Flags like infinite and ponder, anything we don't know is skipped
+            options[token] = True
+            index += 1
+    return options
+
+
+class UCI():
+    # The uci front end. Commands are read on the calling thread and every search runs on a worker
+    # thread, so stop and ponderhit get handled while it thinks. Only the worker prints info and
+    # bestmove lines, the command thread only prints replies to uci / isready.
+    def __init__(self, search: Search = None, book: PolyglotBook = None) -> None:
+        self.search = search if search else Search()
+        self.move_generator = self.search.move_generator
+        self.book = book
+        self.best_book_move = book.best_move if book else False
+        self.position = Position()
+        self.position.set_fen(START_FEN)
+
+        self.search_thread = None
+        self.output_lock = threading.Lock()
+        # Holds back bestmove after an infinite or ponder search finishes until stop / ponderhit
+        self.stop_event = threading.Event()
+        self.infinite = False
+        self.pondering = False
+        self.ponder_time_limit = None
+        self.ponder_time_manager = None
+
+    def send(self, line: str) -> None:
+        with self.output_lock:
+            print(line, flush=True)
+
+    def loop(self, input_stream=None) -> None:
+        for line in input_stream or sys.stdin:
+            # A malformed command from the gui is reported and skipped, it mustn't take the engine down
+            try:
+                if not self.handle_command(line):
+                    break
+            except (ValueError, IndexError) as error:
+                self.send(f"info string ignored bad command '{line.strip()}': {error}")
+        self.stop_search()
+        self.search.close()
+
+    def handle_command(self, line: str) -> bool:
+        # Returns False once it's time to quit
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_SIZE_MB} min {MIN_HASH_SIZE_MB} max {MAX_HASH_SIZE_MB}")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("option name Ponder type check default false")
+            self.send(f"option name BookFile type string default {self.book.path if self.book else '<empty>'}")
+            self.send(f"option name BestBookMove type check default {'true' if self.best_book_move else 'false'}")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.set_option(tokens)
+        elif command == "ucinewgame":
+            self.stop_search()
+            self.search.new_game()
+        elif command == "position":
+            self.stop_search()
+            self.set_position(tokens)
+        elif command == "go":
+            self.go(tokens)
+        elif command == "stop":
+            self.stop_search()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            return False
+        elif command == "d":
+            # Not part of uci, handy when driving the engine by hand
+            self.send(self.position.get_fen())
+
+        return True
+
+    def set_option(self, tokens: list) -> None:
+        # setoption name <name> value <value>, names can have spaces in them
+        if "name" not in tokens:
+            return
+        name_index = tokens.index("name") + 1
+        value_index = tokens.index("value") if "value" in tokens else len(tokens)
+        name = " ".join(tokens[name_index:value_index]).lower()
+        value = " ".join(tokens[value_index + 1:])
+
+        if name == "hash" and value.isdigit():
+            self.stop_search()
+            self.search.set_hash_size(min(max(int(value), MIN_HASH_SIZE_MB), MAX_HASH_SIZE_MB))
+        elif name == "threads" and value.isdigit():
+            self.stop_search()
+            self.search.set_threads(min(max(int(value), 1), MAX_THREADS))
+        elif name == "bookfile":
+            self.set_book(value)
+        elif name == "bestbookmove":
+            self.best_book_move = value.lower() == "true"
+            if self.book:
+                self.book.best_move = self.best_book_move
+
+    def set_book(self, path: str) -> None:
+        if self.book:
+            self.book.close()
+            self.book = None
+        if path and path != "<empty>":
+            try:
+                self.book = PolyglotBook(path, self.best_book_move)
+            except OSError as error:
+                self.send(f"info string could not open book {path}: {error.strerror}")
+
+    def set_position(self, tokens: list) -> None:
+        # position startpos | fen <fen> [moves <move> ...]
+        moves_index = tokens.index("moves") if "moves" in tokens else len(tokens)
+        if len(tokens) > 1 and tokens[1] == "fen":
+            fen = " ".join(tokens[2:moves_index])
+        else:
+            fen = START_FEN
+
+        # Built on the side so a bad fen leaves the last good position in place
+        position = Position()
+        position.set_fen(fen)
+        if position.bitboards[KING].bit_count() != 1 or position.bitboards[6 + KING].bit_count() != 1:
+            raise ValueError(f"fen needs one king a side: {fen}")
+
+        for uci_move in tokens[moves_index + 1:]:
+            move = self.move_generator.parse_uci_move(position, uci_move)
+            if move == NULL_MOVE:
+                self.send(f"info string illegal move {uci_move}")
+                break
+            position.make_move(move)
+        self.position = position
+
+    def go(self, tokens: list) -> None:
+        self.stop_search()
+
+        options = parse_go_options(tokens)
+        # Book moves are played straight away, an infinite or ponder search has to be a real one
+        if self.book and "infinite" not in options and "ponder" not in options:
+            move = self.book.get_move(self.move_generator, self.position)
+            if move != NULL_MOVE:
+                self.send(f"bestmove {move_to_uci(move)}")
+                return
+
+        time_limit = max(options["movetime"] - MOVE_OVERHEAD_MS, 1) / 1000 if "movetime" in options else None
+        time_manager = self.get_time_manager(options) if time_limit is None else None
+        self.infinite = "infinite" in options
+        self.pondering = "ponder" in options
+        # A ponder search runs without a clock until ponderhit hands it the time it would have had
+        self.ponder_time_limit = time_limit if self.pondering else None
+        self.ponder_time_manager = time_manager if self.pondering else None
+        if self.infinite or self.pondering:
+            time_limit = None
+            time_manager = None
+        self.stop_event.clear()
+
+        # The search makes and unmakes moves on its own copy, so the command thread never sees a half made move
+        position = copy.deepcopy(self.position)
+        self.search_thread = threading.Thread(
+            target=self.run_search,
+            args=(position, options.get("depth"), options.get("nodes"), time_limit, time_manager),
+            daemon=True
+        )
+        self.search_thread.start()
+
+    def get_time_manager(self, options: dict):
+        # None when the go command gives no clock for the side to move
+        color = "b" if self.position.color_to_move else "w"
+        if color + "time" not in options:
+            return None
+        return TimeManager(options[color + "time"], options.get(color + "inc", 0), options.get("movestogo"))
+
+    def run_search(self, position: Position, max_depth: int, max_nodes: int, max_time: float, time_manager: TimeManager) -> None:
+        result = self.search.search(position, max_depth, max_nodes, max_time, on_iteration=self.send_iteration, time_manager=time_manager)
+
+        # uci never allows bestmove during an infinite or ponder search, even one that ran out of depth
+        if self.infinite or self.pondering:
+            self.stop_event.wait()
+
+        best_move = move_to_uci(result["best_move"])
+        if len(result["pv"]) > 1:
+            self.send(f"bestmove {best_move} ponder {move_to_uci(result['pv'][1])}")
+        else:
+            self.send(f"bestmove {best_move}")
+
+    def send_iteration(self, iteration: dict) -> None:
+        self.send(format_iteration(iteration))
+
+    def stop_search(self) -> None:
+        if self.search_thread is None:
+            return
+
+        # Keep stopping until the thread is gone, a stop can land before the search has started
+        while self.search_thread.is_alive():
+            self.search.stop()
+            self.stop_event.set()
+            self.search_thread.join(0.01)
+        self.search_thread = None
+
+    def ponderhit(self) -> None:
+        # The opponent played the expected move, the ponder search carries on as a normal one
+        self.pondering = False
+        if self.ponder_time_manager is not None:
+            self.search.start_time_manager(self.ponder_time_manager)
+        elif self.ponder_time_limit is not None:
+            self.search.set_time_limit(self.ponder_time_limit)
+        if not self.infinite:
+            self.stop_event.set()
@@ -0,0 +1,21 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Tasks kept queued per worker, enough to keep every worker busy without reading in every task or
+# holding every result at once
+TASKS_PER_JOB = 4
+
+
+def map_unordered(function, tasks, jobs: int, initializer=None, initargs: tuple = ()):
+    # Yields function(task) for every task, run on jobs worker processes, in completion order. Tasks are
+    # only taken from the iterable as workers free up, so a generator of any length streams through.
+    # initializer sets up each worker's state once, in module level globals function reads.
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as executor:
+        pending = set()
+        for task in tasks:
+            pending.add(executor.submit(function, task))
+            if len(pending) >= jobs * TASKS_PER_JOB:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in wait(pending).done:
+            yield future.result()
@@ -0,0 +1,59 @@
+import random
+from .bitboard import iterate_bits
+
+# Seeded so keys, and anything saved with them, are the same on every run
+ZOBRIST_SEED = 20230601
+
+zobrist_random = random.Random(ZOBRIST_SEED)
+
+# PIECE_SQUARE_KEYS[piece][square], pieces indexed by their Piece value
+PIECE_SQUARE_KEYS = [[zobrist_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+SIDE_TO_MOVE_KEY = zobrist_random.getrandbits(64)
+# One key per castling rights mask, so a change in rights is a single XOR of the old and new key
+CASTLING_KEYS = [zobrist_random.getrandbits(64) for _ in range(16)]
+EN_PASSANT_FILE_KEYS = [zobrist_random.getrandbits(64) for _ in range(8)]
+
+
+def compute_hash(position) -> int:
+    # Full recompute from scratch
+    key = 0
+
+    for piece, bitboard in enumerate(position.bitboards):
+        piece_keys = PIECE_SQUARE_KEYS[piece]
+        for square in iterate_bits(bitboard):
+            key ^= piece_keys[square]
+
+    return key ^ get_state_key(position.color_to_move, position.castling_rights, position.en_passant_square)
+
+
+def compute_pawn_hash(position) -> int:
+    # Key of the pawns alone, for caching pawn structure terms
+    key = 0
+    for piece in (0, 6):
+        piece_keys = PIECE_SQUARE_KEYS[piece]
+        for square in iterate_bits(position.bitboards[piece]):
+            key ^= piece_keys[square]
+    return key
+
+
+def compute_hash_from_board(piece_board: list, color_to_move: int, castling_rights: int, en_passant_square) -> int:
+    # Same key as compute_hash, built from a mailbox board instead of bitboards
+    key = 0
+
+    for square, piece in enumerate(piece_board):
+        if piece is not None:
+            key ^= PIECE_SQUARE_KEYS[piece][square]
+
+    return key ^ get_state_key(color_to_move, castling_rights, en_passant_square)
+
+
+def get_state_key(color_to_move: int, castling_rights: int, en_passant_square) -> int:
+    key = CASTLING_KEYS[castling_rights]
+
+    if color_to_move:
+        key ^= SIDE_TO_MOVE_KEY
+
+    if en_passant_square is not None:
+        key ^= EN_PASSANT_FILE_KEYS[en_passant_square & 7]
+
+    return key
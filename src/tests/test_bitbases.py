@@ -0,0 +1,61 @@
+import os
+import pytest
+from serpent.bitbases import DEFAULT_BITBASE_DIRECTORY, ENDGAMES, Bitbases, build_bitbases
+from serpent.match import get_game_result
+from serpent.position import Position
+from serpent.search import Search
+
+# Plies the winning side gets to mate in, well past what these starts need at depth 4
+MAX_PLIES = 100
+
+
+@pytest.fixture(scope="module")
+def bitbases(tmp_path_factory):
+    # The bitbases aren't checked in, without a build from -build-bitbases one is made for the tests
+    if all(os.path.exists(os.path.join(DEFAULT_BITBASE_DIRECTORY, name + ".bin")) for name in ENDGAMES):
+        return Bitbases()
+    directory = str(tmp_path_factory.mktemp("bitbases"))
+    build_bitbases(directory)
+    return Bitbases(directory)
+
+
+def play_out(bitbases: Bitbases, fen: str) -> tuple:
+    # Self play at a fixed depth until the game ends, (result, reason, plies)
+    search = Search()
+    search.bitbases = bitbases
+    position = Position()
+    position.set_fen(fen)
+    for ply in range(MAX_PLIES):
+        result, reason = get_game_result(search.move_generator, position)
+        if result:
+            return result, reason, ply
+        position.make_move(search.search(position, max_depth=4)["best_move"])
+    return None, None, MAX_PLIES
+
+
+@pytest.mark.parametrize("fen", [
+    "8/8/3k4/8/8/8/8/4K2Q w - - 0 1",
+    "8/8/3k4/8/8/8/8/4K2R w - - 0 1",
+    "4k2r/8/8/8/8/3K4/8/8 b - - 0 1",
+])
+def test_won_endgames_are_mated(bitbases, fen):
+    # Every won position scores about the same to a bitbase, the search still has to find the mate
+    result, reason, _ = play_out(bitbases, fen)
+    assert reason in ("White mates", "Black mates")
+    assert result == ("1-0" if " w " in fen else "0-1")
+
+
+def test_probe(bitbases):
+    position = Position()
+    position.set_fen("8/8/3k4/8/8/8/8/4K2Q w - - 0 1")
+    assert bitbases.probe(position) == 1
+    position.set_fen("8/8/3k4/8/8/8/8/4K2Q b - - 0 1")
+    assert bitbases.probe(position) == -1
+    position.set_fen("4k3/8/8/8/8/8/4PK2/8 w - - 0 1")
+    assert bitbases.probe(position) == 1
+    # The black king gets in front of the pawn
+    position.set_fen("8/8/8/4k3/8/8/3P4/3K4 w - - 0 1")
+    assert bitbases.probe(position) == 0
+    # Not an endgame there's a bitbase for
+    position.set_fen("8/8/3k4/8/8/8/8/3BK1N1 w - - 0 1")
+    assert bitbases.probe(position) is None
@@ -0,0 +1,83 @@
+from serpent.epd import EpdRunner, read_epd_file
+from serpent.fen import Fen, parse_epd_operations
+from serpent.position import Position
+
+WAC_1 = '2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - bm Qg6; id "WAC.001";'
+
+
+def test_parse_fen_clocks():
+    parser = Fen()
+    parser.parse_fen("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 7 12")
+    assert parser.color_to_move == 1
+    assert parser.halfmove_clock == 7
+    assert parser.fullmove_number == 12
+
+
+def test_parse_epd_single_operations():
+    parser = Fen()
+    operations = parser.parse_epd(WAC_1)
+    assert operations == {"bm": ["Qg6"], "id": ["WAC.001"]}
+    position = Position()
+    position.generate_position_from_fen(parser.get_parsed_fen())
+    assert position.get_fen() == "2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1"
+
+
+def test_parse_epd_multiple_best_moves_and_avoid_move():
+    operations = Fen().parse_epd('r1b1k2r/ppppnppp/2n2q2/2b5/3NP3/2P1B3/PP3PPP/RN1QKB1R w KQkq - bm Nxc6 Bb5; am Qd2; id "test";')
+    assert operations["bm"] == ["Nxc6", "Bb5"]
+    assert operations["am"] == ["Qd2"]
+    assert operations["id"] == ["test"]
+
+
+def test_quoted_operands_keep_semicolons_and_spaces():
+    operations = parse_epd_operations('id "mate; in two"; c0 "a b  c"; bm Qh7+;')
+    assert operations == {"id": ["mate; in two"], "c0": ["a b  c"], "bm": ["Qh7+"]}
+
+
+def test_last_semicolon_is_optional():
+    assert parse_epd_operations("bm e4") == {"bm": ["e4"]}
+
+
+def test_move_clock_operations():
+    parser = Fen()
+    parser.parse_epd("4k3/8/8/8/8/8/8/4K3 b - - hmvc 35; fmvn 60;")
+    assert parser.halfmove_clock == 35
+    assert parser.fullmove_number == 60
+
+
+def test_missing_move_clock_operations_default():
+    parser = Fen()
+    parser.parse_epd("4k3/8/8/8/8/8/8/4K3 b - - bm Kd7;")
+    assert parser.halfmove_clock == 0
+    assert parser.fullmove_number == 1
+    # With no operations at all
+    parser.parse_epd("4k3/8/8/8/8/8/8/4K3 b - -")
+    assert parser.halfmove_clock == 0
+    assert parser.fullmove_number == 1
+
+
+def test_read_epd_file_skips_comments_and_blank_lines(tmp_path):
+    path = tmp_path / "suite.epd"
+    path.write_text("# a comment\n\n" + WAC_1 + "\n   \n# another\n4k3/8/8/8/8/8/8/4K3 w - - bm Kd2;\n")
+    lines = list(read_epd_file(str(path)))
+    assert lines == [(3, WAC_1), (6, "4k3/8/8/8/8/8/8/4K3 w - - bm Kd2;")]
+
+
+def test_parse_epd_with_fen_clocks():
+    parser = Fen()
+    operations = parser.parse_epd('2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 3 21 bm Qg6; id "WAC.001";')
+    assert operations == {"bm": ["Qg6"], "id": ["WAC.001"]}
+    assert parser.halfmove_clock == 3
+    assert parser.fullmove_number == 21
+    # Clocks and nothing else
+    assert Fen().parse_epd("4k3/8/8/8/8/8/8/4K3 w - - 0 1") == {}
+
+
+def test_epd_runner_reports_bad_lines(tmp_path):
+    path = tmp_path / "suite.epd"
+    path.write_text("garbage line here\n" + WAC_1 + "\n")
+    run = EpdRunner(hash_size_mb=1).run(str(path), max_depth=1)
+    assert [result["line"] for result in run["results"]] == [1, 2]
+    assert run["results"][0]["error"] == "bad epd: garbage line here"
+    assert run["results"][1]["bm"] == ["Qg6"]
+    assert run["summary"]["errors"] == 1
@@ -0,0 +1,13 @@
+import random
+from serpent.magic_bitboards import BISHOP_DIRECTIONS, ROOK_DIRECTIONS, MagicBitboards, generate_slider_attacks
+
+
+def test_attacks_match_ray_walk():
+    magic_bitboards = MagicBitboards()
+    rng = random.Random(0)
+    for square in range(64):
+        for _ in range(50):
+            # Sparse and dense boards both
+            occupancy = rng.getrandbits(64) & rng.getrandbits(64) if rng.random() < 0.5 else rng.getrandbits(64)
+            assert magic_bitboards.get_bishop_attacks(square, occupancy) == generate_slider_attacks(square, occupancy, BISHOP_DIRECTIONS)
+            assert magic_bitboards.get_rook_attacks(square, occupancy) == generate_slider_attacks(square, occupancy, ROOK_DIRECTIONS)
@@ -0,0 +1,130 @@
+import bz2
+import gzip
+import pytest
+from serpent.move import NULL_MOVE, move_to_uci
+from serpent.move_generator import MoveGenerator
+from serpent.pgn import PgnReader, get_shards, open_pgn, read_pgn_games, read_pgn_lines, replay_game
+from serpent.position import Position
+
+GAME = """[Event "Game {index}"]
+[Site "?"]
+[Result "1-0"]
+
+1. e4 {{a comment
+over two lines (with brackets)}} e5 2. Nf3 $1 (2. f4 exf4 (2... d5) 3. Nf3) Nc6!? 3. Bb5 ; to the end of the line e4
+a6 4. Ba4 Nf6 5. O-O Be7 1-0
+
+"""
+
+
+def write_games(path, count: int) -> bytes:
+    text = "".join(GAME.format(index=index) for index in range(count)).encode()
+    path.write_bytes(text)
+    return text
+
+
+@pytest.fixture(scope="module")
+def move_generator():
+    return MoveGenerator()
+
+
+def test_movetext_skips_comments_variations_and_nags(tmp_path):
+    path = tmp_path / "games.pgn"
+    write_games(path, 1)
+    games = list(PgnReader(str(path)).games())
+    assert len(games) == 1
+    assert games[0]["headers"]["Event"] == "Game 0"
+    assert games[0]["moves"] == ["e4", "e5", "Nf3", "Nc6!?", "Bb5", "a6", "Ba4", "Nf6", "O-O", "Be7"]
+    assert games[0]["result"] == "1-0"
+
+
+@pytest.mark.parametrize("compress, extension", [(gzip.compress, ".gz"), (bz2.compress, ".bz2")])
+def test_compressed_input(tmp_path, compress, extension):
+    text = write_games(tmp_path / "games.pgn", 20)
+    path = tmp_path / ("games.pgn" + extension)
+    path.write_bytes(compress(text))
+    games = list(PgnReader(str(path)).games())
+    assert [game["headers"]["Event"] for game in games] == [f"Game {index}" for index in range(20)]
+    # Compressed files can't be sharded, jobs fall back to reading in this process
+    assert sum(1 for _ in PgnReader(str(path), jobs=2).map()) == 20
+
+
+def test_every_game_lands_in_exactly_one_shard(tmp_path):
+    path = tmp_path / "games.pgn"
+    text = write_games(path, 30)
+    game_starts = [index for index in range(len(text)) if text.startswith(b"[Event ", index)]
+    # Shard edges inside games, on the first byte of a game and one byte either side of it
+    shard_sizes = [1, 7, 64, 97, 500, game_starts[1], game_starts[1] - 1, game_starts[1] + 1, len(text)]
+    for shard_size in shard_sizes:
+        events = []
+        for start, end in get_shards(str(path), shard_size):
+            with open_pgn(str(path)) as file:
+                events += [game["headers"]["Event"] for game in read_pgn_games(read_pgn_lines(file, start, end))]
+        assert events == [f"Game {index}" for index in range(30)], shard_size
+
+
+def test_parallel_map_matches_serial(tmp_path):
+    path = tmp_path / "games.pgn"
+    write_games(path, 40)
+    serial = list(PgnReader(str(path)).map())
+    parallel = list(PgnReader(str(path), jobs=2, shard_size=300).map())
+    assert len(parallel) == 40
+    assert sorted(result["positions"] for result in parallel) == sorted(result["positions"] for result in serial)
+
+
+def test_illegal_move_stops_the_game_only(move_generator):
+    lines = ['[Event "a"]', "", "1. e4 e5 2. Ke3 1-0", '[Event "b"]', "", "1. d4 *"]
+    games = list(read_pgn_games(lines))
+    assert len(list(replay_game(move_generator, games[0]))) == 2
+    assert games[0]["error"] == "illegal move Ke3 at ply 3"
+    assert len(list(replay_game(move_generator, games[1]))) == 1
+    assert "error" not in games[1]
+
+
+def parse(move_generator, fen: str, san: str) -> str:
+    position = Position()
+    position.set_fen(fen)
+    move = move_generator.parse_san_move(position, san)
+    return None if move == NULL_MOVE else move_to_uci(move)
+
+
+def test_san_disambiguation(move_generator):
+    # Knights on b1 and f3 can both reach d2, rooks on a1 and a5 can both reach a3
+    fen = "4k3/8/8/R7/8/5N2/8/RN2K3 w - - 0 1"
+    assert parse(move_generator, fen, "Nbd2") == "b1d2"
+    assert parse(move_generator, fen, "Nfd2") == "f3d2"
+    assert parse(move_generator, fen, "Nf3d2") == "f3d2"
+    assert parse(move_generator, fen, "Nd2") is None
+    assert parse(move_generator, fen, "R1a3") == "a1a3"
+    assert parse(move_generator, fen, "R5a3") == "a5a3"
+    assert parse(move_generator, fen, "Ra3") is None
+    # Redundant disambiguation is fine when only one piece can go there
+    assert parse(move_generator, fen, "Nbc3") == "b1c3"
+
+
+def test_san_pawn_moves_and_promotions(move_generator):
+    fen = "1n2k3/P7/8/3p4/4P3/8/8/4K3 w - - 0 1"
+    assert parse(move_generator, fen, "exd5") == "e4d5"
+    assert parse(move_generator, fen, "e5") == "e4e5"
+    # Without the capture mark it's a push, and e4 can't push to d5
+    assert parse(move_generator, fen, "d5") is None
+    assert parse(move_generator, fen, "a8=Q") == "a7a8q"
+    assert parse(move_generator, fen, "a8N") == "a7a8n"
+    assert parse(move_generator, fen, "axb8=R+") == "a7b8r"
+    assert parse(move_generator, fen, "a8") is None
+    assert parse(move_generator, fen, "a8=K") is None
+
+
+def test_san_castling_and_uci(move_generator):
+    fen = "r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1"
+    assert parse(move_generator, fen, "O-O") == "e8g8"
+    assert parse(move_generator, fen, "0-0-0") == "e8c8"
+    assert parse(move_generator, fen, "e8g8") == "e8g8"
+    assert parse(move_generator, fen, "Kg8") is None
+
+
+def test_san_round_trip(move_generator):
+    position = Position()
+    position.set_fen("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    for move in move_generator.generate_legal_moves(position):
+        assert move_generator.parse_san_move(position, move_generator.move_to_san(position, move)) == move